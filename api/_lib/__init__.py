@@ -0,0 +1,2 @@
+# Módulos compartilhados da API. O prefixo "_" impede que a Vercel publique cada
+# arquivo daqui como uma função serverless própria (só api/routines.py é função).
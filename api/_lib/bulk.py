@@ -0,0 +1,195 @@
+import csv
+import json
+import re
+import tempfile
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from .settings import BULK_REV_SETTING, EVENTS_CHANNEL, IMPORT_MAX_ERRORS, IMPORT_SPOOL_BYTES, STREAM_CHUNK_BYTES
+
+
+# -------- Import/export --------
+EXPORT_ROWS_SQL = """
+SELECT id, title, status, created_at FROM routines WHERE user_id = %s AND deleted_at IS NULL
+UNION ALL
+SELECT id, title, 'feita', created_at FROM routines_archive WHERE user_id = %s
+"""
+
+# NDJSON sai pronto do COPY: em FORMAT csv um campo só é citado se tiver delimitador,
+# aspas ou quebra de linha, e com \x02/\x01 (que o JSON sempre escapa) cada objeto sai cru
+EXPORT_COPY_SQL = {
+    "ndjson": f"""
+        COPY (
+          SELECT json_build_object('id', id, 'title', title, 'status', status, 'created_at', created_at)
+          FROM ({EXPORT_ROWS_SQL}) t ORDER BY created_at, id
+        ) TO STDOUT WITH (FORMAT csv, DELIMITER E'\\x02', QUOTE E'\\x01')
+    """,
+    "csv": f"COPY ({EXPORT_ROWS_SQL} ORDER BY created_at, id) TO STDOUT WITH (FORMAT csv, HEADER)",
+}
+
+
+class ImportRejected(Exception):
+    """Import com registros inválidos: nada foi gravado"""
+
+    def __init__(self, errors: list[dict]):
+        super().__init__("registros inválidos")
+        self.errors = errors
+
+
+def export_routines(conn, uid: int, fmt: str):
+    """Blocos do export do usuário (rotinas + arquivo) direto do COPY TO STDOUT"""
+    with conn.cursor() as cur:
+        cur.execute("SET LOCAL TIME ZONE 'UTC'")
+        with cur.copy(EXPORT_COPY_SQL[fmt], (uid, uid)) as copy:
+            for block in copy:
+                yield bytes(block)
+
+
+def _iter_lines(blocks):
+    """Linhas (str, com a quebra) a partir de blocos de bytes, sem juntar o corpo inteiro"""
+    pending = b""
+    first = True
+    for block in blocks:
+        pending += block
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            text = line.decode("utf-8") + "\n"
+            if first:
+                text = text.lstrip("\ufeff")  # BOM de CSV salvo por planilhas
+                first = False
+            yield text
+    if pending:
+        yield pending.decode("utf-8").lstrip("\ufeff") if first else pending.decode("utf-8")
+
+
+def parse_import(blocks, fmt: str):
+    """(linha, registro) para cada registro de um corpo NDJSON ou CSV com cabeçalho;
+    registro None quando a linha não é JSON"""
+    lines = _iter_lines(blocks)
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for n, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield n, json.loads(line)
+        except ValueError:
+            yield n, None
+
+
+def import_row(record, default_created_at: datetime) -> tuple[str, str, datetime]:
+    """(title, status, created_at) validados; ValueError com o motivo"""
+    if not isinstance(record, dict):
+        raise ValueError("registro inválido")
+    title = str(record.get("title") or "").strip()
+    if not title:
+        raise ValueError("title é obrigatório")
+    status = record.get("status") or "pendente"
+    if status not in ("pendente", "feita"):
+        raise ValueError("status deve ser pendente ou feita")
+    created_at = record.get("created_at")
+    if not created_at:
+        return title, status, default_created_at
+    value = str(created_at).strip().replace("Z", "+00:00")
+    if re.search(r"[+-]\d\d$", value):
+        value += ":00"  # "+00" do COPY/Postgres
+    try:
+        created_at = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError("created_at inválido") from None
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=ZoneInfo("UTC"))
+    return title, status, created_at
+
+
+class StagedImport:
+    """Registros válidos de um import, já em CSV num arquivo temporário
+    (em memória até IMPORT_SPOOL_BYTES)"""
+
+    def __init__(self):
+        self.file = tempfile.SpooledTemporaryFile(IMPORT_SPOOL_BYTES, mode="w+", newline="", encoding="utf-8")
+        self.imported = 0
+        self.skipped = 0
+        self.errors: list[dict] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.file.close()
+
+
+def stage_import(records, skip_invalid: bool = False) -> StagedImport:
+    """Valida `records` ((linha, registro) de parse_import) e grava os válidos no
+    spool, sem tocar no banco: o upload inteiro acontece antes de pegar conexão.
+    Um registro inválido aborta tudo (ImportRejected), a menos que `skip_invalid`."""
+    now = datetime.now(ZoneInfo("UTC"))
+    staged = StagedImport()
+    writer = csv.writer(staged.file)
+    try:
+        for n, record in records:
+            try:
+                title, status, created_at = import_row(record, now)
+            except ValueError as e:
+                staged.skipped += 1
+                if len(staged.errors) < IMPORT_MAX_ERRORS:
+                    staged.errors.append({"line": n, "error": str(e)})
+                if not skip_invalid and len(staged.errors) >= IMPORT_MAX_ERRORS:
+                    break
+                continue
+            if staged.errors and not skip_invalid:
+                continue  # já vai abortar: só segue lendo para listar os erros
+            writer.writerow((title, status, created_at.isoformat()))
+            staged.imported += 1
+        if staged.errors and not skip_invalid:
+            raise ImportRejected(staged.errors)
+    except BaseException:
+        staged.file.close()
+        raise
+    staged.file.seek(0)
+    return staged
+
+
+def import_routines(conn, uid: int, staged: StagedImport) -> dict:
+    """Grava o import validado por stage_import como rotinas de `uid`, numa transação.
+    O user_id vem sempre do chamador, nunca do registro. O COPY vai para uma tabela
+    temporária sem travar nada; só o merge final segura a linha do usuário. O lote
+    inteiro ganha uma só revisão e um só evento 'imported'.
+
+    Rotinas importadas não contam XP, streak nem conquistas (o histórico de outra
+    conta ou de um arquivo editado não é progresso feito aqui): ficam marcadas como
+    `imported` até a primeira mudança de status, quando entram no progresso."""
+    with conn.cursor() as cur:
+        if staged.imported:
+            cur.execute(
+                "CREATE TEMP TABLE import_staging (title TEXT, status TEXT, created_at TIMESTAMPTZ) ON COMMIT DROP"
+            )
+            with cur.copy("COPY import_staging FROM STDIN WITH (FORMAT csv)") as copy:
+                while block := staged.file.read(STREAM_CHUNK_BYTES):
+                    copy.write(block)
+            cur.execute("UPDATE users SET revision = revision + 1 WHERE id = %s RETURNING revision", (uid,))
+            cur.execute("SELECT set_config(%s, %s, true)", (BULK_REV_SETTING, str(cur.fetchone()[0])))
+            cur.execute(
+                """
+                INSERT INTO routines (user_id, title, status, created_at, imported)
+                SELECT %s, title, status, created_at, TRUE FROM import_staging
+                """,
+                (uid,),
+            )
+            # Um evento para o lote: streams abertos re-sincronizam pelo delta sync
+            cur.execute(
+                """
+                WITH ev AS (
+                  INSERT INTO routine_events(user_id, type, routine_id, item)
+                  VALUES (%s, 'imported', 0, %s::jsonb)
+                  RETURNING id, user_id
+                )
+                SELECT pg_notify(%s, json_build_object('id', id, 'user_id', user_id)::text) FROM ev
+                """,
+                (uid, json.dumps({"count": staged.imported}), EVENTS_CHANNEL),
+            )
+    conn.commit()
+    return {"imported": staged.imported, "skipped": staged.skipped, "errors": staged.errors}
@@ -0,0 +1,142 @@
+import json
+import logging
+import queue
+import threading
+import time
+import psycopg
+
+from .db import get_db_url, get_pool, normalize_db_url
+from .observability import log
+from .settings import EVENTS_CHANNEL, SSE_HEARTBEAT_SECONDS, SSE_REPLAY_LIMIT
+
+
+# -------- Stream de mudanças --------
+EVENT_FIELDS = ("id", "type", "routine_id", "item")
+
+
+def load_events(cur, uid: int, after_id: int, limit: int = SSE_REPLAY_LIMIT) -> list[dict]:
+    cur.execute(
+        "SELECT id, type, routine_id, item FROM routine_events WHERE user_id = %s AND id > %s ORDER BY id LIMIT %s",
+        (uid, after_id, limit),
+    )
+    return [dict(zip(EVENT_FIELDS, r)) for r in cur.fetchall()]
+
+
+def pruned_after(cur, after_id: int) -> int | None:
+    """Se a retenção já pode ter apagado eventos posteriores a `after_id` (o replay teria
+    um buraco), devolve o id mais recente do log; None se o log cobre tudo desde ele"""
+    cur.execute("SELECT min(id), max(id) FROM routine_events")
+    low, high = cur.fetchone()
+    if low is not None and after_id + 1 >= low:
+        return None
+    return high or 0
+
+
+class Subscription(queue.Queue):
+    """Fila de um stream; `overflowed` marca que eventos foram descartados por cliente lento.
+    `notify`, se definido, é chamado (na thread do hub) a cada evento entregue"""
+
+    def __init__(self, maxsize: int = 1000):
+        super().__init__(maxsize)
+        self.overflowed = False
+        self.notify = None
+
+
+class ChangeHub:
+    """Uma única conexão LISTEN por processo distribuindo eventos para os streams SSE"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: dict[int, set[Subscription]] = {}
+        self._thread: threading.Thread | None = None
+        self._listening = threading.Event()
+
+    def client_count(self) -> int:
+        with self._lock:
+            return sum(len(qs) for qs in self._subscribers.values())
+
+    def subscribe(self, uid: int) -> Subscription:
+        q = Subscription()
+        with self._lock:
+            self._subscribers.setdefault(uid, set()).add(q)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="change-hub", daemon=True)
+                self._thread.start()
+        # Até o LISTEN valer, um NOTIFY se perderia: quem se inscreve espera (com limite)
+        self._listening.wait(SSE_HEARTBEAT_SECONDS)
+        return q
+
+    def unsubscribe(self, uid: int, q: Subscription):
+        with self._lock:
+            subs = self._subscribers.get(uid)
+            if subs:
+                subs.discard(q)
+                if not subs:
+                    del self._subscribers[uid]
+
+    def _dispatch(self, notices: list[tuple[int, int]]):
+        # Só busca eventos de usuários com alguém ouvindo
+        with self._lock:
+            wanted = {(ev_id, uid) for ev_id, uid in notices if uid in self._subscribers}
+        if not wanted:
+            return
+        with get_pool().connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT id, type, routine_id, item, user_id FROM routine_events WHERE id = ANY(%s) ORDER BY id",
+                    ([ev_id for ev_id, _ in wanted],),
+                )
+                rows = cur.fetchall()
+        with self._lock:
+            for r in rows:
+                event = dict(zip(EVENT_FIELDS, r[:4]))
+                for q in self._subscribers.get(r[4], ()):
+                    try:
+                        q.put_nowait(event)
+                    except queue.Full:
+                        q.overflowed = True  # cliente lento: o stream recupera do banco
+                    if q.notify is not None:
+                        q.notify()
+
+    def _run(self):
+        backoff = 1.0
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    self._listening.clear()
+                    return
+            try:
+                url = normalize_db_url(get_db_url() or "")
+                with psycopg.connect(url, autocommit=True) as conn:
+                    conn.execute(f"LISTEN {EVENTS_CHANNEL}")
+                    self._listening.set()
+                    backoff = 1.0
+                    while True:
+                        # Espera o primeiro aviso e junta os que já chegaram: notifies() só volta
+                        # ao atingir stop_after ou o timeout, então um lote fixo atrasaria os eventos
+                        received = list(conn.notifies(timeout=SSE_HEARTBEAT_SECONDS, stop_after=1))
+                        if received:
+                            received += conn.notifies(timeout=0, stop_after=99)
+                        notices = []
+                        for n in received:
+                            try:
+                                data = json.loads(n.payload)
+                                notices.append((int(data["id"]), int(data["user_id"])))
+                            except Exception:
+                                continue
+                        if notices:
+                            self._dispatch(notices)
+                        with self._lock:
+                            if not self._subscribers:
+                                self._thread = None
+                                self._listening.clear()
+                                return
+            except Exception as e:
+                self._listening.clear()
+                log(logging.WARNING, "change_hub_error", error=str(e), retry_in=backoff)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+
+hub = ChangeHub()
@@ -0,0 +1,231 @@
+import itertools
+import logging
+import os
+import threading
+import time
+from psycopg.conninfo import conninfo_to_dict
+from psycopg_pool import ConnectionPool
+
+from .migrations import run_migrations
+from .observability import log
+from .settings import (
+    DB_POOL_MAX_IDLE,
+    DB_POOL_MAX_LIFETIME,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_TIMEOUT,
+    READ_AFTER_WRITE_SECONDS,
+    REPLICA_CHECK_INTERVAL,
+    REPLICA_CONNECT_TIMEOUT,
+    REPLICA_MAX_LAG_SECONDS,
+)
+
+
+# -------- Banco de dados --------
+_pool: ConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_db_url():
+    return os.getenv("DATABASE_URL") or os.getenv("NEON_DATABASE_URL")
+
+
+def normalize_db_url(url: str) -> str:
+    # Limpa espaços em branco/newlines que podem aparecer ao colar a URL
+    url = url.strip().replace("\n", "").replace("\r", "")
+    # Anexa sslmode=require com segurança (preserva query params existentes)
+    if "sslmode" not in url:
+        sep = "&" if "?" in url else "?"
+        url = f"{url}{sep}sslmode=require"
+    return url
+
+
+def get_pool() -> ConnectionPool:
+    """Retorna o pool do processo, criando-o na primeira chamada"""
+    global _pool
+    if _pool is not None:
+        return _pool
+    with _pool_lock:
+        if _pool is None:
+            url = get_db_url()
+            if not url:
+                raise RuntimeError("DATABASE_URL/NEON_DATABASE_URL não configurado")
+            _pool = ConnectionPool(
+                normalize_db_url(url),
+                min_size=DB_POOL_MIN_SIZE,
+                max_size=max(DB_POOL_MAX_SIZE, DB_POOL_MIN_SIZE),
+                timeout=DB_POOL_TIMEOUT,
+                max_idle=DB_POOL_MAX_IDLE,
+                max_lifetime=DB_POOL_MAX_LIFETIME,
+                check=ConnectionPool.check_connection,
+                name="routines",
+                open=True,
+            )
+    return _pool
+
+
+def close_pool():
+    """Fecha o pool do processo (antes do fork: conexões não podem ser compartilhadas)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def ensure_schema_once(conn):
+    """Roda as migrações uma única vez por processo"""
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if not _schema_ready:
+            if os.getenv("DB_AUTO_MIGRATE", "1") != "0":
+                run_migrations(conn)
+            _schema_ready = True
+
+
+def schema_ready() -> bool:
+    return _schema_ready
+
+
+def pool_stats() -> dict:
+    """Estatísticas do pool (vazio se ainda não foi criado)"""
+    if _pool is None:
+        return {}
+    return _pool.get_stats()
+
+
+def _get_read_urls() -> list[str]:
+    return [u for u in (os.getenv("DATABASE_READ_URL") or "").replace("\n", ",").split(",") if u.strip()]
+
+
+class ReplicaSet:
+    """Pools das réplicas de leitura e a saúde de cada uma.
+
+    Uma thread checa as réplicas a cada REPLICA_CHECK_INTERVAL; fora do ar ou com
+    lag acima de REPLICA_MAX_LAG_SECONDS a réplica sai da rotação até a próxima
+    checagem boa. Até a primeira checagem, e sem nenhuma saudável, `pick` devolve
+    None e a leitura vai para o primário. Também guarda, por usuário, a última
+    escrita feita neste processo (read-your-writes).
+    """
+
+    # Réplica em dia = recebeu e aplicou o mesmo WAL; senão, idade da última transação aplicada
+    LAG_SQL = """
+    SELECT CASE
+      WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+      ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+    """
+
+    def __init__(self, urls: list[str]):
+        self.replicas = [
+            {"name": f"replica{i}", "url": normalize_db_url(url), "pool": None, "healthy": False, "lag": None}
+            for i, url in enumerate(urls)
+        ]
+        self._lock = threading.Lock()
+        self._next = itertools.count()
+        self._thread: threading.Thread | None = None
+        self._writes: dict[int, float] = {}  # uid -> monotonic da última escrita
+
+    def _get_pool(self, replica: dict) -> ConnectionPool:
+        with self._lock:
+            if replica["pool"] is None:
+                # kwargs substitui o `options` da URL: soma o read-only ao que já vier nela
+                options = conninfo_to_dict(replica["url"]).get("options", "")
+                replica["pool"] = ConnectionPool(
+                    replica["url"],
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=max(DB_POOL_MAX_SIZE, DB_POOL_MIN_SIZE),
+                    timeout=REPLICA_CONNECT_TIMEOUT,
+                    max_idle=DB_POOL_MAX_IDLE,
+                    max_lifetime=DB_POOL_MAX_LIFETIME,
+                    check=ConnectionPool.check_connection,
+                    # Escrita por engano falha na hora, mesmo apontando para um primário
+                    kwargs={"options": f"{options} -c default_transaction_read_only=on".strip()},
+                    name=replica["name"],
+                    open=True,
+                )
+            return replica["pool"]
+
+    def pick(self) -> dict | None:
+        if not self.replicas:
+            return None
+        self._ensure_checker()
+        healthy = [r for r in self.replicas if r["healthy"]]
+        if not healthy:
+            return None
+        return healthy[next(self._next) % len(healthy)]
+
+    def connection(self, replica: dict):
+        return self._get_pool(replica).connection(timeout=REPLICA_CONNECT_TIMEOUT)
+
+    def mark_down(self, replica: dict, error: str):
+        if replica["healthy"]:
+            log(logging.WARNING, "replica_down", replica=replica["name"], error=error)
+        replica["healthy"] = False
+
+    def note_write(self, uid: int):
+        if not self.replicas:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._writes[uid] = now
+            if len(self._writes) > 10_000:
+                self._writes = {u: t for u, t in self._writes.items() if now - t < READ_AFTER_WRITE_SECONDS}
+
+    def wrote_recently(self, uid: int) -> bool:
+        last = self._writes.get(uid)
+        return last is not None and time.monotonic() - last < READ_AFTER_WRITE_SECONDS
+
+    def check(self):
+        for replica in self.replicas:
+            try:
+                with self.connection(replica) as conn:
+                    lag = float(conn.execute(self.LAG_SQL).fetchone()[0])
+            except Exception as e:
+                replica["lag"] = None
+                self.mark_down(replica, str(e))
+                continue
+            replica["lag"] = lag
+            healthy = lag <= REPLICA_MAX_LAG_SECONDS
+            if healthy != replica["healthy"]:
+                log(logging.INFO if healthy else logging.WARNING, "replica_health",
+                     replica=replica["name"], healthy=healthy, lag=round(lag, 3))
+            replica["healthy"] = healthy
+
+    def _ensure_checker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._check_loop, name="replica-check", daemon=True)
+                self._thread.start()
+
+    def _check_loop(self):
+        while True:
+            self.check()
+            time.sleep(REPLICA_CHECK_INTERVAL)
+
+    def stats(self) -> dict:
+        lags = [r["lag"] for r in self.replicas if r["lag"] is not None]
+        return {
+            "configured": len(self.replicas),
+            "healthy": sum(1 for r in self.replicas if r["healthy"]),
+            "max_lag_seconds": max(lags) if lags else 0,
+        }
+
+
+replicas = ReplicaSet(_get_read_urls())
+
+
+def reset_after_fork():
+    """Pools e threads não atravessam o fork: o worker recria os seus sob demanda"""
+    global _pool, _pool_lock, replicas
+    _pool = None
+    _pool_lock = threading.Lock()
+    replicas = ReplicaSet(_get_read_urls())
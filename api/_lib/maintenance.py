@@ -0,0 +1,276 @@
+import logging
+import threading
+import time
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+import psycopg
+from psycopg import sql as pg_sql
+
+from .db import get_pool
+from .observability import log
+from .ratelimit import cleanup_rate_limits
+from .settings import (
+    ARCHIVE_BATCH,
+    BULK_REV_SETTING,
+    EVENT_RETENTION_HOURS,
+    MAINTENANCE_INTERVAL_SECONDS,
+    PARTITION_MONTHS_AHEAD,
+    RATE_LIMIT_BACKEND,
+    TOMBSTONE_RETENTION_DAYS,
+)
+
+
+# -------- Tombstones --------
+def compact_tombstones(conn) -> int:
+    """Remove tombstones mais antigos que TOMBSTONE_RETENTION_DAYS e registra em
+    users.compacted_rev até onde cada usuário perdeu histórico de deletes"""
+    with conn.cursor() as cur:
+        # Instâncias de recorrência ficam: o tombstone impede a ocorrência de voltar como virtual
+        cur.execute(
+            """
+            WITH gone AS (
+              DELETE FROM routines
+              WHERE deleted_at < NOW() - make_interval(days => %s) AND recurrence_id IS NULL
+              RETURNING user_id, change_rev
+            ), per_user AS (
+              SELECT user_id, MAX(change_rev) AS rev, COUNT(*) AS n FROM gone GROUP BY user_id
+            )
+            UPDATE users u SET compacted_rev = GREATEST(u.compacted_rev, p.rev)
+            FROM per_user p WHERE u.id = p.user_id
+            RETURNING p.n
+            """,
+            (TOMBSTONE_RETENTION_DAYS,),
+        )
+        removed = sum(r[0] for r in cur.fetchall())
+    conn.commit()
+    return removed
+
+
+# -------- Eventos --------
+def prune_events(conn) -> int:
+    """Remove de routine_events o que passou de EVENT_RETENTION_HOURS. Roda aqui, e não no
+    hub: toda escrita grava um evento, haja ou não algum stream aberto"""
+    with conn.cursor() as cur:
+        cur.execute(
+            "DELETE FROM routine_events WHERE created_at < NOW() - make_interval(hours => %s)",
+            (EVENT_RETENTION_HOURS,),
+        )
+        removed = cur.rowcount
+    conn.commit()
+    return removed
+
+
+# -------- Partições e arquivo --------
+def add_months(month: date, n: int) -> date:
+    years, index = divmod(month.month - 1 + n, 12)
+    return date(month.year + years, index + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"routines_{month:%Y_%m}"
+
+
+DEFAULT_PARTITION = "routines_default"
+
+
+def _attach_from_default(cur, name: str, start: str, stop: str):
+    """Cria a partição `name` com as linhas do intervalo que estão na DEFAULT e a anexa"""
+    cur.execute(
+        """
+        SELECT attname FROM pg_attribute
+        WHERE attrelid = 'routines'::regclass AND attnum > 0 AND NOT attisdropped ORDER BY attnum
+        """
+    )
+    cols = pg_sql.SQL(", ").join(pg_sql.Identifier(r[0]) for r in cur.fetchall())
+    table = pg_sql.Identifier(name)
+    cur.execute(pg_sql.SQL("CREATE TABLE {} (LIKE routines INCLUDING DEFAULTS INCLUDING CONSTRAINTS)").format(table))
+    # Mudança de lugar, não de conteúdo: sem revisão nem evento 'deleted' por linha
+    cur.execute("SELECT set_config(%s, '0', true)", (BULK_REV_SETTING,))
+    cur.execute(
+        pg_sql.SQL(
+            """
+            WITH moved AS (
+              DELETE FROM {} WHERE created_at >= %s AND created_at < %s RETURNING {}
+            )
+            INSERT INTO {} ({}) SELECT {} FROM moved
+            """
+        ).format(pg_sql.Identifier(DEFAULT_PARTITION), cols, table, cols, cols),
+        (start, stop),
+    )
+    cur.execute("SELECT set_config(%s, '', true)", (BULK_REV_SETTING,))
+    cur.execute(
+        pg_sql.SQL("ALTER TABLE routines ATTACH PARTITION {} FOR VALUES FROM ({}) TO ({})").format(
+            table, pg_sql.Literal(start), pg_sql.Literal(stop)
+        )
+    )
+
+
+def ensure_partitions(conn, months_ahead: int = PARTITION_MONTHS_AHEAD) -> list[str]:
+    """Cria as partições mensais de routines do mês atual até `months_ahead` à frente.
+
+    Um mês ainda sem partição cai na DEFAULT (dia futuro materializado, import com
+    created_at adiante). Quando ele entra no horizonte, essas linhas passam para a
+    partição nova antes de ela ser anexada; senão o CREATE falharia a cada rodada.
+    """
+    created = []
+    first = datetime.now(ZoneInfo("UTC")).date().replace(day=1)
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass(%s)", (DEFAULT_PARTITION,))
+        has_default = cur.fetchone()[0] is not None
+        for i in range(months_ahead + 1):
+            month = add_months(first, i)
+            name = partition_name(month)
+            cur.execute("SELECT to_regclass(%s)", (name,))
+            if cur.fetchone()[0]:
+                continue
+            start, stop = f"{month} 00:00+00", f"{add_months(month, 1)} 00:00+00"
+            try:
+                # Savepoint: uma falha deixa o mês na DEFAULT sem derrubar os demais
+                with conn.transaction():
+                    in_default = False
+                    if has_default:
+                        # Nenhuma linha nova entra na DEFAULT entre a checagem e o ATTACH
+                        cur.execute(
+                            pg_sql.SQL("LOCK TABLE {} IN SHARE ROW EXCLUSIVE MODE").format(
+                                pg_sql.Identifier(DEFAULT_PARTITION)
+                            )
+                        )
+                        cur.execute(
+                            pg_sql.SQL("SELECT EXISTS (SELECT 1 FROM {} WHERE created_at >= %s AND created_at < %s)").format(
+                                pg_sql.Identifier(DEFAULT_PARTITION)
+                            ),
+                            (start, stop),
+                        )
+                        in_default = cur.fetchone()[0]
+                    if in_default:
+                        _attach_from_default(cur, name, start, stop)
+                    else:
+                        cur.execute(
+                            pg_sql.SQL("CREATE TABLE {} PARTITION OF routines FOR VALUES FROM ({}) TO ({})").format(
+                                pg_sql.Identifier(name), pg_sql.Literal(start), pg_sql.Literal(stop)
+                            )
+                        )
+                created.append(name)
+            except psycopg.Error as e:
+                log(logging.WARNING, "partition_create_failed", partition=name, error=str(e))
+    conn.commit()
+    return created
+
+
+def archive_routines(conn, before: date, batch: int = ARCHIVE_BATCH) -> int:
+    """Move rotinas feitas criadas antes de `before` para routines_archive, em lotes.
+
+    Para o usuário nada muda: as listas e o delta sync leem também o arquivo (com a
+    mesma change_rev), então a linha sai da tabela ativa sem tombstone nem evento.
+    O progresso também não muda: user_daily_progress já contou a rotina, e o backfill
+    de quem ainda não tem progresso (lock_progress) soma o arquivo às rotinas ativas.
+    """
+    moved = 0
+    with conn.cursor() as cur:
+        while True:
+            # Desliga os triggers por linha (revisão do usuário e evento 'deleted')
+            cur.execute("SELECT set_config(%s, '0', true)", (BULK_REV_SETTING,))
+            cur.execute(
+                """
+                WITH picked AS (
+                  SELECT id, created_at FROM routines
+                  WHERE created_at < %s::date::timestamp AT TIME ZONE 'UTC' AND status = 'feita' AND deleted_at IS NULL
+                  LIMIT %s
+                  FOR UPDATE SKIP LOCKED
+                ), gone AS (
+                  DELETE FROM routines r USING picked p
+                  WHERE r.id = p.id AND r.created_at = p.created_at
+                  RETURNING r.id, r.user_id, r.title, r.created_at, r.recurrence_id, r.occurrence_date,
+                            r.change_rev, r.updated_at, r.imported
+                ), archived AS (
+                  INSERT INTO routines_archive(
+                    id, user_id, title, created_at, recurrence_id, occurrence_date, change_rev, updated_at, imported
+                  )
+                  SELECT id, user_id, title, created_at, recurrence_id, occurrence_date, change_rev, updated_at, imported
+                  FROM gone
+                  ON CONFLICT DO NOTHING
+                )
+                SELECT count(*) FROM gone
+                """,
+                (before, batch),
+            )
+            # Conta o que saiu da tabela ativa: um conflito no arquivo não encerra o laço antes da hora
+            n = cur.fetchone()[0]
+            conn.commit()
+            moved += n
+            if n < batch:
+                return moved
+
+
+# Rotina arquivada que volta a ser editada: sai do arquivo e reentra em routines
+UNARCHIVE_SQL = """
+WITH gone AS (
+  DELETE FROM routines_archive WHERE user_id = %s AND id = %s
+  RETURNING id, user_id, title, created_at, recurrence_id, occurrence_date, imported
+)
+INSERT INTO routines(id, user_id, title, status, created_at, recurrence_id, occurrence_date, imported)
+SELECT id, user_id, title, 'feita', created_at, recurrence_id, occurrence_date, imported FROM gone
+"""
+
+
+def unarchive_routine(cur, uid: int, rid: int) -> bool:
+    """Devolve uma rotina arquivada à tabela ativa (na transação de `cur`) para que a
+    escrita seguinte siga o caminho normal, com revisão e evento; False se não há
+    rotina arquivada com esse id"""
+    # A volta em si não é mudança para o usuário: sem os triggers por linha
+    cur.execute("SELECT set_config(%s, '0', true)", (BULK_REV_SETTING,))
+    cur.execute(UNARCHIVE_SQL, (uid, rid))
+    moved = cur.rowcount > 0
+    cur.execute("SELECT set_config(%s, '', true)", (BULK_REV_SETTING,))
+    return moved
+
+
+def drop_empty_partitions(conn, before: date) -> list[str]:
+    """Remove partições mensais vazias inteiramente anteriores a `before`"""
+    dropped = []
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'routines'::regclass AND c.relname ~ '^routines_[0-9]{4}_[0-9]{2}$'
+            ORDER BY c.relname
+            """
+        )
+        for (name,) in cur.fetchall():
+            month = date(int(name[9:13]), int(name[14:16]), 1)
+            if add_months(month, 1) > before:
+                continue
+            cur.execute(pg_sql.SQL("SELECT EXISTS (SELECT 1 FROM {})").format(pg_sql.Identifier(name)))
+            if not cur.fetchone()[0]:
+                cur.execute(pg_sql.SQL("DROP TABLE {}").format(pg_sql.Identifier(name)))
+                dropped.append(name)
+    conn.commit()
+    return dropped
+
+
+def _maintenance_loop():
+    while True:
+        time.sleep(MAINTENANCE_INTERVAL_SECONDS)
+        try:
+            with get_pool().connection() as conn:
+                removed = compact_tombstones(conn)
+                events = prune_events(conn)
+                created = ensure_partitions(conn)
+                buckets = cleanup_rate_limits(conn) if RATE_LIMIT_BACKEND == "postgres" else 0
+            log(
+                logging.INFO,
+                "maintenance",
+                tombstones_removed=removed,
+                events_removed=events,
+                partitions_created=created,
+                rate_limits_removed=buckets,
+            )
+        except Exception as e:
+            log(logging.WARNING, "maintenance_error", error=str(e))
+
+
+def start_maintenance():
+    """Compactação periódica em background (processos de longa duração)"""
+    if MAINTENANCE_INTERVAL_SECONDS > 0:
+        threading.Thread(target=_maintenance_loop, name="maintenance", daemon=True).start()
@@ -0,0 +1,586 @@
+from .settings import PARTITION_MONTHS_AHEAD
+
+USERS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS users (
+  id SERIAL PRIMARY KEY,
+  provider TEXT NOT NULL,
+  provider_id TEXT NOT NULL UNIQUE,
+  email TEXT NOT NULL UNIQUE,
+  name TEXT,
+  picture TEXT,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+"""
+
+ROUTINES_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS routines (
+  id SERIAL PRIMARY KEY,
+  user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  title TEXT NOT NULL,
+  status TEXT NOT NULL DEFAULT 'pendente' CHECK (status IN ('pendente', 'feita')),
+  created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+"""
+
+SCHEMA_MIGRATIONS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+  version INTEGER PRIMARY KEY,
+  name TEXT NOT NULL,
+  applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+"""
+
+# Chave do advisory lock que serializa migrações entre processos/instâncias
+MIGRATIONS_LOCK_ID = 727_001
+
+# Migrações versionadas: (versão, nome, comandos). Nunca editar uma já publicada,
+# sempre acrescentar uma nova versão no final.
+MIGRATIONS = [
+    (1, "create_users_routines", [USERS_TABLE_SQL, ROUTINES_TABLE_SQL]),
+    (2, "routines_user_id_required", [
+        # Bancos antigos tinham routines sem user_id
+        "ALTER TABLE routines ADD COLUMN IF NOT EXISTS user_id INTEGER",
+        "DELETE FROM routines WHERE user_id IS NULL",
+        "ALTER TABLE routines ALTER COLUMN user_id SET NOT NULL",
+        """
+        DO $$
+        BEGIN
+          IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'routines_user_id_fkey') THEN
+            ALTER TABLE routines ADD CONSTRAINT routines_user_id_fkey
+              FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE;
+          END IF;
+        END $$;
+        """,
+    ]),
+    (3, "routines_user_created_idx", [
+        # Atende WHERE user_id = ? ORDER BY created_at DESC, id DESC sem sort
+        "CREATE INDEX IF NOT EXISTS routines_user_created_idx ON routines (user_id, created_at DESC, id DESC)",
+    ]),
+    (4, "users_revision", [
+        # Contador por usuário incrementado a cada escrita; base dos ETags
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS revision BIGINT NOT NULL DEFAULT 0",
+        """
+        CREATE OR REPLACE FUNCTION bump_user_revision() RETURNS trigger AS $$
+        BEGIN
+          IF TG_OP = 'DELETE' THEN
+            UPDATE users SET revision = revision + 1 WHERE id = OLD.user_id;
+            RETURN OLD;
+          END IF;
+          UPDATE users SET revision = revision + 1 WHERE id = NEW.user_id;
+          RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS routines_bump_revision ON routines",
+        """
+        CREATE TRIGGER routines_bump_revision
+        AFTER INSERT OR UPDATE OR DELETE ON routines
+        FOR EACH ROW EXECUTE FUNCTION bump_user_revision()
+        """,
+    ]),
+    (5, "user_progress", [
+        # Preenchidas de forma preguiçosa por usuário (ver lock_progress)
+        """
+        CREATE TABLE IF NOT EXISTS user_progress (
+          user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+          xp INTEGER NOT NULL DEFAULT 0,
+          level INTEGER NOT NULL DEFAULT 1,
+          total_created INTEGER NOT NULL DEFAULT 0,
+          total_done INTEGER NOT NULL DEFAULT 0,
+          current_streak INTEGER NOT NULL DEFAULT 0,
+          best_streak INTEGER NOT NULL DEFAULT 0,
+          last_done_day DATE,
+          updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_daily_progress (
+          user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+          day DATE NOT NULL,
+          created INTEGER NOT NULL DEFAULT 0,
+          done INTEGER NOT NULL DEFAULT 0,
+          PRIMARY KEY (user_id, day)
+        )
+        """,
+    ]),
+    (6, "user_achievements", [
+        """
+        CREATE TABLE IF NOT EXISTS user_achievements (
+          user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+          achievement_id TEXT NOT NULL,
+          unlocked_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+          PRIMARY KEY (user_id, achievement_id)
+        )
+        """,
+        # Versão do catálogo já avaliada para o usuário (reavaliação completa quando menor)
+        "ALTER TABLE user_progress ADD COLUMN IF NOT EXISTS achievements_version INTEGER NOT NULL DEFAULT 0",
+    ]),
+    (7, "recurrences", [
+        """
+        CREATE TABLE IF NOT EXISTS recurrences (
+          id SERIAL PRIMARY KEY,
+          user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+          title TEXT NOT NULL,
+          kind TEXT NOT NULL CHECK (kind IN ('daily', 'weekdays', 'every_n', 'weekly')),
+          interval_days INTEGER NOT NULL DEFAULT 1 CHECK (interval_days >= 1),
+          weekdays SMALLINT[] NOT NULL DEFAULT '{}',
+          start_date DATE NOT NULL,
+          end_date DATE,
+          tz TEXT NOT NULL DEFAULT 'UTC',
+          created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS recurrences_user_idx ON recurrences (user_id)",
+        "ALTER TABLE routines ADD COLUMN IF NOT EXISTS recurrence_id INTEGER REFERENCES recurrences(id) ON DELETE SET NULL",
+        "ALTER TABLE routines ADD COLUMN IF NOT EXISTS occurrence_date DATE",
+        # Materialização idempotente: no máximo uma instância por recorrência/dia
+        "CREATE UNIQUE INDEX IF NOT EXISTS routines_recurrence_day_idx ON routines (recurrence_id, occurrence_date)",
+    ]),
+    (8, "routine_events", [
+        # Log curto de mudanças (replay via Last-Event-ID) + NOTIFY para o stream SSE
+        """
+        CREATE TABLE IF NOT EXISTS routine_events (
+          id BIGSERIAL PRIMARY KEY,
+          user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+          type TEXT NOT NULL,
+          routine_id INTEGER NOT NULL,
+          item JSONB,
+          created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS routine_events_user_idx ON routine_events (user_id, id)",
+        "CREATE INDEX IF NOT EXISTS routine_events_created_idx ON routine_events (created_at)",
+        """
+        CREATE OR REPLACE FUNCTION record_routine_event() RETURNS trigger AS $$
+        DECLARE
+          r routines;
+          ev_type TEXT;
+          ev_id BIGINT;
+        BEGIN
+          IF TG_OP = 'DELETE' THEN
+            r := OLD;
+            ev_type := 'deleted';
+          ELSIF TG_OP = 'INSERT' THEN
+            r := NEW;
+            ev_type := 'created';
+          ELSIF NEW.status IS DISTINCT FROM OLD.status THEN
+            r := NEW;
+            ev_type := 'status';
+          ELSE
+            r := NEW;
+            ev_type := 'updated';
+          END IF;
+          INSERT INTO routine_events(user_id, type, routine_id, item)
+          VALUES (
+            r.user_id, ev_type, r.id,
+            CASE WHEN TG_OP = 'DELETE' THEN NULL
+                 ELSE jsonb_build_object('id', r.id, 'title', r.title, 'status', r.status, 'created_at', r.created_at)
+            END
+          )
+          RETURNING id INTO ev_id;
+          PERFORM pg_notify('routine_events', json_build_object('id', ev_id, 'user_id', r.user_id)::text);
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS routines_record_event ON routines",
+        """
+        CREATE TRIGGER routines_record_event
+        AFTER INSERT OR UPDATE OR DELETE ON routines
+        FOR EACH ROW EXECUTE FUNCTION record_routine_event()
+        """,
+    ]),
+    (9, "routines_sync", [
+        # Delta sync: cada escrita carimba a linha com a nova revisão do usuário (change_rev).
+        # Escritas de um usuário se serializam no lock da linha em users, então as revisões
+        # ficam visíveis em ordem e servem de token de sync sem perder commits atrasados.
+        "ALTER TABLE routines ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()",
+        "ALTER TABLE routines ADD COLUMN IF NOT EXISTS change_rev BIGINT NOT NULL DEFAULT 0",
+        # Tombstone: DELETE vira deleted_at; compact_tombstones remove os antigos
+        "ALTER TABLE routines ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ",
+        # Maior change_rev já compactado: tokens anteriores exigem sync completo
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS compacted_rev BIGINT NOT NULL DEFAULT 0",
+        "CREATE INDEX IF NOT EXISTS routines_user_change_idx ON routines (user_id, change_rev, id)",
+        "CREATE INDEX IF NOT EXISTS routines_tombstones_idx ON routines (deleted_at) WHERE deleted_at IS NOT NULL",
+        """
+        CREATE OR REPLACE FUNCTION bump_user_revision() RETURNS trigger AS $$
+        BEGIN
+          IF TG_OP = 'DELETE' THEN
+            -- Compactar tombstones não muda o que o usuário vê
+            IF OLD.deleted_at IS NULL THEN
+              UPDATE users SET revision = revision + 1 WHERE id = OLD.user_id;
+            END IF;
+            RETURN OLD;
+          END IF;
+          UPDATE users SET revision = revision + 1 WHERE id = NEW.user_id RETURNING revision INTO NEW.change_rev;
+          NEW.updated_at := clock_timestamp();
+          RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        # BEFORE para conseguir gravar change_rev/updated_at na própria linha
+        "DROP TRIGGER IF EXISTS routines_bump_revision ON routines",
+        """
+        CREATE TRIGGER routines_bump_revision
+        BEFORE INSERT OR UPDATE OR DELETE ON routines
+        FOR EACH ROW EXECUTE FUNCTION bump_user_revision()
+        """,
+        """
+        CREATE OR REPLACE FUNCTION record_routine_event() RETURNS trigger AS $$
+        DECLARE
+          r routines;
+          ev_type TEXT;
+          ev_id BIGINT;
+        BEGIN
+          IF TG_OP = 'DELETE' THEN
+            IF OLD.deleted_at IS NOT NULL THEN
+              RETURN NULL;  -- compactação: o evento 'deleted' já foi emitido
+            END IF;
+            r := OLD;
+            ev_type := 'deleted';
+          ELSIF TG_OP = 'INSERT' THEN
+            r := NEW;
+            ev_type := 'created';
+          ELSIF NEW.deleted_at IS NOT NULL THEN
+            IF OLD.deleted_at IS NOT NULL THEN
+              RETURN NULL;
+            END IF;
+            r := NEW;
+            ev_type := 'deleted';
+          ELSIF NEW.status IS DISTINCT FROM OLD.status THEN
+            r := NEW;
+            ev_type := 'status';
+          ELSE
+            r := NEW;
+            ev_type := 'updated';
+          END IF;
+          INSERT INTO routine_events(user_id, type, routine_id, item)
+          VALUES (
+            r.user_id, ev_type, r.id,
+            CASE WHEN ev_type = 'deleted' THEN NULL
+                 ELSE jsonb_build_object('id', r.id, 'title', r.title, 'status', r.status, 'created_at', r.created_at)
+            END
+          )
+          RETURNING id INTO ev_id;
+          PERFORM pg_notify('routine_events', json_build_object('id', ev_id, 'user_id', r.user_id)::text);
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+    ]),
+    (10, "routines_partitioned", [
+        # routines vira tabela particionada por mês em created_at (UTC). Toda chave única
+        # precisa conter a chave de partição: PK (id, created_at) e a unicidade da
+        # ocorrência ganha created_at (determinístico a partir de dia + fuso da regra).
+        """
+        CREATE TABLE routines_new (
+          id INTEGER NOT NULL,
+          user_id INTEGER NOT NULL,
+          title TEXT NOT NULL,
+          status TEXT NOT NULL DEFAULT 'pendente',
+          created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+          recurrence_id INTEGER,
+          occurrence_date DATE,
+          updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+          change_rev BIGINT NOT NULL DEFAULT 0,
+          deleted_at TIMESTAMPTZ,
+          CONSTRAINT routines_new_pkey PRIMARY KEY (id, created_at),
+          CONSTRAINT routines_user_id_fkey FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+          CONSTRAINT routines_recurrence_id_fkey FOREIGN KEY (recurrence_id) REFERENCES recurrences(id) ON DELETE SET NULL,
+          CONSTRAINT routines_status_check CHECK (status IN ('pendente', 'feita'))
+        ) PARTITION BY RANGE (created_at)
+        """,
+        # Um mês por partição, do dado mais antigo até PARTITION_MONTHS_AHEAD à frente;
+        # a DEFAULT recebe o que cair fora (ex.: dias futuros distantes materializados)
+        f"""
+        DO $$
+        DECLARE
+          m DATE;
+          stop DATE := (date_trunc('month', NOW() AT TIME ZONE 'UTC') + interval '{PARTITION_MONTHS_AHEAD + 1} months')::date;
+        BEGIN
+          SELECT date_trunc('month', MIN(created_at) AT TIME ZONE 'UTC')::date INTO m FROM routines WHERE created_at < NOW();
+          m := COALESCE(m, date_trunc('month', NOW() AT TIME ZONE 'UTC')::date);
+          WHILE m < stop LOOP
+            EXECUTE format(
+              'CREATE TABLE %I PARTITION OF routines_new FOR VALUES FROM (%L) TO (%L)',
+              'routines_' || to_char(m, 'YYYY_MM'), m || ' 00:00+00', (m + interval '1 month')::date || ' 00:00+00'
+            );
+            m := (m + interval '1 month')::date;
+          END LOOP;
+        END $$
+        """,
+        "CREATE TABLE routines_default PARTITION OF routines_new DEFAULT",
+        """
+        INSERT INTO routines_new
+          (id, user_id, title, status, created_at, recurrence_id, occurrence_date, updated_at, change_rev, deleted_at)
+        SELECT id, user_id, title, status, created_at, recurrence_id, occurrence_date, updated_at, change_rev, deleted_at
+        FROM routines
+        """,
+        # Troca as tabelas mantendo a sequência de ids (era do SERIAL da tabela antiga)
+        """
+        DO $$
+        DECLARE
+          seq TEXT := pg_get_serial_sequence('routines', 'id');
+        BEGIN
+          EXECUTE format('ALTER SEQUENCE %s OWNED BY NONE', seq);
+          EXECUTE format('ALTER TABLE routines_new ALTER COLUMN id SET DEFAULT nextval(%L::regclass)', seq);
+          DROP TABLE routines;
+          ALTER TABLE routines_new RENAME TO routines;
+          ALTER INDEX routines_new_pkey RENAME TO routines_pkey;
+          EXECUTE format('ALTER SEQUENCE %s OWNED BY routines.id', seq);
+        END $$
+        """,
+        # Índices no pai são criados em cada partição (atuais e futuras)
+        "CREATE INDEX routines_user_created_idx ON routines (user_id, created_at DESC, id DESC)",
+        "CREATE INDEX routines_user_change_idx ON routines (user_id, change_rev, id)",
+        "CREATE INDEX routines_tombstones_idx ON routines (deleted_at) WHERE deleted_at IS NOT NULL",
+        "CREATE UNIQUE INDEX routines_recurrence_day_idx ON routines (recurrence_id, occurrence_date, created_at)",
+        # RECORD em vez do tipo-linha routines: NEW/OLD vêm das partições
+        """
+        CREATE OR REPLACE FUNCTION record_routine_event() RETURNS trigger AS $$
+        DECLARE
+          r RECORD;
+          ev_type TEXT;
+          ev_id BIGINT;
+        BEGIN
+          IF TG_OP = 'DELETE' THEN
+            IF OLD.deleted_at IS NOT NULL THEN
+              RETURN NULL;  -- compactação: o evento 'deleted' já foi emitido
+            END IF;
+            r := OLD;
+            ev_type := 'deleted';
+          ELSIF TG_OP = 'INSERT' THEN
+            r := NEW;
+            ev_type := 'created';
+          ELSIF NEW.deleted_at IS NOT NULL THEN
+            IF OLD.deleted_at IS NOT NULL THEN
+              RETURN NULL;
+            END IF;
+            r := NEW;
+            ev_type := 'deleted';
+          ELSIF NEW.status IS DISTINCT FROM OLD.status THEN
+            r := NEW;
+            ev_type := 'status';
+          ELSE
+            r := NEW;
+            ev_type := 'updated';
+          END IF;
+          INSERT INTO routine_events(user_id, type, routine_id, item)
+          VALUES (
+            r.user_id, ev_type, r.id,
+            CASE WHEN ev_type = 'deleted' THEN NULL
+                 ELSE jsonb_build_object('id', r.id, 'title', r.title, 'status', r.status, 'created_at', r.created_at)
+            END
+          )
+          RETURNING id INTO ev_id;
+          PERFORM pg_notify('routine_events', json_build_object('id', ev_id, 'user_id', r.user_id)::text);
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE TRIGGER routines_bump_revision
+        BEFORE INSERT OR UPDATE OR DELETE ON routines
+        FOR EACH ROW EXECUTE FUNCTION bump_user_revision()
+        """,
+        """
+        CREATE TRIGGER routines_record_event
+        AFTER INSERT OR UPDATE OR DELETE ON routines
+        FOR EACH ROW EXECUTE FUNCTION record_routine_event()
+        """,
+    ]),
+    (11, "routines_archive", [
+        # Rotinas feitas antigas movidas por archive_routines: sem status (sempre 'feita')
+        # nem colunas de sync; a PK atende as consultas por usuário e intervalo
+        """
+        CREATE TABLE IF NOT EXISTS routines_archive (
+          id INTEGER NOT NULL,
+          user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+          title TEXT NOT NULL,
+          created_at TIMESTAMPTZ NOT NULL,
+          recurrence_id INTEGER,
+          occurrence_date DATE,
+          archived_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+          PRIMARY KEY (user_id, created_at, id)
+        )
+        """,
+    ]),
+    (12, "rate_limits", [
+        # Buckets compartilhados entre instâncias (RATE_LIMIT_BACKEND=postgres); UNLOGGED
+        # porque perder o estado num crash só zera os limites
+        """
+        CREATE UNLOGGED TABLE IF NOT EXISTS rate_limits (
+          key TEXT PRIMARY KEY,
+          tokens DOUBLE PRECISION NOT NULL,
+          updated_at TIMESTAMPTZ NOT NULL
+        )
+        """,
+    ]),
+    (13, "users_profile_notify", [
+        # Qualquer escrita que muda o perfil (upsert do login, UPDATE/DELETE manual)
+        # invalida o cache de /api/me em todos os processos
+        """
+        CREATE OR REPLACE FUNCTION notify_profile_change() RETURNS trigger AS $$
+        BEGIN
+          PERFORM pg_notify('profile_changes', OLD.id::text);
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS users_profile_update ON users",
+        """
+        CREATE TRIGGER users_profile_update
+        AFTER UPDATE OF email, name, picture ON users
+        FOR EACH ROW
+        WHEN (
+          OLD.email IS DISTINCT FROM NEW.email
+          OR OLD.name IS DISTINCT FROM NEW.name
+          OR OLD.picture IS DISTINCT FROM NEW.picture
+        )
+        EXECUTE FUNCTION notify_profile_change()
+        """,
+        "DROP TRIGGER IF EXISTS users_profile_delete ON users",
+        """
+        CREATE TRIGGER users_profile_delete
+        AFTER DELETE ON users
+        FOR EACH ROW EXECUTE FUNCTION notify_profile_change()
+        """,
+    ]),
+    (14, "routines_bulk_import", [
+        # Import em massa: com routines.bulk_rev definido (SET LOCAL) as linhas recebem
+        # essa revisão direto, sem UPDATE em users nem evento/NOTIFY por linha
+        """
+        CREATE OR REPLACE FUNCTION stamp_bulk_revision() RETURNS trigger AS $$
+        BEGIN
+          NEW.change_rev := current_setting('routines.bulk_rev')::bigint;
+          NEW.updated_at := clock_timestamp();
+          RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS routines_bump_revision ON routines",
+        """
+        CREATE TRIGGER routines_bump_revision
+        BEFORE INSERT OR UPDATE OR DELETE ON routines
+        FOR EACH ROW WHEN (COALESCE(current_setting('routines.bulk_rev', true), '') = '')
+        EXECUTE FUNCTION bump_user_revision()
+        """,
+        "DROP TRIGGER IF EXISTS routines_bulk_revision ON routines",
+        """
+        CREATE TRIGGER routines_bulk_revision
+        BEFORE INSERT ON routines
+        FOR EACH ROW WHEN (COALESCE(current_setting('routines.bulk_rev', true), '') <> '')
+        EXECUTE FUNCTION stamp_bulk_revision()
+        """,
+        "DROP TRIGGER IF EXISTS routines_record_event ON routines",
+        """
+        CREATE TRIGGER routines_record_event
+        AFTER INSERT OR UPDATE OR DELETE ON routines
+        FOR EACH ROW WHEN (COALESCE(current_setting('routines.bulk_rev', true), '') = '')
+        EXECUTE FUNCTION record_routine_event()
+        """,
+    ]),
+    (15, "routines_imported", [
+        # Linhas importadas ficam fora do progresso até a primeira mudança de status
+        "ALTER TABLE routines ADD COLUMN IF NOT EXISTS imported BOOLEAN NOT NULL DEFAULT FALSE",
+    ]),
+    (16, "routines_archive_sync", [
+        # Arquivar não apaga: a rotina segue no delta sync pelo arquivo, com a revisão que tinha
+        "ALTER TABLE routines_archive ADD COLUMN IF NOT EXISTS change_rev BIGINT NOT NULL DEFAULT 0",
+        "ALTER TABLE routines_archive ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ",
+        "CREATE INDEX IF NOT EXISTS routines_archive_user_rev_idx ON routines_archive(user_id, change_rev, id)",
+        # Arquivamentos anteriores deixaram tombstones: com uma revisão nova, os clientes que
+        # já os aplicaram recebem as rotinas de volta no próximo delta sync
+        """
+        UPDATE users u SET revision = revision + 1
+        WHERE EXISTS (SELECT 1 FROM routines_archive a WHERE a.user_id = u.id)
+        """,
+        "UPDATE routines_archive a SET change_rev = u.revision FROM users u WHERE u.id = a.user_id",
+        # Sem os triggers por linha: remover esses tombstones não gera revisão nem evento
+        "SELECT set_config('routines.bulk_rev', '0', true)",
+        """
+        DELETE FROM routines r USING routines_archive a
+        WHERE r.id = a.id AND r.user_id = a.user_id AND r.deleted_at IS NOT NULL
+        """,
+    ]),
+    (17, "routine_events_user_delete", [
+        # DELETE em users apaga as rotinas em cascade, e o evento 'deleted' violaria a FK de routine_events
+        """
+        CREATE OR REPLACE FUNCTION record_routine_event() RETURNS trigger AS $$
+        DECLARE
+          r RECORD;
+          ev_type TEXT;
+          ev_id BIGINT;
+        BEGIN
+          IF TG_OP = 'DELETE' THEN
+            IF OLD.deleted_at IS NOT NULL THEN
+              RETURN NULL;  -- compactação: o evento 'deleted' já foi emitido
+            END IF;
+            IF NOT EXISTS (SELECT 1 FROM users WHERE id = OLD.user_id) THEN
+              RETURN NULL;  -- apagada em cascade com o usuário: não há a quem avisar
+            END IF;
+            r := OLD;
+            ev_type := 'deleted';
+          ELSIF TG_OP = 'INSERT' THEN
+            r := NEW;
+            ev_type := 'created';
+          ELSIF NEW.deleted_at IS NOT NULL THEN
+            IF OLD.deleted_at IS NOT NULL THEN
+              RETURN NULL;
+            END IF;
+            r := NEW;
+            ev_type := 'deleted';
+          ELSIF NEW.status IS DISTINCT FROM OLD.status THEN
+            r := NEW;
+            ev_type := 'status';
+          ELSE
+            r := NEW;
+            ev_type := 'updated';
+          END IF;
+          INSERT INTO routine_events(user_id, type, routine_id, item)
+          VALUES (
+            r.user_id, ev_type, r.id,
+            CASE WHEN ev_type = 'deleted' THEN NULL
+                 ELSE jsonb_build_object('id', r.id, 'title', r.title, 'status', r.status, 'created_at', r.created_at)
+            END
+          )
+          RETURNING id INTO ev_id;
+          PERFORM pg_notify('routine_events', json_build_object('id', ev_id, 'user_id', r.user_id)::text);
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+    ]),
+    (18, "routines_archive_imported", [
+        # Importadas nunca alteradas continuam fora do progresso depois de arquivadas
+        "ALTER TABLE routines_archive ADD COLUMN IF NOT EXISTS imported BOOLEAN NOT NULL DEFAULT FALSE",
+    ]),
+]
+
+
+def run_migrations(conn) -> list[int]:
+    """Aplica as migrações pendentes e retorna as versões aplicadas"""
+    applied_now = []
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATIONS_LOCK_ID,))
+        try:
+            cur.execute(SCHEMA_MIGRATIONS_TABLE_SQL)
+            cur.execute("SELECT version FROM schema_migrations")
+            applied = {r[0] for r in cur.fetchall()}
+            conn.commit()
+            for version, name, statements in MIGRATIONS:
+                if version in applied:
+                    continue
+                # Cada migração roda na sua própria transação
+                for stmt in statements:
+                    cur.execute(stmt)
+                cur.execute("INSERT INTO schema_migrations(version, name) VALUES(%s, %s)", (version, name))
+                conn.commit()
+                applied_now.append(version)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATIONS_LOCK_ID,))
+            conn.commit()
+    return applied_now
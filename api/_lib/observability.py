@@ -0,0 +1,93 @@
+import json
+import logging
+import threading
+
+from .settings import LATENCY_BUCKETS, LOG_LEVEL
+
+
+# -------- Logs --------
+logger = logging.getLogger("routines")
+if LOG_LEVEL == "OFF":
+    logger.disabled = True
+else:
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    logger.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+
+
+def log(level: int, event: str, **fields):
+    """Log estruturado: `evento chave=valor ...`"""
+    if not logger.isEnabledFor(level):
+        return
+    extra = " ".join(f"{k}={json.dumps(v, default=str)}" for k, v in fields.items())
+    logger.log(level, f"{event} {extra}" if extra else event)
+
+
+# -------- Métricas --------
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Metrics:
+    """Contadores e histogramas em memória, expostos em formato Prometheus"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: dict[tuple, int] = {}
+        self.latency: dict[tuple, Histogram] = {}
+        self.phases: dict[str, Histogram] = {}
+        self.rejected: dict[str, int] = {}
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, phases: dict):
+        with self._lock:
+            key = (method, route, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.latency.setdefault((method, route), Histogram()).observe(seconds)
+            for phase, value in phases.items():
+                self.phases.setdefault(phase, Histogram()).observe(value)
+
+    def observe_rejected(self, reason: str):
+        with self._lock:
+            self.rejected[reason] = self.rejected.get(reason, 0) + 1
+
+    def _histogram_lines(self, name: str, labels: str, h: Histogram) -> list[str]:
+        sep = "," if labels else ""
+        lines = [f'{name}_bucket{{{labels}{sep}le="{b}"}} {c}' for b, c in zip(h.buckets, h.counts)]
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {h.count}')
+        lines.append(f"{name}_sum{{{labels}}} {h.sum}")
+        lines.append(f"{name}_count{{{labels}}} {h.count}")
+        return lines
+
+    def render(self, gauges: dict[str, dict]) -> str:
+        with self._lock:
+            lines = ["# TYPE http_requests_total counter"]
+            for (method, route, status), n in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{{method="{method}",route="{route}",status="{status}"}} {n}')
+            lines.append("# TYPE http_request_duration_seconds histogram")
+            for (method, route), h in sorted(self.latency.items()):
+                lines += self._histogram_lines("http_request_duration_seconds", f'method="{method}",route="{route}"', h)
+            lines.append("# TYPE http_phase_duration_seconds histogram")
+            for phase, h in sorted(self.phases.items()):
+                lines += self._histogram_lines("http_phase_duration_seconds", f'phase="{phase}"', h)
+            lines.append("# TYPE http_rejected_total counter")
+            for reason, n in sorted(self.rejected.items()):
+                lines.append(f'http_rejected_total{{reason="{reason}"}} {n}')
+        for prefix, values in gauges.items():
+            for k, v in sorted(values.items()):
+                if isinstance(v, (int, float)):
+                    lines.append(f"# TYPE {prefix}_{k} gauge")
+                    lines.append(f"{prefix}_{k} {v}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
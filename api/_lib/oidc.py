@@ -0,0 +1,213 @@
+import base64
+import hashlib
+import hmac
+import http.client
+import json
+import logging
+import ssl
+import threading
+import time
+import urllib.parse
+
+from .observability import log
+from .settings import (
+    GOOGLE_AUTH_URL,
+    GOOGLE_ISSUER,
+    GOOGLE_TOKEN_URL,
+    GOOGLE_USERINFO_URL,
+    OAUTH_CLOCK_SKEW,
+    OAUTH_DISCOVERY_TTL,
+    OAUTH_ISSUER,
+    OAUTH_JWKS_MIN_REFRESH,
+    OAUTH_JWKS_TTL,
+    OAUTH_RETRIES,
+    OAUTH_TIMEOUT,
+)
+
+
+# -------- OAuth --------
+def b64url_decode(data: str) -> bytes:
+    padding = "=" * (-len(data) % 4)
+    return base64.urlsafe_b64decode(data + padding)
+
+
+# Socket keep-alive que o servidor já fechou: o pedido não chegou a ser processado
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+class HTTPClient:
+    """Cliente HTTP(S) com conexões keep-alive reaproveitadas por host, timeout e retries.
+
+    Só requisições idempotentes são repetidas após erro/5xx. Qualquer uma é refeita,
+    sem contar como tentativa, quando o socket ocioso reaproveitado já estava fechado
+    (conexão encerrada/resetada antes de qualquer byte de resposta); um timeout pode
+    ter chegado ao servidor e nunca repete um pedido não idempotente.
+    """
+
+    def __init__(self, timeout: float, retries: int, max_idle_per_host: int = 4):
+        self.timeout = timeout
+        self.retries = retries
+        self.max_idle_per_host = max_idle_per_host
+        self._idle: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+        self._ssl = ssl.create_default_context()
+
+    def _acquire(self, key: tuple):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        scheme, host, port = key
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout, context=self._ssl), False
+        return http.client.HTTPConnection(host, port, timeout=self.timeout), False
+
+    def _release(self, key: tuple, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def request(self, method: str, url: str, body: bytes | None = None, headers: dict | None = None,
+                idempotent: bool = True) -> tuple[int, bytes]:
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        attempt = 0
+        while True:
+            conn, reused = self._acquire(key)
+            responded = False
+            try:
+                conn.request(method, target, body=body, headers=headers or {})
+                resp = conn.getresponse()
+                responded = True
+                data = resp.read()
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                if reused and not responded and isinstance(e, _STALE_CONNECTION_ERRORS):
+                    continue  # keep-alive expirado do outro lado: não conta como tentativa
+                if not idempotent or attempt >= self.retries:
+                    raise
+            else:
+                if resp.will_close:
+                    conn.close()
+                else:
+                    self._release(key, conn)
+                if resp.status < 500 or not idempotent or attempt >= self.retries:
+                    return resp.status, data
+            attempt += 1
+            time.sleep(min(0.2 * 2**attempt, 2.0))
+
+    def get_json(self, url: str, headers: dict | None = None) -> dict:
+        status, data = self.request("GET", url, headers={"Accept": "application/json", **(headers or {})})
+        if status != 200:
+            raise RuntimeError(f"GET {url}: HTTP {status}")
+        return json.loads(data)
+
+
+# DigestInfo DER de SHA-256 (prefixo do EMSA-PKCS1-v1_5)
+_SHA256_DIGEST_INFO = bytes.fromhex("3031300d060960864801650304020105000420")
+
+
+def rsa_pkcs1_sha256_verify(n: int, e: int, msg: bytes, sig: bytes) -> bool:
+    """Verificação RS256 (só a chave pública: s^e mod n, sem dependência de criptografia)"""
+    k = (n.bit_length() + 7) // 8
+    if len(sig) != k:
+        return False
+    em = pow(int.from_bytes(sig, "big"), e, n).to_bytes(k, "big")
+    t = _SHA256_DIGEST_INFO + hashlib.sha256(msg).digest()
+    expected = b"\x00\x01" + b"\xff" * (k - len(t) - 3) + b"\x00" + t
+    return hmac.compare_digest(em, expected)
+
+
+class OIDCProvider:
+    """Discovery e JWKS do provedor em cache; valida id_tokens localmente"""
+
+    def __init__(self, issuer: str, client: HTTPClient):
+        self.issuer = issuer
+        self.client = client
+        self._lock = threading.Lock()
+        self._config: dict | None = None
+        self._config_at = 0.0
+        self._keys: dict[str, tuple[int, int]] = {}
+        self._keys_at = 0.0
+
+    def _fallback_config(self) -> dict | None:
+        if self.issuer != GOOGLE_ISSUER:
+            return None
+        return {
+            "issuer": GOOGLE_ISSUER,
+            "authorization_endpoint": GOOGLE_AUTH_URL,
+            "token_endpoint": GOOGLE_TOKEN_URL,
+            "userinfo_endpoint": GOOGLE_USERINFO_URL,
+            "jwks_uri": "https://www.googleapis.com/oauth2/v3/certs",
+        }
+
+    def config(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            if self._config is not None and now - self._config_at < OAUTH_DISCOVERY_TTL:
+                return self._config
+        try:
+            config = self.client.get_json(f"{self.issuer}/.well-known/openid-configuration")
+        except Exception as e:
+            log(logging.WARNING, "oauth_discovery_failed", issuer=self.issuer, error=str(e))
+            # Discovery fora do ar: mantém a cópia vencida ou os endpoints conhecidos
+            config = self._config or self._fallback_config()
+            if config is None:
+                raise RuntimeError(f"discovery indisponível: {e}")
+        with self._lock:
+            self._config = config
+            self._config_at = now
+        return config
+
+    def _load_keys(self):
+        keys = {}
+        for jwk in self.client.get_json(self.config()["jwks_uri"]).get("keys", []):
+            if jwk.get("kty") == "RSA" and jwk.get("kid"):
+                n = int.from_bytes(b64url_decode(jwk["n"]), "big")
+                e = int.from_bytes(b64url_decode(jwk["e"]), "big")
+                keys[jwk["kid"]] = (n, e)
+        with self._lock:
+            self._keys = keys
+            self._keys_at = time.monotonic()
+
+    def _key(self, kid: str) -> tuple[int, int] | None:
+        age = time.monotonic() - self._keys_at
+        # Recarrega quando vence ou quando aparece um kid novo (rotação de chaves)
+        if age > OAUTH_JWKS_TTL or (kid not in self._keys and age > OAUTH_JWKS_MIN_REFRESH):
+            self._load_keys()
+        return self._keys.get(kid)
+
+    def verify_id_token(self, token: str, client_id: str) -> dict:
+        try:
+            h64, p64, s64 = token.split(".")
+            header = json.loads(b64url_decode(h64))
+            claims = json.loads(b64url_decode(p64))
+            sig = b64url_decode(s64)
+        except Exception:
+            raise ValueError("id_token malformado")
+        if header.get("alg") != "RS256":
+            raise ValueError("alg não suportado")
+        key = self._key(header.get("kid"))
+        if key is None:
+            raise ValueError("kid desconhecido")
+        if not rsa_pkcs1_sha256_verify(*key, f"{h64}.{p64}".encode(), sig):
+            raise ValueError("assinatura inválida")
+        issuers = {self.config().get("issuer", self.issuer)}
+        if self.issuer == GOOGLE_ISSUER:
+            issuers.add("accounts.google.com")
+        if claims.get("iss") not in issuers:
+            raise ValueError("iss inválido")
+        aud = claims.get("aud")
+        if client_id != aud and not (isinstance(aud, list) and client_id in aud):
+            raise ValueError("aud inválido")
+        if claims.get("exp", 0) < time.time() - OAUTH_CLOCK_SKEW:
+            raise ValueError("id_token expirado")
+        return claims
+
+
+http_client = HTTPClient(OAUTH_TIMEOUT, OAUTH_RETRIES)
+provider = OIDCProvider(OAUTH_ISSUER, http_client)
@@ -0,0 +1,188 @@
+import contextlib
+import itertools
+import logging
+import os
+import random
+import select
+import signal
+import threading
+import time
+import traceback
+
+from .observability import log
+from .server import drain_server
+from .settings import (
+    GRACEFUL_TIMEOUT,
+    WORKER_MAX_BACKOFF,
+    WORKER_MAX_REQUESTS,
+    WORKER_MAX_REQUESTS_JITTER,
+    WORKER_MIN_UPTIME,
+)
+
+
+# -------- Pre-fork --------
+draining = threading.Event()  # processo parou de aceitar conexões e está terminando os requests
+_requests_served = itertools.count(1)
+_worker_max_requests = 0  # definido por worker (com jitter); 0 = sem reciclagem
+_supervisor_fd: int | None = None  # pipe worker -> supervisor (só nos workers do pre-fork)
+
+# Mensagens de um byte no pipe worker -> supervisor
+WORKER_READY = b"U"  # socket aberto, já aceitando conexões
+WORKER_RETIRE = b"R"  # atingiu WORKER_MAX_REQUESTS: quer ser substituído
+
+
+def _notify_supervisor(message: bytes):
+    if _supervisor_fd is not None:
+        with contextlib.suppress(OSError):
+            os.write(_supervisor_fd, message)
+
+
+def count_request():
+    if _worker_max_requests and next(_requests_served) == _worker_max_requests:
+        # Continua servindo até o substituto subir; só então o supervisor manda SIGTERM
+        log(logging.INFO, "worker_recycle", pid=os.getpid(), requests=_worker_max_requests)
+        _notify_supervisor(WORKER_RETIRE)
+
+
+def serve_worker(slot: int, make, notify_fd: int):
+    """Corpo de um worker: serve até SIGTERM/SIGINT (ou morte do supervisor) e drena"""
+    global _worker_max_requests, _supervisor_fd
+    _supervisor_fd = notify_fd
+    if WORKER_MAX_REQUESTS:
+        _worker_max_requests = WORKER_MAX_REQUESTS + random.randint(0, WORKER_MAX_REQUESTS_JITTER)
+    parent = os.getppid()
+    signal.signal(signal.SIGTERM, lambda *_: draining.set())
+    signal.signal(signal.SIGINT, lambda *_: draining.set())
+    server = make()
+    thread = threading.Thread(target=server.serve_forever, name="serve", daemon=True)
+    thread.start()
+    # make() já deixou o socket escutando (nos dois modos): conexões daqui em diante ficam no backlog
+    _notify_supervisor(WORKER_READY)
+    log(logging.INFO, "worker_started", slot=slot, pid=os.getpid())
+    while not draining.wait(1.0):
+        if not thread.is_alive():
+            raise RuntimeError("loop do servidor terminou inesperadamente")
+        if os.getppid() != parent:
+            log(logging.WARNING, "worker_orphaned", slot=slot, pid=os.getpid())
+            break
+    drain_server(server)
+
+
+class PreforkSupervisor:
+    """Processo pai do modo pre-fork: não serve requests, só mantém um worker
+    por slot. Cada worker avisa pelo pipe quando está aceitando conexões e quando
+    quer ser reciclado; o reciclado só recebe SIGTERM depois que o substituto
+    está de pé, então o slot nunca fica sem socket. Workers que morrem são
+    repostos (com backoff se morrem logo após subir). SIGTERM/SIGINT drenam
+    todos (SIGKILL após GRACEFUL_TIMEOUT)."""
+
+    def __init__(self, processes: int, target, graceful_timeout: float = GRACEFUL_TIMEOUT):
+        self.processes = processes
+        self.target = target  # target(slot, notify_fd) roda no filho (recria o estado do processo)
+        self.graceful_timeout = graceful_timeout
+        self.workers: dict[int, dict] = {}  # pid -> {slot, started, fd, retiring, stopping}
+        self._crashes: dict[int, int] = {}  # slot -> crashes seguidos
+        self._not_before: dict[int, float] = {}  # slot -> quando pode subir de novo
+        self._stopping = False
+
+    def _spawn(self, slot: int):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                os.close(read_fd)
+                for worker in self.workers.values():
+                    os.close(worker["fd"])
+                self.target(slot, write_fd)
+                code = 0
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                os._exit(code)
+        os.close(write_fd)
+        self.workers[pid] = {
+            "slot": slot, "started": time.monotonic(), "fd": read_fd, "retiring": False, "stopping": False,
+        }
+
+    def _terminate(self, pid: int):
+        self.workers[pid]["stopping"] = True
+        with contextlib.suppress(ProcessLookupError):
+            os.kill(pid, signal.SIGTERM)
+
+    def _reap(self):
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self.workers.pop(pid, None)
+            if worker is None:
+                continue
+            os.close(worker["fd"])
+            slot = worker["slot"]
+            code = os.waitstatus_to_exitcode(status)
+            if code == 0 or worker["stopping"] or self._stopping:
+                log(logging.INFO, "worker_exited", slot=slot, pid=pid, code=code)
+                continue
+            quick = time.monotonic() - worker["started"] < WORKER_MIN_UPTIME
+            crashes = self._crashes.get(slot, 0) + 1 if quick else 1
+            self._crashes[slot] = crashes
+            delay = min(WORKER_MAX_BACKOFF, 2 ** (crashes - 1)) if quick else 0.0
+            self._not_before[slot] = time.monotonic() + delay
+            log(logging.WARNING, "worker_crashed", slot=slot, pid=pid, code=code, restart_in=delay)
+
+    def _read_messages(self, timeout: float):
+        fds = {w["fd"]: pid for pid, w in self.workers.items()}
+        if not fds:
+            time.sleep(timeout)
+            return
+        ready, _, _ = select.select(list(fds), [], [], timeout)
+        for fd in ready:
+            pid = fds[fd]
+            worker = self.workers[pid]
+            data = os.read(fd, 64)  # vazio = worker saiu; o _reap cuida
+            if WORKER_RETIRE in data:
+                worker["retiring"] = True
+            if WORKER_READY in data:
+                self._crashes[worker["slot"]] = 0
+                # Substituto de pé: agora sim o antigo para de aceitar e drena
+                for old_pid, old in list(self.workers.items()):
+                    if old_pid != pid and old["slot"] == worker["slot"] and not old["stopping"]:
+                        self._terminate(old_pid)
+
+    def _spawn_missing(self):
+        covered = {w["slot"] for w in self.workers.values() if not w["retiring"] and not w["stopping"]}
+        now = time.monotonic()
+        for slot in range(self.processes):
+            if slot not in covered and self._not_before.get(slot, 0.0) <= now:
+                self._spawn(slot)
+
+    def _on_signal(self, signum, frame):
+        self._stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._on_signal)
+        signal.signal(signal.SIGINT, self._on_signal)
+        while not self._stopping:
+            self._reap()
+            self._spawn_missing()
+            self._read_messages(0.2)
+        self._stop_workers()
+
+    def _stop_workers(self):
+        for pid in list(self.workers):
+            self._terminate(pid)
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        while self.workers and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            log(logging.WARNING, "worker_killed", pid=pid)
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGKILL)
+            with contextlib.suppress(ChildProcessError):
+                os.waitpid(pid, 0)
+            os.close(self.workers.pop(pid)["fd"])
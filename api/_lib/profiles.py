@@ -0,0 +1,119 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+import psycopg
+
+from .db import get_db_url, normalize_db_url
+from .observability import log
+from .settings import PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL, PROFILES_CHANNEL
+
+
+# -------- Cache de perfis --------
+class ProfileCache:
+    """LRU com TTL dos perfis de /api/me, indexado por uid.
+
+    Um LISTEN profile_changes por processo remove a entrada quando o trigger de
+    users notifica. Sem o LISTEN conectado o cache fica desligado (notificações
+    se perderiam) e é esvaziado ao reconectar. `generation` muda a cada
+    invalidação: um put com generation antiga (leitura que correu com uma escrita)
+    é descartado.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._items: OrderedDict[int, tuple[float, tuple]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._listening = False
+        self._thread: threading.Thread | None = None
+
+    def get(self, uid: int) -> tuple | None:
+        self._ensure_listener()
+        with self._lock:
+            entry = self._items.get(uid)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._items[uid]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(uid)
+            self.hits += 1
+            return entry[1]
+
+    def generation(self) -> int:
+        return self._generation
+
+    def put(self, uid: int, profile: tuple, generation: int):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if not self._listening or generation != self._generation:
+                return
+            self._items[uid] = (time.monotonic() + self.ttl, profile)
+            self._items.move_to_end(uid)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def invalidate(self, uid: int | None = None):
+        """Remove um perfil (ou todos, com uid None)"""
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            if uid is None:
+                self._items.clear()
+            else:
+                self._items.pop(uid, None)
+
+    def _set_listening(self, listening: bool):
+        with self._lock:
+            self._listening = listening
+            self._generation += 1
+            self._items.clear()
+
+    def _ensure_listener(self):
+        if self.maxsize <= 0 or (self._thread is not None and self._thread.is_alive()) or not get_db_url():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="profile-listener", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        backoff = 1.0
+        while True:
+            try:
+                url = normalize_db_url(get_db_url() or "")
+                with psycopg.connect(url, autocommit=True) as conn:
+                    conn.execute(f"LISTEN {PROFILES_CHANNEL}")
+                    self._set_listening(True)
+                    backoff = 1.0
+                    while True:
+                        for n in conn.notifies(timeout=60):
+                            try:
+                                self.invalidate(int(n.payload))
+                            except ValueError:
+                                continue
+            except Exception as e:
+                self._set_listening(False)
+                log(logging.WARNING, "profile_listener_error", error=str(e), retry_in=backoff)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._items),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "listening": int(self._listening),
+        }
+
+
+cache = ProfileCache(PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL)
@@ -0,0 +1,206 @@
+import math
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from .settings import ACHIEVEMENTS, ACHIEVEMENTS_VERSION, LEVEL_XP, PROGRESS_TZ, XP_PER_DONE
+
+
+# -------- Progresso (gamificação) --------
+PROGRESS_FIELDS = (
+    "xp", "level", "total_created", "total_done", "current_streak", "best_streak", "last_done_day",
+    "achievements_version",
+)
+
+
+def level_for_xp(xp: int) -> int:
+    return 1 + math.isqrt(max(xp, 0) // LEVEL_XP)
+
+
+def progress_day(created_at: datetime) -> date:
+    return created_at.astimezone(ZoneInfo(PROGRESS_TZ)).date()
+
+
+def progress_today() -> date:
+    return datetime.now(ZoneInfo(PROGRESS_TZ)).date()
+
+
+class ProgressDeltas:
+    """Variações (criadas, feitas) por dia acumuladas durante uma escrita"""
+
+    def __init__(self):
+        self.days: dict[date, list[int]] = {}
+
+    def _add(self, created_at: datetime, created: int, done: int):
+        entry = self.days.setdefault(progress_day(created_at), [0, 0])
+        entry[0] += created
+        entry[1] += done
+
+    def created(self, created_at: datetime, status: str = "pendente"):
+        self._add(created_at, 1, 1 if status == "feita" else 0)
+
+    def status_changed(self, created_at: datetime, old: str, new: str, imported: bool = False):
+        if imported:
+            # Rotina importada entra no progresso na primeira mudança de status
+            self.created(created_at, new)
+        elif old != new:
+            self._add(created_at, 0, 1 if new == "feita" else -1)
+
+    def deleted(self, created_at: datetime, status: str, imported: bool = False):
+        if not imported:
+            self._add(created_at, -1, -1 if status == "feita" else 0)
+
+
+def _streaks_from_days(days: list[date]) -> tuple[int, int, date | None]:
+    """(streak atual, melhor streak, último dia) a partir dos dias com rotina feita"""
+    current = best = 0
+    last = None
+    for day in days:
+        current = current + 1 if last is not None and day == last + timedelta(days=1) else 1
+        best = max(best, current)
+        last = day
+    return current, best, last
+
+
+def _recompute_streaks(cur, uid: int) -> tuple[int, int, date | None]:
+    # O(dias ativos) — só quando um dia do passado entra/sai do conjunto de dias ativos
+    cur.execute("SELECT day FROM user_daily_progress WHERE user_id = %s AND done > 0 ORDER BY day", (uid,))
+    return _streaks_from_days([r[0] for r in cur.fetchall()])
+
+
+def lock_progress(cur, uid: int) -> dict:
+    """Trava (FOR UPDATE) e retorna o progresso do usuário, criando-o a partir do
+    histórico na primeira vez. Deve rodar antes da escrita em routines."""
+    cur.execute("INSERT INTO user_progress(user_id) VALUES(%s) ON CONFLICT DO NOTHING RETURNING user_id", (uid,))
+    if cur.fetchone():
+        # Primeiro acesso: backfill único a partir das rotinas existentes, inclusive as
+        # já arquivadas (todas feitas), senão um arquivamento anterior apagaria o histórico
+        cur.execute(
+            """
+            INSERT INTO user_daily_progress(user_id, day, created, done)
+            SELECT %s, (created_at AT TIME ZONE %s)::date, COUNT(*), COUNT(*) FILTER (WHERE status = 'feita')
+            FROM (
+              SELECT created_at, status FROM routines WHERE user_id = %s AND deleted_at IS NULL AND NOT imported
+              UNION ALL
+              SELECT created_at, 'feita' FROM routines_archive WHERE user_id = %s AND NOT imported
+            ) r
+            GROUP BY 2
+            ON CONFLICT (user_id, day) DO NOTHING
+            """,
+            (uid, PROGRESS_TZ, uid, uid),
+        )
+        cur.execute(
+            "SELECT COALESCE(SUM(created), 0), COALESCE(SUM(done), 0) FROM user_daily_progress WHERE user_id = %s",
+            (uid,),
+        )
+        total_created, total_done = cur.fetchone()
+        current, best, last = _recompute_streaks(cur, uid)
+        xp = total_done * XP_PER_DONE
+        cur.execute(
+            """
+            UPDATE user_progress
+            SET xp = %s, level = %s, total_created = %s, total_done = %s,
+                current_streak = %s, best_streak = %s, last_done_day = %s
+            WHERE user_id = %s
+            """,
+            (xp, level_for_xp(xp), total_created, total_done, current, best, last, uid),
+        )
+    cur.execute(f"SELECT {', '.join(PROGRESS_FIELDS)} FROM user_progress WHERE user_id = %s FOR UPDATE", (uid,))
+    return dict(zip(PROGRESS_FIELDS, cur.fetchone()))
+
+
+def evaluate_achievements(cur, uid: int, old: dict, new: dict, day_rows: list[tuple[int, int]]) -> list[str]:
+    """Desbloqueia as conquistas cujos contadores mudaram e cruzaram o limite.
+
+    `day_rows` são os (criadas, feitas) dos dias tocados pela escrita. Se o
+    usuário ainda não foi avaliado contra o catálogo atual, avalia tudo uma vez.
+    """
+    full = new["achievements_version"] < ACHIEVEMENTS_VERSION
+    candidates = []
+    for rule in ACHIEVEMENTS:
+        counter, threshold = rule["counter"], rule["threshold"]
+        if counter == "perfect_day":
+            if full:
+                cur.execute(
+                    "SELECT 1 FROM user_daily_progress WHERE user_id = %s AND created > 0 AND done = created LIMIT 1",
+                    (uid,),
+                )
+                hit = cur.fetchone() is not None
+            else:
+                hit = any(created > 0 and done == created for created, done in day_rows)
+        elif full:
+            hit = new[counter] >= threshold
+        else:
+            # Só regras cujo contador mudou nesta escrita e passou do limite
+            hit = old[counter] < threshold <= new[counter]
+        if hit:
+            candidates.append(rule["id"])
+    unlocked = []
+    if candidates:
+        cur.execute(
+            """
+            INSERT INTO user_achievements(user_id, achievement_id)
+            SELECT %s, unnest(%s::text[])
+            ON CONFLICT DO NOTHING
+            RETURNING achievement_id
+            """,
+            (uid, candidates),
+        )
+        unlocked = [r[0] for r in cur.fetchall()]
+    if full:
+        cur.execute("UPDATE user_progress SET achievements_version = %s WHERE user_id = %s", (ACHIEVEMENTS_VERSION, uid))
+        new["achievements_version"] = ACHIEVEMENTS_VERSION
+    return unlocked
+
+
+def apply_progress(cur, uid: int, progress: dict, deltas: ProgressDeltas) -> tuple[dict, list[str]]:
+    """Aplica as variações ao progresso travado por lock_progress (mesma transação)
+    e retorna (progresso novo, conquistas desbloqueadas)"""
+    changes = {d: v for d, v in deltas.days.items() if v[0] or v[1]}
+    if not changes:
+        return progress, []
+    flips = []  # dias que entraram (True) ou saíram (False) do conjunto de dias com rotina feita
+    day_rows = []
+    for day, (d_created, d_done) in sorted(changes.items()):
+        cur.execute(
+            """
+            INSERT INTO user_daily_progress(user_id, day, created, done) VALUES(%s, %s, GREATEST(%s, 0), GREATEST(%s, 0))
+            ON CONFLICT (user_id, day) DO UPDATE
+            SET created = GREATEST(user_daily_progress.created + %s, 0),
+                done = GREATEST(user_daily_progress.done + %s, 0)
+            RETURNING created, done
+            """,
+            (uid, day, d_created, d_done, d_created, d_done),
+        )
+        created, after = cur.fetchone()
+        day_rows.append((created, after))
+        before = after - d_done
+        if (before > 0) != (after > 0):
+            flips.append((day, after > 0))
+
+    p = dict(progress)
+    p["total_created"] = max(p["total_created"] + sum(v[0] for v in changes.values()), 0)
+    p["total_done"] = max(p["total_done"] + sum(v[1] for v in changes.values()), 0)
+    p["xp"] = max(p["xp"] + sum(v[1] for v in changes.values()) * XP_PER_DONE, 0)
+    p["level"] = level_for_xp(p["xp"])
+    if flips:
+        last = p["last_done_day"]
+        day, activated = flips[0]
+        if len(flips) == 1 and activated and (last is None or day > last):
+            # Caso comum: primeiro "feito" de um dia novo, O(1)
+            p["current_streak"] = p["current_streak"] + 1 if last is not None and day == last + timedelta(days=1) else 1
+            p["best_streak"] = max(p["best_streak"], p["current_streak"])
+            p["last_done_day"] = day
+        else:
+            p["current_streak"], p["best_streak"], p["last_done_day"] = _recompute_streaks(cur, uid)
+    cur.execute(
+        """
+        UPDATE user_progress
+        SET xp = %s, level = %s, total_created = %s, total_done = %s,
+            current_streak = %s, best_streak = %s, last_done_day = %s, updated_at = NOW()
+        WHERE user_id = %s
+        """,
+        (p["xp"], p["level"], p["total_created"], p["total_done"], p["current_streak"], p["best_streak"],
+         p["last_done_day"], uid),
+    )
+    unlocked = evaluate_achievements(cur, uid, progress, p, day_rows)
+    return p, unlocked
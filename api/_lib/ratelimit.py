@@ -0,0 +1,109 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from psycopg_pool import ConnectionPool
+
+from .db import get_db_url, normalize_db_url
+from .observability import log
+from .settings import RATE_LIMIT_BACKEND, RATE_LIMIT_MAX_KEYS
+
+
+# -------- Rate limiting --------
+class RateLimiter:
+    """Token buckets em memória (por processo); LRU limita o número de chaves"""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, per_minute: float, burst: float, cost: float = 1.0) -> float:
+        """Consome `cost` fichas: 0 se permitido, senão segundos até haver fichas"""
+        rate = per_minute / 60
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - last) * rate)
+            allowed = tokens >= cost
+            self._buckets[key] = (tokens - cost if allowed else tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return 0.0 if allowed else (cost - tokens) / rate
+
+    def stats(self) -> dict:
+        return {"keys": len(self._buckets)}
+
+
+# Recarga, consumo e leitura numa única instrução; negativos = pedidos negados que
+# continuam custando (piso em -burst), e a espera sai do déficit
+RATE_LIMIT_SQL = """
+INSERT INTO rate_limits AS b (key, tokens, updated_at) VALUES (%(key)s, %(burst)s - %(cost)s, clock_timestamp())
+ON CONFLICT (key) DO UPDATE
+SET tokens = GREATEST(
+      LEAST(%(burst)s, b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * %(rate)s) - %(cost)s,
+      -%(burst)s
+    ),
+    updated_at = clock_timestamp()
+RETURNING tokens
+"""
+
+
+class PostgresRateLimiter(RateLimiter):
+    """Buckets compartilhados em rate_limits. O bucket local filtra antes (enxurradas
+    nem chegam ao banco) e falhas do banco liberam o pedido em vez de derrubá-lo"""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        super().__init__(max_keys)
+        self._pool: ConnectionPool | None = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self) -> ConnectionPool:
+        # Pool próprio e pequeno: o limitador nunca disputa conexões com as rotas
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ConnectionPool(
+                    normalize_db_url(get_db_url() or ""),
+                    min_size=1,
+                    max_size=2,
+                    timeout=0.5,
+                    kwargs={"autocommit": True},
+                    name="rate_limit",
+                    open=True,
+                )
+            return self._pool
+
+    def take(self, key: str, per_minute: float, burst: float, cost: float = 1.0) -> float:
+        wait = super().take(key, per_minute, burst, cost)
+        if wait:
+            return wait
+        try:
+            with self._get_pool().connection() as conn:
+                row = conn.execute(
+                    RATE_LIMIT_SQL, {"key": key, "burst": burst, "cost": cost, "rate": per_minute / 60}
+                ).fetchone()
+        except Exception as e:
+            log(logging.WARNING, "rate_limit_db_error", error=str(e))
+            return 0.0
+        return -row[0] / (per_minute / 60) if row[0] < 0 else 0.0
+
+
+def cleanup_rate_limits(conn) -> int:
+    """Remove buckets parados há mais de uma hora (já estariam cheios de novo)"""
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM rate_limits WHERE updated_at < NOW() - interval '1 hour'")
+        removed = cur.rowcount
+    conn.commit()
+    return removed
+
+
+def make_rate_limiter() -> RateLimiter | None:
+    if RATE_LIMIT_BACKEND == "off":
+        return None
+    if RATE_LIMIT_BACKEND == "postgres":
+        return PostgresRateLimiter()
+    return RateLimiter()
+
+
+limiter = make_rate_limiter()
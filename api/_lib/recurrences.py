@@ -0,0 +1,86 @@
+from datetime import date, timedelta
+
+from .settings import RECURRENCE_FIELDS
+
+
+# -------- Recorrências --------
+def recurrence_occurs(rule: dict, day: date) -> bool:
+    if day < rule["start_date"] or (rule["end_date"] and day > rule["end_date"]):
+        return False
+    kind = rule["kind"]
+    if kind == "daily":
+        return True
+    if kind == "weekdays":
+        return day.weekday() < 5
+    if kind == "every_n":
+        return (day - rule["start_date"]).days % rule["interval_days"] == 0
+    if kind == "weekly":
+        return day.weekday() in rule["weekdays"]
+    return False
+
+
+def expand_recurrence(rule: dict, start: date, end: date) -> list[date]:
+    """Dias em [start, end] em que a regra gera uma instância"""
+    first = max(start, rule["start_date"])
+    last = min(end, rule["end_date"]) if rule["end_date"] else end
+    days = []
+    day = first
+    while day <= last:
+        if recurrence_occurs(rule, day):
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def load_recurrences(cur, uid: int, start: date, end: date) -> list[dict]:
+    cur.execute(
+        f"""
+        SELECT {', '.join(RECURRENCE_FIELDS)} FROM recurrences
+        WHERE user_id = %s AND start_date <= %s AND (end_date IS NULL OR end_date >= %s)
+        """,
+        (uid, end, start),
+    )
+    return [dict(zip(RECURRENCE_FIELDS, r)) for r in cur.fetchall()]
+
+
+def pending_occurrences(cur, uid: int, start: date, end: date) -> list[tuple[dict, date]]:
+    """Ocorrências no intervalo que ainda não foram materializadas"""
+    rules = load_recurrences(cur, uid, start, end)
+    if not rules:
+        return []
+    # Instâncias arquivadas também contam; a instância nasce no início do dia local,
+    # então uma margem de um dia em UTC cobre qualquer fuso e deixa a PK do arquivo filtrar
+    cur.execute(
+        """
+        SELECT recurrence_id, occurrence_date FROM routines
+        WHERE user_id = %s AND recurrence_id IS NOT NULL AND occurrence_date BETWEEN %s AND %s
+        UNION ALL
+        SELECT recurrence_id, occurrence_date FROM routines_archive
+        WHERE user_id = %s AND recurrence_id IS NOT NULL AND occurrence_date BETWEEN %s AND %s
+          AND created_at >= (%s::date - 1)::timestamp AT TIME ZONE 'UTC'
+          AND created_at < (%s::date + 2)::timestamp AT TIME ZONE 'UTC'
+        """,
+        (uid, start, end, uid, start, end, start, end),
+    )
+    done = set(cur.fetchall())
+    return [(rule, day) for rule in rules for day in expand_recurrence(rule, start, end) if (rule["id"], day) not in done]
+
+
+def materialize_occurrence(cur, uid: int, rule: dict, day: date):
+    """Cria a instância do dia (idempotente). Retorna a linha criada ou None se já existia
+    (na tabela ativa ou no arquivo)"""
+    cur.execute(
+        """
+        INSERT INTO routines(user_id, title, created_at, recurrence_id, occurrence_date)
+        SELECT %s, %s, %s::date::timestamp AT TIME ZONE %s, %s, %s
+        WHERE NOT EXISTS (
+          SELECT 1 FROM routines_archive
+          WHERE user_id = %s AND created_at = %s::date::timestamp AT TIME ZONE %s
+            AND recurrence_id = %s AND occurrence_date = %s
+        )
+        ON CONFLICT (recurrence_id, occurrence_date, created_at) DO NOTHING
+        RETURNING id, title, status, created_at
+        """,
+        (uid, rule["title"], day, rule["tz"], rule["id"], day, uid, day, rule["tz"], rule["id"], day),
+    )
+    return cur.fetchone()
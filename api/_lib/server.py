@@ -0,0 +1,541 @@
+from http.server import HTTPServer, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextlib
+import gzip
+import io
+import json
+import logging
+import os
+import re
+import select
+import socket
+import threading
+import time
+
+from .observability import log, metrics
+from .settings import (
+    BROTLI_QUALITY,
+    GRACEFUL_TIMEOUT,
+    GZIP_LEVEL,
+    KEEPALIVE_TIMEOUT,
+    MAX_BODY_BYTES,
+    MAX_HEADER_BYTES,
+    MAX_INFLIGHT,
+    OVERLOAD_RETRY_AFTER,
+    STREAM_CHUNK_BYTES,
+    THREADED_KEEPALIVE_TIMEOUT,
+)
+
+# Dependências opcionais: aceleram JSON/compressão quando instaladas
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# -------- Serialização --------
+def dumps(payload) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def pick_encoding(accept_encoding: str) -> str | None:
+    """Escolhe br/gzip conforme Accept-Encoding (respeitando q=0)"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class BodyError(Exception):
+    """Corpo do request malformado (resposta 400 e a conexão fecha)"""
+
+
+class BodyTooLarge(BodyError):
+    pass
+
+
+class ChunkedWriter:
+    """Corpo de tamanho desconhecido: agrupa escritas pequenas em blocos de
+    STREAM_CHUNK_BYTES, cada um virando um chunk quando `chunked`"""
+
+    def __init__(self, wfile, chunked: bool, size: int = STREAM_CHUNK_BYTES):
+        self.wfile = wfile
+        self.chunked = chunked
+        self.size = size
+        self._buf = bytearray()
+
+    def write(self, data):
+        self._buf += data
+        if len(self._buf) >= self.size:
+            self.flush()
+
+    def flush(self):
+        if not self._buf:
+            return
+        if self.chunked:
+            self.wfile.write(b"%x\r\n" % len(self._buf) + self._buf + b"\r\n")
+        else:
+            self.wfile.write(bytes(self._buf))
+        self.wfile.flush()  # no modo async espera o event loop escoar (backpressure)
+        self._buf = bytearray()
+
+    def close(self):
+        self.flush()
+        if self.chunked:
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+
+# -------- Rotas --------
+class Route:
+    """Método + padrão de path (`{nome}` casa um segmento) -> método do handler.
+
+    `auth` passa o usuário da sessão (401 sem sessão) e `body` o JSON do corpo
+    já mesclado com os parâmetros do path; sem `body` o corpo nem é lido.
+    `stream` marca rotas que leem o próprio corpo em blocos (até `max_body`).
+    """
+
+    def __init__(self, method: str, pattern: str, func, auth: bool = False, body: bool = False,
+                 max_body: int = MAX_BODY_BYTES, stream: bool = False):
+        self.method = method
+        self.pattern = pattern
+        self.func = func
+        self.auth = auth
+        self.body = body or "{" in pattern
+        self.stream = stream
+        self.max_body = max_body
+        self.regex = None
+        if "{" in pattern:
+            parts = re.split(r"\{(\w+)\}", pattern)
+            regex = "".join(re.escape(p) if i % 2 == 0 else f"(?P<{p}>[^/]+)" for i, p in enumerate(parts))
+            self.regex = re.compile(f"^{regex}$")
+
+    def match(self, path: str) -> dict | None:
+        if self.regex is None:
+            return {} if path == self.pattern else None
+        m = self.regex.match(path)
+        return m.groupdict() if m else None
+
+
+class Router:
+    def __init__(self, routes: list[Route]):
+        self.routes = routes
+        # Rotas fixas (a maioria) saem de um dict; só as com parâmetro passam por regex
+        self._static = {(r.method, r.pattern): r for r in routes if r.regex is None}
+        self._dynamic = [r for r in routes if r.regex is not None]
+
+    def resolve(self, method: str, path: str) -> tuple[Route | None, dict]:
+        route = self._static.get((method, path))
+        if route is not None:
+            return route, {}
+        for route in self._dynamic:
+            if route.method == method:
+                params = route.match(path)
+                if params is not None:
+                    return route, params
+        return None, {}
+
+    def allowed_methods(self, path: str) -> list[str]:
+        return sorted({r.method for r in self.routes if r.match(path) is not None})
+
+    def label(self, path: str) -> str:
+        """Label de métricas: padrão da rota (cardinalidade limitada) ou 'other'"""
+        for route in self.routes:
+            if route.match(path) is not None:
+                return route.pattern
+        return "other"
+
+
+# -------- Servidores --------
+def _canned_response(status: str, payload: dict, headers: dict | None = None) -> bytes:
+    """Resposta HTTP pronta (sempre fecha a conexão), enviada sem passar pelo handler"""
+    body = dumps(payload)
+    lines = [f"HTTP/1.1 {status}", "Content-Type: application/json; charset=utf-8"]
+    lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+    lines += ["Connection: close", f"Content-Length: {len(body)}", "", ""]
+    return "\r\n".join(lines).encode() + body
+
+
+# Sobrecarga: sai sem parsear o request, sem handler e sem banco
+OVERLOAD_RESPONSE = _canned_response(
+    "503 Service Unavailable",
+    {"ok": False, "error": "servidor sobrecarregado"},
+    {"Retry-After": OVERLOAD_RETRY_AFTER},
+)
+BODY_TOO_LARGE_RESPONSE = _canned_response("413 Request Entity Too Large", {"ok": False, "error": "corpo grande demais"})
+
+
+class BoundedThreadingHTTPServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer com número máximo de workers, backlog configurável e
+    limite de conexões em andamento (executando + na fila)"""
+
+    def __init__(self, server_address, handler_class, max_workers: int, backlog: int, max_inflight: int,
+                 bind_and_activate: bool = True):
+        self.request_queue_size = backlog
+        self.max_inflight = max_inflight
+        self._inflight = 0
+        self._inflight_lock = threading.Lock()
+        self._idle: set[socket.socket] = set()  # keep-alive esperando o próximo request
+        self._draining = False
+        self.idle_timeout = THREADED_KEEPALIVE_TIMEOUT  # espera pela request line (ver handler)
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="http")
+        super().__init__(server_address, handler_class, bind_and_activate)
+
+    def process_request(self, request, client_address):
+        with self._inflight_lock:
+            overloaded = self._inflight >= self.max_inflight
+            if not overloaded:
+                self._inflight += 1
+        if overloaded:
+            metrics.observe_rejected("overload")
+            try:
+                request.sendall(OVERLOAD_RESPONSE)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        # Conexões além do limite de workers esperam na fila do executor em vez de abrir threads novas
+        self._executor.submit(self._process_and_release, request, client_address)
+
+    def _process_and_release(self, request, client_address):
+        try:
+            self.process_request_thread(request, client_address)
+        finally:
+            with self._inflight_lock:
+                self._inflight -= 1
+
+    def inflight(self) -> int:
+        return self._inflight
+
+    def mark_idle(self, conn, idle: bool):
+        with self._inflight_lock:
+            if not idle:
+                self._idle.discard(conn)
+            elif self._draining:
+                # Drenando: nem espera o próximo request
+                with contextlib.suppress(OSError):
+                    conn.shutdown(socket.SHUT_RDWR)
+            else:
+                self._idle.add(conn)
+
+    def shutdown(self):
+        super().shutdown()
+        # Keep-alive ocioso fecha já (a leitura da request line volta vazia)
+        with self._inflight_lock:
+            self._draining = True
+            for conn in self._idle:
+                with contextlib.suppress(OSError):
+                    conn.shutdown(socket.SHUT_RDWR)
+            self._idle.clear()
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _AsyncWriter:
+    """wfile usado pelo handler no modo async: repassa os bytes ao event loop"""
+
+    def __init__(self, loop, writer):
+        self._loop = loop
+        self._writer = writer
+
+    def write(self, data: bytes):
+        self._loop.call_soon_threadsafe(self._writer.write, bytes(data))
+        return len(data)
+
+    def flush(self):
+        asyncio.run_coroutine_threadsafe(self._writer.drain(), self._loop).result()
+
+
+class _AsyncReader:
+    """rfile do handler no modo async para rotas `stream`: o head já lido vem do
+    buffer e o corpo é puxado do event loop à medida que o handler consome"""
+
+    def __init__(self, loop, reader, head: bytes):
+        self._loop = loop
+        self._reader = reader
+        self._head = io.BytesIO(head)
+
+    def _call(self, coro):
+        future = asyncio.run_coroutine_threadsafe(asyncio.wait_for(coro, KEEPALIVE_TIMEOUT), self._loop)
+        try:
+            return future.result()
+        except asyncio.TimeoutError:
+            raise TimeoutError("corpo do request parado") from None
+
+    async def _readexactly(self, n: int) -> bytes:
+        try:
+            return await self._reader.readexactly(n)
+        except asyncio.IncompleteReadError as e:
+            return e.partial
+
+    async def _readline(self) -> bytes:
+        try:
+            return await self._reader.readline()
+        except ValueError:
+            return b""  # linha maior que MAX_HEADER_BYTES: o handler responde 400
+
+    def read(self, n: int) -> bytes:
+        data = self._head.read(n)
+        if len(data) < n:
+            data += self._call(self._readexactly(n - len(data)))
+        return data
+
+    def readline(self, limit: int = -1) -> bytes:
+        line = self._head.readline(limit)
+        if line.endswith(b"\n"):
+            return line
+        return line + self._call(self._readline())
+
+
+class AsyncHTTPServer:
+    """Front end asyncio: o event loop cuida dos sockets (keep-alive, clientes
+    lentos) e cada request completo é despachado para o handler num executor
+    limitado, sem prender uma thread por conexão ociosa.
+
+    Um handler pode deixar em `detached` uma corrotina `f(writer)`: depois que ele
+    volta, o servidor a aguarda no event loop (fora da contagem de in-flight) e
+    fecha a conexão. Respostas longas que só esperam eventos (SSE) não prendem um
+    worker do executor.
+    """
+
+    detach_supported = True
+
+    def __init__(self, host: str, port: int, handler_class, max_workers: int, backlog: int, max_inflight: int,
+                 reuse_port: bool = False):
+        self.handler_class = handler_class
+        self.max_inflight = max_inflight
+        # Escuta já aqui, como no modo threaded: quem cria o servidor sabe que a porta está aberta
+        # (o kernel enfileira as conexões até o event loop começar a aceitar)
+        self.socket = socket.create_server((host, port), backlog=backlog, reuse_port=reuse_port)
+        self.server_name = host
+        self.server_port = self.socket.getsockname()[1]
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="http")
+        self._inflight = 0  # só mexido no event loop: dispensa lock
+        self.router = handler_class.router
+        self._idle: set = set()  # conexões esperando o próximo request (fechadas ao drenar)
+        self._loop = None
+        self._stop = None
+        self._closed = threading.Event()
+
+    def inflight(self) -> int:
+        return self._inflight
+
+    async def _read_request(self, reader) -> tuple[bytes, bool] | None:
+        """Head + corpo já lido e se o corpo ficou no socket para a rota ler (`stream`).
+        Levanta BodyTooLarge sem ler o resto quando o corpo passa do limite da rota"""
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEPALIVE_TIMEOUT)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, asyncio.LimitOverrunError, ConnectionError):
+            return None
+        method, _, target = head.split(b"\r\n", 1)[0].decode("latin-1").partition(" ")
+        route, _ = self.router.resolve(method, target.split(" ", 1)[0].split("?", 1)[0])
+        if route is not None and route.stream:
+            return head, True
+        # Sem rota ou rota sem corpo: o handler descarta até MAX_BODY_BYTES
+        limit = route.max_body if route is not None else MAX_BODY_BYTES
+        length = 0
+        chunked = False
+        for line in head.split(b"\r\n")[1:]:
+            name, _, value = line.partition(b":")
+            name = name.strip().lower()
+            if name == b"content-length":
+                try:
+                    length = int(value.strip())
+                except ValueError:
+                    length = 0
+            elif name == b"transfer-encoding":
+                chunked = value.strip().lower() == b"chunked"
+        if chunked:
+            # Repassa o corpo ainda em chunks: o handler decodifica
+            return head + await self._read_chunked(reader, limit), False
+        if length > limit:
+            raise BodyTooLarge()
+        body = await reader.readexactly(length) if length > 0 else b""
+        return head + body, False
+
+    async def _read_chunked(self, reader, limit: int) -> bytes:
+        raw = bytearray()
+        total = 0
+        while True:
+            line = await reader.readuntil(b"\r\n")
+            raw += line
+            try:
+                size = int(line.split(b";", 1)[0].strip(), 16)
+            except ValueError:
+                return bytes(raw)  # o handler responde 400
+            if size == 0:
+                while True:
+                    trailer = await reader.readuntil(b"\r\n")
+                    raw += trailer
+                    if trailer == b"\r\n":
+                        return bytes(raw)
+            total += size
+            if total > limit:
+                raise BodyTooLarge()
+            raw += await reader.readexactly(size + 2)
+
+    def _dispatch(self, rfile, wfile, client_address):
+        h = self.handler_class.__new__(self.handler_class)
+        h.server = self
+        h.client_address = client_address
+        h.request = h.connection = None
+        h.rfile = rfile
+        h.wfile = wfile
+        h.close_connection = True
+        h.detached = None
+        h.handle_one_request()
+        wfile.flush()
+        return h.close_connection, h.detached
+
+    async def _handle_connection(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        client_address = writer.get_extra_info("peername")
+        wfile = _AsyncWriter(loop, writer)
+        try:
+            while not self._stop.is_set():
+                self._idle.add(writer)
+                try:
+                    request = await self._read_request(reader)
+                except BodyTooLarge:
+                    writer.write(BODY_TOO_LARGE_RESPONSE)
+                    await writer.drain()
+                    break
+                finally:
+                    self._idle.discard(writer)
+                if request is None:
+                    break
+                raw, stream = request
+                if self._inflight >= self.max_inflight:
+                    # Executor saturado: responde direto do event loop em vez de enfileirar
+                    metrics.observe_rejected("overload")
+                    writer.write(OVERLOAD_RESPONSE)
+                    await writer.drain()
+                    break
+                self._inflight += 1
+                # Rota `stream` lê o corpo do socket em blocos em vez de recebê-lo já em memória
+                rfile = _AsyncReader(loop, reader, raw) if stream else io.BytesIO(raw)
+                try:
+                    close, detached = await loop.run_in_executor(
+                        self._executor, self._dispatch, rfile, wfile, client_address
+                    )
+                finally:
+                    self._inflight -= 1
+                await writer.drain()
+                if detached is not None:
+                    await detached(writer)
+                    break
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        server = await asyncio.start_server(self._handle_connection, sock=self.socket, limit=MAX_HEADER_BYTES)
+        try:
+            await self._stop.wait()
+        finally:
+            server.close()
+            # Keep-alive ociosos fecham já; os que estão no meio de um request terminam
+            for writer in list(self._idle):
+                writer.close()
+            self._closed.set()
+        while self._inflight:
+            await asyncio.sleep(0.05)
+
+    def serve_forever(self):
+        asyncio.run(self._serve())
+
+    def shutdown(self):
+        """Para de aceitar conexões (chamado de outra thread); volta quando o socket fechou"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+            self._closed.wait()
+
+
+def _bind(server: HTTPServer, reuse_port: bool) -> HTTPServer:
+    if reuse_port:
+        # Vários processos escutando a mesma porta; o kernel distribui as conexões
+        server.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    try:
+        server.server_bind()
+        server.server_activate()
+    except Exception:
+        server.server_close()
+        raise
+    return server
+
+
+def make_server(
+    mode: str,
+    host: str,
+    port: int,
+    handler_class,
+    max_workers: int,
+    backlog: int,
+    max_inflight: int = MAX_INFLIGHT,
+    reuse_port: bool = False,
+):
+    max_inflight = max_inflight or max_workers * 4
+    if mode == "single":
+        # Sem keep-alive: um socket ocioso bloquearia todos os outros clientes
+        single_handler = type(handler_class.__name__, (handler_class,), {"protocol_version": "HTTP/1.0"})
+        return _bind(HTTPServer((host, port), single_handler, bind_and_activate=False), reuse_port)
+    if mode == "threaded":
+        server = BoundedThreadingHTTPServer(
+            (host, port), handler_class, max_workers, backlog, max_inflight, bind_and_activate=False
+        )
+        return _bind(server, reuse_port)
+    if mode == "async":
+        return AsyncHTTPServer(host, port, handler_class, max_workers, backlog, max_inflight, reuse_port=reuse_port)
+    raise ValueError(f"modo de servidor desconhecido: {mode}")
+
+
+def drain_server(server, timeout: float = GRACEFUL_TIMEOUT):
+    """Para de aceitar conexões e espera as em andamento terminarem (até `timeout`)"""
+    server.shutdown()
+    if isinstance(server, HTTPServer):
+        # Com SO_REUSEPORT a fila de accept é só deste socket: fechá-lo resetaria
+        # as conexões já enfileiradas, então elas são atendidas antes
+        while select.select([server.socket], [], [], 0)[0]:
+            server._handle_request_noblock()
+        server.socket.close()
+    inflight = getattr(server, "inflight", lambda: 0)
+    deadline = time.monotonic() + timeout
+    while inflight() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    if inflight():
+        log(logging.WARNING, "drain_timeout", pid=os.getpid(), inflight=inflight())
@@ -0,0 +1,159 @@
+import os
+from dotenv import load_dotenv
+
+# Configuração via ambiente (.env em desenvolvimento), lida uma vez na importação:
+# todo módulo da API importa as constantes daqui
+load_dotenv(override=True)
+
+GOOGLE_AUTH_URL = "https://accounts.google.com/o/oauth2/v2/auth"
+GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
+GOOGLE_USERINFO_URL = "https://www.googleapis.com/oauth2/v3/userinfo"
+GOOGLE_ISSUER = "https://accounts.google.com"
+
+# Provedor OIDC: endpoints vêm do discovery de OAUTH_ISSUER (Google por padrão;
+# scripts/mock_oauth.py em desenvolvimento)
+OAUTH_ISSUER = os.getenv("OAUTH_ISSUER", GOOGLE_ISSUER).rstrip("/")
+OAUTH_TIMEOUT = float(os.getenv("OAUTH_TIMEOUT", "5"))  # por tentativa
+OAUTH_RETRIES = int(os.getenv("OAUTH_RETRIES", "2"))
+OAUTH_VERIFY_ID_TOKEN = os.getenv("OAUTH_VERIFY_ID_TOKEN", "1") != "0"  # valida o id_token localmente e pula o userinfo
+OAUTH_DISCOVERY_TTL = 24 * 60 * 60
+OAUTH_JWKS_TTL = 60 * 60
+OAUTH_JWKS_MIN_REFRESH = 60  # refetch por kid desconhecido no máximo a cada N segundos
+OAUTH_CLOCK_SKEW = 60
+
+JWT_EXP_SECONDS = 60 * 60 * 24 * 30  # 30 dias
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "1024"))  # tokens já verificados mantidos em memória
+
+# Perfis de /api/me em memória, invalidados por NOTIFY em escritas de users
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))  # 0 desliga
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "300"))  # teto de idade mesmo sem invalidação
+PROFILES_CHANNEL = "profile_changes"
+
+# Pool de conexões compartilhado pelo processo (reaproveitado entre requests)
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # espera máx. por uma conexão livre
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))  # fecha conexões ociosas além do mínimo
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))  # recicla conexões antigas
+
+# Réplicas de leitura (opcional): DATABASE_READ_URL com uma ou mais URLs separadas por vírgula.
+# Cada réplica tem seu pool (DB_POOL_*); rotas só de leitura usam a réplica saudável da vez
+READ_AFTER_WRITE_SECONDS = float(os.getenv("READ_AFTER_WRITE_SECONDS", "5"))  # leituras do usuário vão ao primário
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "10"))  # acima disso a réplica sai da rotação
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "5"))
+REPLICA_CONNECT_TIMEOUT = 2.0  # espera máx. por conexão da réplica antes de cair para o primário
+READ_PRIMARY_COOKIE = "read_primary"
+
+# Servidor HTTP (modo single | threaded | async)
+SERVER_MODE = os.getenv("SERVER_MODE", "threaded")
+SERVER_MAX_WORKERS = int(os.getenv("SERVER_MAX_WORKERS", "16"))
+SERVER_BACKLOG = int(os.getenv("SERVER_BACKLOG", "128"))
+KEEPALIVE_TIMEOUT = float(os.getenv("KEEPALIVE_TIMEOUT", "15"))  # fecha sockets keep-alive ociosos
+# No modo threaded a espera pelo próximo request prende uma thread do executor: bem mais curta.
+# KEEPALIVE_TIMEOUT continua valendo para cada leitura/escrita dentro do request.
+THREADED_KEEPALIVE_TIMEOUT = float(os.getenv("THREADED_KEEPALIVE_TIMEOUT", "2"))
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = int(os.getenv("MAX_BODY_BYTES", str(256 * 1024)))  # acima disso 413 sem ler o corpo
+
+# Pre-fork: N processos, cada um com seu socket (SO_REUSEPORT), pool e threads.
+# DB_POOL_* e SERVER_MAX_WORKERS valem por processo
+SERVER_PROCESSES = int(os.getenv("SERVER_PROCESSES", "1"))  # 0 = um por CPU
+WORKER_MAX_REQUESTS = int(os.getenv("WORKER_MAX_REQUESTS", "0"))  # recicla o worker após N requests; 0 desliga
+WORKER_MAX_REQUESTS_JITTER = int(os.getenv("WORKER_MAX_REQUESTS_JITTER", "0"))  # evita reciclar todos juntos
+GRACEFUL_TIMEOUT = float(os.getenv("GRACEFUL_TIMEOUT", "30"))  # espera pelos requests em andamento ao drenar
+WORKER_MIN_UPTIME = 5.0  # worker que morre antes disso conta como crash em loop (restart com backoff)
+WORKER_MAX_BACKOFF = 30.0
+
+# Admissão: conexões em andamento (em execução + na fila) além disso recebem 503 na hora
+MAX_INFLIGHT = int(os.getenv("MAX_INFLIGHT", "0"))  # 0 = 4x o número de workers
+OVERLOAD_RETRY_AFTER = 2
+
+# Rate limiting por token bucket: memory (por processo) | postgres (compartilhado) | off
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_IP_PER_MINUTE = float(os.getenv("RATE_IP_PER_MINUTE", "600"))
+RATE_IP_BURST = float(os.getenv("RATE_IP_BURST", "120"))
+RATE_USER_PER_MINUTE = float(os.getenv("RATE_USER_PER_MINUTE", "240"))
+RATE_USER_BURST = float(os.getenv("RATE_USER_BURST", "60"))
+RATE_WRITE_COST = 2  # escritas consomem mais fichas que leituras
+# Proxies confiáveis na frente do app (o deploy termina TLS num proxy, como assume _is_secure).
+# Com N > 0 o IP do cliente é o N-ésimo endereço a partir do fim do X-Forwarded-For: o que o
+# nosso proxy anexou, não o que o cliente mandou. 0 = IP do socket (acesso direto, sem proxy)
+RATE_LIMIT_TRUST_PROXY = int(os.getenv("RATE_LIMIT_TRUST_PROXY", "1"))
+RATE_LIMIT_MAX_KEYS = 100_000
+RATE_LIMIT_EXEMPT = {"/", "/health", "/metrics"}
+
+# Observabilidade
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()  # DEBUG | INFO | WARNING | ERROR | OFF
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # se definido, /metrics exige Authorization: Bearer <token>
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Stream SSE de mudanças (GET /api/routines/stream)
+# No modo async a espera por eventos roda no event loop (um socket e uma fila por stream);
+# no threaded cada stream prende um worker do executor por até SSE_MAX_SECONDS.
+# 0 = automático: SSE_ASYNC_CLIENTS no async, metade dos workers no threaded; um valor
+# explícito no threaded ainda deixa ao menos um worker livre.
+SSE_MAX_CLIENTS = int(os.getenv("SSE_MAX_CLIENTS", "0"))
+SSE_ASYNC_CLIENTS = 1000
+# Acima do limite: 200 com um `retry:` longo e fecha (um 503 faria o EventSource desistir)
+SSE_BUSY_RETRY_MS = 30000
+SSE_HEARTBEAT_SECONDS = 15.0
+SSE_MAX_SECONDS = float(os.getenv("SSE_MAX_SECONDS", "300"))  # o cliente reconecta com Last-Event-ID
+SSE_REPLAY_LIMIT = 500
+EVENT_RETENTION_HOURS = int(os.getenv("EVENT_RETENTION_HOURS", "24"))
+EVENTS_CHANNEL = "routine_events"
+
+# Respostas JSON menores que isso não compensam comprimir
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+# Paginação de GET /api/routines
+ROUTINES_PAGE_DEFAULT = 50
+ROUTINES_PAGE_MAX = 500
+STATS_MAX_DAYS = 366
+ROUTINES_BATCH_MAX = int(os.getenv("ROUTINES_BATCH_MAX", "100"))
+
+# Delta sync (GET /api/routines/changes) e compactação de tombstones
+SYNC_PAGE_MAX = 1000
+TOMBSTONE_RETENTION_DAYS = int(os.getenv("TOMBSTONE_RETENTION_DAYS", "30"))  # offline há mais tempo = sync completo
+MAINTENANCE_INTERVAL_SECONDS = float(os.getenv("MAINTENANCE_INTERVAL_SECONDS", "3600"))  # 0 desliga
+MAX_ROUTINE_ID = 2**31 - 1  # routines.id é SERIAL
+
+# Import/export em massa via COPY (POST /api/routines/import, GET /api/routines/export)
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(64 * 1024 * 1024)))
+IMPORT_MAX_ERRORS = 20  # erros de validação devolvidos (e lidos, sem on_error=skip) antes de desistir
+IMPORT_SPOOL_BYTES = 1024 * 1024  # registros validados acima disso vão para arquivo temporário em disco
+STREAM_CHUNK_BYTES = 64 * 1024  # COPY entrega uma linha por mensagem: agrupa em blocos deste tamanho
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+BULK_REV_SETTING = "routines.bulk_rev"
+
+# Particionamento mensal de routines (created_at, UTC) e arquivamento
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+ARCHIVE_AFTER_MONTHS = int(os.getenv("ARCHIVE_AFTER_MONTHS", "12"))  # rotinas feitas mais antigas vão para o arquivo
+ARCHIVE_BATCH = 5000
+
+# Gamificação: XP por rotina feita; nível L exige LEVEL_XP * (L - 1)^2 de XP
+XP_PER_DONE = 10
+LEVEL_XP = 100
+PROGRESS_TZ = os.getenv("PROGRESS_TZ", "UTC")  # fuso que define "o dia" de uma rotina para streaks
+
+# Catálogo de conquistas: cada regra olha um único contador de user_progress
+# ("perfect_day" = algum dia com todas as rotinas feitas). Ao mudar o catálogo,
+# incremente ACHIEVEMENTS_VERSION para reavaliar todos os usuários uma vez.
+ACHIEVEMENTS = (
+    {"id": "first_done", "title": "Primeiro passo", "description": "Concluir 1 rotina", "counter": "total_done", "threshold": 1},
+    {"id": "done_10", "title": "Pegando o ritmo", "description": "Concluir 10 rotinas", "counter": "total_done", "threshold": 10},
+    {"id": "done_100", "title": "Centenário", "description": "Concluir 100 rotinas", "counter": "total_done", "threshold": 100},
+    {"id": "done_1000", "title": "Imparável", "description": "Concluir 1000 rotinas", "counter": "total_done", "threshold": 1000},
+    {"id": "streak_3", "title": "Aquecendo", "description": "3 dias seguidos", "counter": "best_streak", "threshold": 3},
+    {"id": "streak_7", "title": "Semana perfeita", "description": "7 dias seguidos", "counter": "best_streak", "threshold": 7},
+    {"id": "streak_30", "title": "Hábito formado", "description": "30 dias seguidos", "counter": "best_streak", "threshold": 30},
+    {"id": "level_5", "title": "Veterano", "description": "Chegar ao nível 5", "counter": "level", "threshold": 5},
+    {"id": "perfect_day", "title": "Dia completo", "description": "Concluir todas as rotinas de um dia", "counter": "perfect_day", "threshold": 1},
+)
+ACHIEVEMENTS_VERSION = 1
+
+# Recorrências: daily | weekdays (seg-sex) | every_n (a cada N dias) | weekly (dias escolhidos,
+# 0 = segunda ... 6 = domingo). Instâncias só viram linhas em routines quando o dia é aberto/concluído.
+RECURRENCE_KINDS = ("daily", "weekdays", "every_n", "weekly")
+RECURRENCE_FIELDS = ("id", "title", "kind", "interval_days", "weekdays", "start_date", "end_date", "tz")
@@ -1,48 +1,323 @@
 from http.server import BaseHTTPRequestHandler
+import argparse
+import asyncio
+import contextlib
+import csv
+import functools
+import logging
+import math
 import os
 import json
+import queue
 import psycopg
 import secrets
+import threading
 import time
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
 import hmac
 import hashlib
 import base64
 import urllib.parse
-import urllib.request
-from dotenv import load_dotenv
-
-load_dotenv(override=True)
-
-GOOGLE_AUTH_URL = "https://accounts.google.com/o/oauth2/v2/auth"
-GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
-GOOGLE_USERINFO_URL = "https://www.googleapis.com/oauth2/v3/userinfo"
-
-JWT_EXP_SECONDS = 60 * 60 * 24 * 30  # 30 dias
-
-USERS_TABLE_SQL = """
-CREATE TABLE IF NOT EXISTS users (
-  id SERIAL PRIMARY KEY,
-  provider TEXT NOT NULL,
-  provider_id TEXT NOT NULL UNIQUE,
-  email TEXT NOT NULL UNIQUE,
-  name TEXT,
-  picture TEXT,
-  created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
-);
-"""
+from collections import OrderedDict
+
+from _lib import changes, db, oidc, profiles, ratelimit
+from _lib.bulk import ImportRejected, export_routines, import_routines, parse_import, stage_import
+from _lib.changes import ChangeHub, load_events, pruned_after
+from _lib.db import close_pool, ensure_schema_once, get_db_url, get_pool, pool_stats
+from _lib.maintenance import ensure_partitions, start_maintenance, unarchive_routine
+from _lib.observability import log, metrics
+from _lib.oidc import HTTPClient, OIDCProvider, b64url_decode
+from _lib.prefork import PreforkSupervisor, count_request, draining, serve_worker
+from _lib.profiles import ProfileCache
+from _lib.progress import (
+    PROGRESS_FIELDS,
+    ProgressDeltas,
+    apply_progress,
+    evaluate_achievements,
+    lock_progress,
+    progress_today,
+)
+from _lib.ratelimit import make_rate_limiter
+from _lib.recurrences import materialize_occurrence, pending_occurrences, recurrence_occurs
+from _lib.server import BodyError, BodyTooLarge, ChunkedWriter, Route, Router, compress, dumps, make_server, pick_encoding
+from _lib.settings import (
+    ACHIEVEMENTS,
+    ACHIEVEMENTS_VERSION,
+    COMPRESS_MIN_BYTES,
+    EXPORT_FORMATS,
+    IMPORT_MAX_BYTES,
+    JWT_CACHE_SIZE,
+    JWT_EXP_SECONDS,
+    KEEPALIVE_TIMEOUT,
+    LEVEL_XP,
+    MAX_BODY_BYTES,
+    MAX_HEADER_BYTES,
+    MAX_INFLIGHT,
+    MAX_ROUTINE_ID,
+    METRICS_TOKEN,
+    OAUTH_ISSUER,
+    OAUTH_RETRIES,
+    OAUTH_TIMEOUT,
+    OAUTH_VERIFY_ID_TOKEN,
+    PROFILE_CACHE_SIZE,
+    PROFILE_CACHE_TTL,
+    RATE_IP_BURST,
+    RATE_IP_PER_MINUTE,
+    RATE_LIMIT_EXEMPT,
+    RATE_LIMIT_TRUST_PROXY,
+    RATE_USER_BURST,
+    RATE_USER_PER_MINUTE,
+    RATE_WRITE_COST,
+    READ_AFTER_WRITE_SECONDS,
+    READ_PRIMARY_COOKIE,
+    RECURRENCE_FIELDS,
+    RECURRENCE_KINDS,
+    ROUTINES_BATCH_MAX,
+    ROUTINES_PAGE_DEFAULT,
+    ROUTINES_PAGE_MAX,
+    SERVER_BACKLOG,
+    SERVER_MAX_WORKERS,
+    SERVER_MODE,
+    SERVER_PROCESSES,
+    SSE_ASYNC_CLIENTS,
+    SSE_BUSY_RETRY_MS,
+    SSE_HEARTBEAT_SECONDS,
+    SSE_MAX_CLIENTS,
+    SSE_MAX_SECONDS,
+    SSE_REPLAY_LIMIT,
+    STATS_MAX_DAYS,
+    STREAM_CHUNK_BYTES,
+    SYNC_PAGE_MAX,
+)
 
-ROUTINES_TABLE_SQL = """
-CREATE TABLE IF NOT EXISTS routines (
-  id SERIAL PRIMARY KEY,
-  user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-  title TEXT NOT NULL,
-  status TEXT NOT NULL DEFAULT 'pendente' CHECK (status IN ('pendente', 'feita')),
-  created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
-);
+# Status retornando também o status anterior (necessário para o progresso incremental)
+ROUTINE_STATUS_SQL = """
+UPDATE routines r SET status = %s, imported = FALSE
+FROM (SELECT id, status, imported FROM routines WHERE id = %s AND user_id = %s AND deleted_at IS NULL FOR UPDATE) old
+WHERE r.id = old.id
+RETURNING r.id, r.title, r.status, r.created_at, old.status, old.imported
 """
+ROUTINE_UPDATE_SQL = (
+    "UPDATE routines SET title = %s WHERE id = %s AND user_id = %s AND deleted_at IS NULL"
+    " RETURNING id, title, status, created_at"
+)
+# Delete vira tombstone para o delta sync (GET /api/routines/changes) enxergar a remoção
+ROUTINE_DELETE_SQL = (
+    "UPDATE routines SET deleted_at = NOW() WHERE id = %s AND user_id = %s AND deleted_at IS NULL"
+    " RETURNING id, status, created_at, imported"
+)
+
+# Intervalo [início do dia `from`, início do dia seguinte a `to`) no fuso do usuário;
+# mantém o filtro em created_at para aproveitar o índice (user_id, created_at)
+DAY_RANGE_SQL = (
+    "created_at >= %s::date::timestamp AT TIME ZONE %s"
+    " AND created_at < (%s::date + 1)::timestamp AT TIME ZONE %s"
+)
+
+
+# -------- JWT --------
+class JWTKeys:
+    """Chaves HMAC preparadas uma vez por processo.
+
+    JWT_SECRET assina/verifica tokens sem `kid` (formato antigo). Para rotação,
+    JWT_KEYS="kid1:segredo1,kid2:segredo2" aceita várias chaves e JWT_ACTIVE_KID
+    escolhe a que assina (padrão: a primeira da lista).
+    """
+
+    def __init__(self):
+        self.keys: dict[str | None, "hmac.HMAC"] = {}
+        secret = os.getenv("JWT_SECRET")
+        if secret:
+            self.keys[None] = hmac.new(secret.encode(), digestmod=hashlib.sha256)
+        kids = []
+        for item in (os.getenv("JWT_KEYS") or "").split(","):
+            kid, sep, key = item.strip().partition(":")
+            if sep and kid and key:
+                self.keys[kid] = hmac.new(key.encode(), digestmod=hashlib.sha256)
+                kids.append(kid)
+        self.active_kid = os.getenv("JWT_ACTIVE_KID") or (kids[0] if kids else None)
+        if self.active_kid not in self.keys:
+            self.active_kid = None
+
+    def sign(self, msg: bytes) -> tuple[str | None, bytes]:
+        base = self.keys.get(self.active_kid)
+        if base is None:
+            raise RuntimeError("JWT_SECRET não configurado")
+        mac = base.copy()
+        mac.update(msg)
+        return self.active_kid, mac.digest()
+
+    def digest(self, kid: str | None, msg: bytes) -> bytes:
+        base = self.keys.get(kid)
+        if base is None:
+            raise ValueError("kid desconhecido")
+        mac = base.copy()
+        mac.update(msg)
+        return mac.digest()
+
+
+_jwt_keys: JWTKeys | None = None
+
+
+def _get_jwt_keys() -> JWTKeys:
+    global _jwt_keys
+    if _jwt_keys is None:
+        _jwt_keys = JWTKeys()
+    return _jwt_keys
+
+
+class TokenCache:
+    """LRU limitado de tokens já verificados, indexado pelo digest do token"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict[bytes, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> dict | None:
+        key = self._key(token)
+        with self._lock:
+            payload = self._items.get(key)
+            if payload is not None and payload.get("exp", 0) < int(time.time()):
+                # Expirou desde que entrou no cache
+                del self._items[key]
+                payload = None
+            if payload is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def put(self, token: str, payload: dict):
+        if self.maxsize <= 0:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._items[key] = payload
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"size": len(self._items), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+_token_cache = TokenCache(JWT_CACHE_SIZE)
 
 
 class handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 mantém o socket aberto entre os fetch do frontend (toda resposta
+    # precisa de Content-Length)
+    protocol_version = "HTTP/1.1"
+    timeout = KEEPALIVE_TIMEOUT
+    router: Router  # tabela de rotas, atribuída logo após ROUTES
+
+    # -------- Instrumentação --------
+    def handle_one_request(self):
+        self._phases = {}
+        self._status = None
+        self._route = None
+        self._extra_headers = []
+        self._body_state = None  # None (sem corpo) | "unread" | "partial" | "done"
+        self.command = None
+        start = time.perf_counter()
+        # Só conta como ocioso o keep-alive que já atendeu algum request
+        mark_idle = getattr(self.server, "mark_idle", None) if getattr(self, "_served", False) else None
+        if mark_idle:
+            mark_idle(self.connection, True)
+        self._served = True
+        idle_timeout = getattr(self.server, "idle_timeout", None)
+        if idle_timeout is not None:
+            # Esperando a request line sem prender um worker por KEEPALIVE_TIMEOUT
+            self.connection.settimeout(idle_timeout)
+        try:
+            super().handle_one_request()
+            self._finish_body()
+        finally:
+            if mark_idle:
+                mark_idle(self.connection, False)
+            if self.command and self._status is not None:
+                path = self._parse_path()
+                route = self._route or self.router.label(path)
+                metrics.observe_request(self.command, route, self._status, time.perf_counter() - start, self._phases)
+            if self.command:
+                count_request()
+            if draining.is_set():
+                # Processo drenando: termina o request atual e não reaproveita a conexão
+                self.close_connection = True
+
+    def send_response(self, code, message=None):
+        self._status = code
+        super().send_response(code, message)
+
+    def end_headers(self):
+        # Headers acrescentados fora do handler da rota (ex.: cookie de read-your-writes)
+        for name, value in self._extra_headers:
+            self.send_header(name, value)
+        self._extra_headers = []
+        super().end_headers()
+
+    def parse_request(self):
+        # Roda logo após ler request line + headers: pedido barrado aqui não chega ao do_*
+        # (nem lê o corpo, nem toca no banco)
+        mark_idle = getattr(self.server, "mark_idle", None)
+        if mark_idle:
+            mark_idle(self.connection, False)
+        if getattr(self.server, "idle_timeout", None) is not None:
+            self.connection.settimeout(self.timeout)
+        if not super().parse_request():
+            return False
+        if self._has_body():
+            self._body_state = "unread"
+        return self._admit()
+
+    # -------- Rate limiting --------
+    def _client_ip(self) -> str:
+        if RATE_LIMIT_TRUST_PROXY:
+            # Atrás do proxy todos os sockets vêm do IP dele: sem isso o balde por IP vira um
+            # limite global. Os primeiros itens do header o cliente controla; conta do fim
+            hops = [h.strip() for h in self.headers.get("X-Forwarded-For", "").split(",") if h.strip()]
+            if hops:
+                return hops[-min(RATE_LIMIT_TRUST_PROXY, len(hops))]
+        return str(self.client_address[0]) if self.client_address else "-"
+
+    def _admit(self) -> bool:
+        if ratelimit.limiter is None or self.command == "OPTIONS" or self._parse_path() in RATE_LIMIT_EXEMPT:
+            return True
+        cost = 1 if self.command in ("GET", "HEAD") else RATE_WRITE_COST
+        # Usuário antes do IP: quem estourou o próprio balde não gasta fichas do IP, que pode
+        # ser compartilhado (NAT, rede corporativa) com outros usuários
+        wait, reason = 0.0, "rate_user"
+        session = self._get_session()
+        if session:
+            wait = ratelimit.limiter.take(f"user:{session['uid']}", RATE_USER_PER_MINUTE, RATE_USER_BURST, cost)
+        if not wait:
+            wait = ratelimit.limiter.take(f"ip:{self._client_ip()}", RATE_IP_PER_MINUTE, RATE_IP_BURST, cost)
+            reason = "rate_ip"
+        if not wait:
+            return True
+        metrics.observe_rejected(reason)
+        headers = {"Retry-After": str(math.ceil(wait))}
+        if self._has_body():
+            # Corpo não lido (nem vale a pena descartá-lo): a conexão não pode ser reaproveitada
+            headers["Connection"] = "close"
+        self._write_json(429, {"ok": False, "error": "muitas requisições, tente novamente em instantes"}, headers=headers)
+        return False
+
+    def _add_phase(self, phase: str, start: float):
+        self._phases[phase] = self._phases.get(phase, 0.0) + time.perf_counter() - start
+
+    def log_message(self, format, *args):
+        # Access log passa pelo logger (desligável com LOG_LEVEL) em vez de stderr direto
+        log(logging.INFO, "request", client=self.address_string(), line=format % args)
+
     # -------- Utilidades --------
     def _add_cors_headers(self):
         """Adiciona headers CORS necessários"""
@@ -53,91 +328,207 @@ class handler(BaseHTTPRequestHandler):
         self.send_header("Access-Control-Allow-Headers", "Content-Type, Authorization")
 
     def _write_json(self, status: int, payload: dict, headers: dict | None = None):
-        body = json.dumps(payload).encode("utf-8")
+        start = time.perf_counter()
+        body = dumps(payload)
+        headers = dict(headers or {})
+        encoding = None
+        if len(body) >= COMPRESS_MIN_BYTES:
+            encoding = pick_encoding(self.headers.get("Accept-Encoding", ""))
+        if encoding:
+            body = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            # ETag forte é por representação: a versão comprimida tem a sua
+            if "ETag" in headers:
+                headers["ETag"] = f'{headers["ETag"][:-1]}-{encoding}"'
+        self._add_phase("serialize", start)
+        start = time.perf_counter()
         self.send_response(status)
         self._add_cors_headers()
         self.send_header("Content-Type", "application/json; charset=utf-8")
         self.send_header("Content-Length", str(len(body)))
-        if headers:
-            for k, v in headers.items():
-                self.send_header(k, v)
+        self.send_header("Vary", "Accept-Encoding")
+        for k, v in headers.items():
+            self.send_header(k, v)
         self.end_headers()
         self.wfile.write(body)
+        self._add_phase("write", start)
+
+    def _etag_matches(self, etag: str) -> bool:
+        inm = self.headers.get("If-None-Match", "")
+        if not inm:
+            return False
+        if inm.strip() == "*":
+            return True
+        # Aceita também as variantes comprimidas emitidas por _write_json
+        candidates = {etag} | {f'{etag[:-1]}-{enc}"' for enc in ("gzip", "br")}
+        return any(t.strip() in candidates for t in inm.split(","))
+
+    def _write_not_modified(self, etag: str):
+        # 304 não tem corpo: nada de query completa nem serialização
+        self.send_response(304)
+        self._add_cors_headers()
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "private, no-cache")
+        self.end_headers()
 
     def _parse_path(self):
         return self.path.split("?", 1)[0]
 
-    def _get_db_url(self):
-        return os.getenv("DATABASE_URL") or os.getenv("NEON_DATABASE_URL")
-
-    def _connect(self):
-        url = self._get_db_url()
-        if not url:
-            raise RuntimeError("DATABASE_URL/NEON_DATABASE_URL não configurado")
-        # Limpa espaços em branco/newlines que podem aparecer ao colar a URL
-        url = url.strip().replace("\n", "").replace("\r", "")
-        # Anexa sslmode=require com segurança (preserva query params existentes)
-        if "sslmode" not in url:
-            sep = "&" if "?" in url else "?"
-            url = f"{url}{sep}sslmode=require"
-        return psycopg.connect(url)
+    def _parse_query(self) -> dict:
+        query = urllib.parse.urlparse(self.path).query
+        return {k: v[0] for k, v in urllib.parse.parse_qs(query).items()}
+
+    def _parse_tz(self, query: dict) -> str:
+        tz = query.get("tz") or "UTC"
+        ZoneInfo(tz)  # levanta se o fuso não existir
+        return tz
+
+    # -------- Cursor de paginação --------
+    def _encode_cursor(self, created_at, rid: int) -> str:
+        return self._b64url_encode(f"{created_at.isoformat()}|{rid}".encode())
+
+    def _decode_cursor(self, cursor: str):
+        created_at, rid = self._b64url_decode(cursor).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), int(rid)
+
+    # -------- Token de sync --------
+    def _encode_sync_token(self, rev: int, rid: int, full: bool) -> str:
+        return self._b64url_encode(f"{rev}|{rid}|{int(full)}".encode())
+
+    def _decode_sync_token(self, token: str) -> tuple[int, int, bool]:
+        rev, rid, full = self._b64url_decode(token).decode().split("|", 2)
+        return int(rev), int(rid), full == "1"
+
+    @contextlib.contextmanager
+    def _connect(self, read: bool = False):
+        # Empresta uma conexão do pool; devolvida (commit/rollback) ao sair do `with`.
+        # "connect" mede a espera pelo pool; "query" o tempo com a conexão em mãos.
+        # read=True (handler só lê) usa uma réplica saudável, salvo logo após escrita do usuário
+        start = time.perf_counter()
+        replica = db.replicas.pick() if read and not self._read_own_writes() else None
+        with contextlib.ExitStack() as stack:
+            conn = None
+            if replica is not None:
+                if not db.schema_ready():
+                    # Migrações só rodam no primário
+                    with get_pool().connection() as primary:
+                        ensure_schema_once(primary)
+                try:
+                    conn = stack.enter_context(db.replicas.connection(replica))
+                except Exception as e:
+                    db.replicas.mark_down(replica, str(e))
+                    replica = None
+            if conn is None:
+                conn = stack.enter_context(get_pool().connection())
+            self._add_phase("connect", start)
+            start = time.perf_counter()
+            schema_before = self._phases.get("schema", 0.0)
+            try:
+                yield conn
+            except psycopg.OperationalError as e:
+                if replica is not None:
+                    db.replicas.mark_down(replica, str(e))
+                raise
+            finally:
+                schema = self._phases.get("schema", 0.0) - schema_before
+                self._phases["query"] = self._phases.get("query", 0.0) + time.perf_counter() - start - schema
+
+    def _read_own_writes(self) -> bool:
+        """Usuário escreveu há menos de READ_AFTER_WRITE_SECONDS: lê do primário. O cookie
+        cobre escritas que passaram por outro processo/instância"""
+        if not db.replicas.replicas:
+            return False
+        wrote_at = self._get_cookies().get(READ_PRIMARY_COOKIE)
+        try:
+            if wrote_at and time.time() - float(wrote_at) < READ_AFTER_WRITE_SECONDS:
+                return True
+        except ValueError:
+            pass
+        session = self._get_session()
+        return bool(session) and db.replicas.wrote_recently(session["uid"])
+
+    def _note_write(self, uid: int):
+        if not db.replicas.replicas:
+            return
+        db.replicas.note_write(uid)
+        samesite = "None" if self._is_secure() else "Lax"
+        cookie_flags = f"Path=/; HttpOnly; SameSite={samesite}; Max-Age={math.ceil(READ_AFTER_WRITE_SECONDS)}"
+        if self._is_secure():
+            cookie_flags += "; Secure"
+        self._extra_headers.append(("Set-Cookie", f"{READ_PRIMARY_COOKIE}={time.time():.3f}; {cookie_flags}"))
 
     def _ensure_schema(self, cur):
-        cur.execute(USERS_TABLE_SQL)
-        cur.execute(ROUTINES_TABLE_SQL)
-        # Garantir coluna user_id mesmo se tabela antiga existir
-        cur.execute(
-            "SELECT column_name FROM information_schema.columns WHERE table_name='routines' AND column_name='user_id'"
-        )
-        has_user_id = cur.fetchone()
-        if not has_user_id:
-            cur.execute("ALTER TABLE routines ADD COLUMN user_id INTEGER")
-        cur.execute("ALTER TABLE routines DROP CONSTRAINT IF EXISTS routines_user_id_fkey")
-        cur.execute(
-            "ALTER TABLE routines ADD CONSTRAINT routines_user_id_fkey FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE"
-        )
-        cur.execute("DELETE FROM routines WHERE user_id IS NULL")
-        cur.execute("ALTER TABLE routines ALTER COLUMN user_id SET NOT NULL")
+        # No caminho quente é só um teste de flag; DDL roda uma vez por processo
+        start = time.perf_counter()
+        ensure_schema_once(cur.connection)
+        self._add_phase("schema", start)
+
+    def _write_metrics(self):
+        if METRICS_TOKEN and self.headers.get("Authorization", "") != f"Bearer {METRICS_TOKEN}":
+            self._write_json(401, {"ok": False, "error": "não autorizado"})
+            return
+        gauges = {
+            "db_pool": pool_stats(),
+            "jwt_cache": _token_cache.stats(),
+            "profile_cache": profiles.cache.stats(),
+            "replicas": db.replicas.stats(),
+        }
+        if ratelimit.limiter is not None:
+            gauges["rate_limit"] = ratelimit.limiter.stats()
+        if hasattr(self.server, "inflight"):
+            gauges["http"] = {"inflight": self.server.inflight()}
+        body = metrics.render(gauges).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
 
     # -------- JWT helpers --------
     def _b64url_encode(self, data: bytes) -> str:
         return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
 
     def _b64url_decode(self, data: str) -> bytes:
-        padding = "=" * (-len(data) % 4)
-        return base64.urlsafe_b64decode(data + padding)
+        return b64url_decode(data)
 
     def _jwt_sign(self, payload: dict) -> str:
-        secret = os.getenv("JWT_SECRET")
-        if not secret:
-            raise RuntimeError("JWT_SECRET não configurado")
+        keys = _get_jwt_keys()
         header = {"alg": "HS256", "typ": "JWT"}
+        if keys.active_kid:
+            header["kid"] = keys.active_kid
         payload = payload.copy()
         payload["exp"] = int(time.time()) + JWT_EXP_SECONDS
         h64 = self._b64url_encode(json.dumps(header, separators=(",", ":")).encode())
         p64 = self._b64url_encode(json.dumps(payload, separators=(",", ":")).encode())
         msg = f"{h64}.{p64}".encode()
-        sig = hmac.new(secret.encode(), msg, hashlib.sha256).digest()
+        _, sig = keys.sign(msg)
         s64 = self._b64url_encode(sig)
         return f"{h64}.{p64}.{s64}"
 
     def _jwt_verify(self, token: str) -> dict:
-        secret = os.getenv("JWT_SECRET")
-        if not secret:
+        cached = _token_cache.get(token)
+        if cached is not None:
+            return cached
+        keys = _get_jwt_keys()
+        if not keys.keys:
             raise RuntimeError("JWT_SECRET não configurado")
         try:
             h64, p64, s64 = token.split(".")
+            header = json.loads(self._b64url_decode(h64))
+            if header.get("alg") != "HS256":
+                raise ValueError("alg não suportado")
             msg = f"{h64}.{p64}".encode()
             sig = self._b64url_decode(s64)
-            expected = hmac.new(secret.encode(), msg, hashlib.sha256).digest()
+            expected = keys.digest(header.get("kid"), msg)
             if not hmac.compare_digest(sig, expected):
                 raise ValueError("assinatura inválida")
             payload = json.loads(self._b64url_decode(p64))
             if payload.get("exp", 0) < int(time.time()):
                 raise ValueError("token expirado")
-            return payload
         except Exception as e:
             raise ValueError(f"token inválido: {e}")
+        _token_cache.put(token, payload)
+        return payload
 
     def _get_cookies(self) -> dict:
         raw = self.headers.get("Cookie", "")
@@ -186,6 +577,7 @@ class handler(BaseHTTPRequestHandler):
         self.send_response(302)
         self._add_cors_headers()
         self.send_header("Location", url)
+        self.send_header("Content-Length", "0")
         if extra_headers:
             for k, v in extra_headers.items():
                 self.send_header(k, v)
@@ -212,12 +604,15 @@ class handler(BaseHTTPRequestHandler):
             self._write_json(500, {"ok": False, "error": "GOOGLE_CLIENT_ID não configurado"})
             return
         redirect_uri = os.getenv("GOOGLE_REDIRECT_URI") or f"{self._api_base()}/api/auth/google/callback"
-        print(f"[DEBUG] GOOGLE_CLIENT_ID env: {client_id}")
-        print(f"[DEBUG] GOOGLE_REDIRECT_URI env: {os.getenv('GOOGLE_REDIRECT_URI')}")
-        print(f"[DEBUG] _api_base(): {self._api_base()}")
-        print(f"[DEBUG] redirect_uri: {redirect_uri}")
-        print(f"[DEBUG] Host header: {self.headers.get('Host')}")
-        print(f"[DEBUG] X-Forwarded-Proto: {self.headers.get('X-Forwarded-Proto')}")
+        log(
+            logging.DEBUG,
+            "auth_start",
+            client_id=client_id,
+            redirect_uri=redirect_uri,
+            api_base=self._api_base(),
+            host=self.headers.get("Host"),
+            forwarded_proto=self.headers.get("X-Forwarded-Proto"),
+        )
         state = secrets.token_urlsafe(16)
         params = {
             "client_id": client_id,
@@ -233,8 +628,13 @@ class handler(BaseHTTPRequestHandler):
         cookie_flags = f"Path=/; HttpOnly; SameSite={samesite}"
         if self._is_secure():
             cookie_flags += "; Secure"
-        auth_url = f"{GOOGLE_AUTH_URL}?{urllib.parse.urlencode(params)}"
-        print(f"[DEBUG] auth_url: {auth_url}")
+        try:
+            authorization_endpoint = oidc.provider.config()["authorization_endpoint"]
+        except Exception as e:
+            self._write_json(502, {"ok": False, "error": f"provedor OAuth indisponível: {e}"})
+            return
+        auth_url = f"{authorization_endpoint}?{urllib.parse.urlencode(params)}"
+        log(logging.DEBUG, "auth_redirect", auth_url=auth_url)
         self._redirect(
             auth_url,
             extra_headers={"Set-Cookie": f"oauth_state={state}; {cookie_flags}"},
@@ -257,9 +657,7 @@ class handler(BaseHTTPRequestHandler):
             return
 
         redirect_uri = os.getenv("GOOGLE_REDIRECT_URI") or f"{self._api_base()}/api/auth/google/callback"
-        print(f"[DEBUG CALLBACK] GOOGLE_CLIENT_ID env: {client_id}")
-        print(f"[DEBUG CALLBACK] GOOGLE_REDIRECT_URI env: {os.getenv('GOOGLE_REDIRECT_URI')}")
-        print(f"[DEBUG CALLBACK] redirect_uri: {redirect_uri}")
+        log(logging.DEBUG, "auth_callback", client_id=client_id, redirect_uri=redirect_uri)
         data = urllib.parse.urlencode({
             "code": code,
             "client_id": client_id,
@@ -267,18 +665,39 @@ class handler(BaseHTTPRequestHandler):
             "redirect_uri": redirect_uri,
             "grant_type": "authorization_code",
         }).encode()
+        start = time.perf_counter()
         try:
-            with urllib.request.urlopen(urllib.request.Request(GOOGLE_TOKEN_URL, data=data)) as resp:
-                token_body = json.loads(resp.read().decode())
-            access_token = token_body.get("access_token")
-            if not access_token:
-                raise RuntimeError("token não retornado")
-            req = urllib.request.Request(GOOGLE_USERINFO_URL, headers={"Authorization": f"Bearer {access_token}"})
-            with urllib.request.urlopen(req) as resp:
-                userinfo = json.loads(resp.read().decode())
+            config = oidc.provider.config()
+            # O code é de uso único: sem retry após erro (idempotent=False)
+            status, raw = oidc.http_client.request(
+                "POST",
+                config["token_endpoint"],
+                body=data,
+                headers={"Content-Type": "application/x-www-form-urlencoded", "Accept": "application/json"},
+                idempotent=False,
+            )
+            token_body = json.loads(raw)
+            if status != 200:
+                raise RuntimeError(token_body.get("error_description") or token_body.get("error") or f"HTTP {status}")
+            userinfo = None
+            if OAUTH_VERIFY_ID_TOKEN and token_body.get("id_token"):
+                # id_token válido já traz sub/email/name/picture: dispensa a ida ao userinfo
+                try:
+                    userinfo = oidc.provider.verify_id_token(token_body["id_token"], client_id)
+                except Exception as e:
+                    log(logging.WARNING, "id_token_rejected", error=str(e))
+            if not userinfo or not userinfo.get("email"):
+                access_token = token_body.get("access_token")
+                if not access_token:
+                    raise RuntimeError("token não retornado")
+                userinfo = oidc.http_client.get_json(
+                    config["userinfo_endpoint"], headers={"Authorization": f"Bearer {access_token}"}
+                )
         except Exception as e:
             self._write_json(500, {"ok": False, "error": f"falha no login: {e}"})
             return
+        finally:
+            self._add_phase("oauth", start)
 
         sub = userinfo.get("sub")
         email = userinfo.get("email")
@@ -307,6 +726,10 @@ class handler(BaseHTTPRequestHandler):
         except Exception as e:
             self._write_json(500, {"ok": False, "error": f"db error: {e}"})
             return
+        # Os outros processos invalidam pelo NOTIFY do trigger; aqui já sai na hora
+        profiles.cache.invalidate(user_row[0])
+        # Usuário novo pode ainda não ter chegado às réplicas
+        self._note_write(user_row[0])
 
         token = self._jwt_sign({"uid": user_row[0], "email": user_row[1], "name": user_row[2]})
         samesite = "None" if self._is_secure() else "Lax"
@@ -322,18 +745,32 @@ class handler(BaseHTTPRequestHandler):
         if not session:
             self._write_json(401, {"ok": False, "error": "não autenticado"})
             return
-        user = None
-        try:
-            with self._connect() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("SELECT id, email, name, picture FROM users WHERE id = %s", (session["uid"],))
-                    user = cur.fetchone()
-        except Exception:
-            user = None
+        user = profiles.cache.get(session["uid"])
+        if user is None:
+            generation = profiles.cache.generation()
+            try:
+                # O que vai para o cache vem do primário: uma réplica atrasada devolveria
+                # o perfil de antes de uma invalidação já recebida e o recolocaria no cache
+                with self._connect() as conn:
+                    with conn.cursor() as cur:
+                        cur.execute("SELECT id, email, name, picture FROM users WHERE id = %s", (session["uid"],))
+                        user = cur.fetchone()
+            except Exception:
+                user = None
+            if user:
+                profiles.cache.put(session["uid"], tuple(user), generation)
         if not user:
             self._write_json(401, {"ok": False, "error": "não autenticado"})
             return
-        self._write_json(200, {"ok": True, "user": {"id": user[0], "email": user[1], "name": user[2], "picture": user[3]}})
+        digest = hashlib.sha256(repr(tuple(user)).encode()).hexdigest()[:32]
+        etag = f'"me-{digest}"'
+        if self._etag_matches(etag):
+            return self._write_not_modified(etag)
+        self._write_json(
+            200,
+            {"ok": True, "user": {"id": user[0], "email": user[1], "name": user[2], "picture": user[3]}},
+            headers={"ETag": etag, "Cache-Control": "private, no-cache"},
+        )
 
     def _logout(self):
         samesite = "None" if self._is_secure() else "Lax"
@@ -343,21 +780,829 @@ class handler(BaseHTTPRequestHandler):
         self._write_json(200, {"ok": True}, headers={"Set-Cookie": f"session=; {cookie_flags}"})
 
     # -------- Rotinas --------
+    def _routine_item(self, row) -> dict:
+        return {"id": row[0], "title": row[1], "status": row[2], "created_at": row[3].isoformat()}
+
+    def _write_routine(self, cur, uid: int, rid: int, sql: str, params: tuple):
+        """Escrita numa rotina existente; uma arquivada (a lista e o sync também as
+        mostram) volta antes para a tabela ativa e a escrita é repetida"""
+        cur.execute(sql, params)
+        row = cur.fetchone()
+        if row is None and unarchive_routine(cur, uid, rid):
+            cur.execute(sql, params)
+            row = cur.fetchone()
+        return row
+
+    def _archived_rows(self, cur, user, start: date, end: date, tz: str) -> list[tuple]:
+        """Rotinas arquivadas do intervalo, no mesmo formato das linhas de routines"""
+        cur.execute(
+            f"""
+            SELECT id, title, 'feita', created_at, recurrence_id, occurrence_date FROM routines_archive
+            WHERE user_id = %s AND {DAY_RANGE_SQL}
+            """,
+            (user["uid"], start, tz, end, tz),
+        )
+        return cur.fetchall()
+
     def _list_routines(self, user):
+        query = self._parse_query()
+        # Sem limit/cursor mantém o formato antigo (lista completa)
+        paginated = "limit" in query or "cursor" in query
+        limit = None
+        after = None
+        day = None
+        if query.get("date"):
+            try:
+                day = date.fromisoformat(query["date"])
+                tz = self._parse_tz(query)
+            except Exception:
+                self._write_json(400, {"ok": False, "error": "date (YYYY-MM-DD) e tz válidos são obrigatórios"})
+                return
+        if paginated:
+            try:
+                limit = min(max(int(query.get("limit") or ROUTINES_PAGE_DEFAULT), 1), ROUTINES_PAGE_MAX)
+            except ValueError:
+                self._write_json(400, {"ok": False, "error": "limit inválido"})
+                return
+            if query.get("cursor"):
+                try:
+                    after = self._decode_cursor(query["cursor"])
+                except Exception:
+                    self._write_json(400, {"ok": False, "error": "cursor inválido"})
+                    return
+        try:
+            # ?date= materializa as recorrências do dia (escreve): fica no primário
+            with self._connect(read=day is None) as conn:
+                with conn.cursor() as cur:
+                    self._ensure_schema(cur)
+                    if day:
+                        # Abrir um dia materializa as instâncias recorrentes dele
+                        self._materialize_day(cur, user, day)
+                        conn.commit()
+                    # A revisão muda a cada escrita do usuário; mesma revisão + mesma query = mesmo corpo
+                    cur.execute("SELECT revision FROM users WHERE id = %s", (user["uid"],))
+                    rev = cur.fetchone()
+                    variant = hashlib.sha256(urllib.parse.urlparse(self.path).query.encode()).hexdigest()[:12]
+                    etag = f'"r{user["uid"]}-{rev[0] if rev else 0}-{variant}"'
+                    if self._etag_matches(etag):
+                        return self._write_not_modified(etag)
+                    where = ""
+                    filters = []
+                    if day:
+                        where += " AND " + DAY_RANGE_SQL
+                        filters.extend([day, tz, day, tz])
+                    if after:
+                        # Keyset: continua exatamente após o último item da página anterior
+                        # (o limite simples em created_at deixa o planner podar partições mais novas)
+                        where += " AND created_at <= %s AND (created_at, id) < (%s, %s)"
+                        filters.extend([after[0], *after])
+                    # Arquivadas (sempre 'feita') entram na mesma ordenação e no mesmo limite
+                    sql = (
+                        "SELECT id, title, status, created_at FROM routines WHERE user_id = %s AND deleted_at IS NULL"
+                        + where
+                        + " UNION ALL SELECT id, title, 'feita', created_at FROM routines_archive WHERE user_id = %s"
+                        + where
+                        + " ORDER BY created_at DESC, id DESC"
+                    )
+                    params = [user["uid"], *filters, user["uid"], *filters]
+                    if limit:
+                        sql += " LIMIT %s"
+                        params.append(limit + 1)
+                    cur.execute(sql, params)
+                    rows = cur.fetchall()
+            next_cursor = None
+            if limit and len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = self._encode_cursor(rows[-1][3], rows[-1][0])
+            if query.get("format") == "columns":
+                # Colunar: cada chave aparece uma vez em vez de uma vez por item
+                body = {
+                    "ok": True,
+                    "format": "columns",
+                    "columns": {
+                        "id": [r[0] for r in rows],
+                        "title": [r[1] for r in rows],
+                        "status": [r[2] for r in rows],
+                        "created_at": [r[3].isoformat() for r in rows],
+                    },
+                }
+            else:
+                body = {"ok": True, "items": [self._routine_item(r) for r in rows]}
+            if paginated:
+                body["next_cursor"] = next_cursor
+            self._write_json(200, body, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+        except Exception as e:
+            self._write_json(500, {"ok": False, "error": str(e)})
+
+    def _batch_op_sql(self, user, op: dict):
+        """Valida uma operação do batch e devolve (sql, params)"""
+        kind = op.get("op")
+        if kind == "create":
+            title = (op.get("title") or "").strip()
+            if not title:
+                raise ValueError("title é obrigatório")
+            return (
+                "INSERT INTO routines(user_id, title) VALUES(%s, %s) RETURNING id, title, status, created_at",
+                (user["uid"], title),
+            )
+        try:
+            rid = int(op.get("id"))
+        except Exception:
+            rid = 0
+        if rid <= 0:
+            raise ValueError("id é obrigatório")
+        if kind == "update":
+            title = (op.get("title") or "").strip()
+            if not title:
+                raise ValueError("id e title são obrigatórios")
+            return (
+                ROUTINE_UPDATE_SQL,
+                (title, rid, user["uid"]),
+            )
+        if kind == "status":
+            status = op.get("status")
+            if status not in ("pendente", "feita"):
+                raise ValueError("id e status válido são obrigatórios")
+            return (ROUTINE_STATUS_SQL, (status, rid, user["uid"]))
+        if kind == "delete":
+            return (ROUTINE_DELETE_SQL, (rid, user["uid"]))
+        raise ValueError("op deve ser create, update, status ou delete")
+
+    def _batch_routines(self, user, payload):
+        ops = payload.get("ops")
+        if not isinstance(ops, list) or not ops:
+            self._write_json(400, {"ok": False, "error": "ops é obrigatório"})
+            return
+        if len(ops) > ROUTINES_BATCH_MAX:
+            self._write_json(400, {"ok": False, "error": f"máximo de {ROUTINES_BATCH_MAX} operações por batch"})
+            return
+        # Valida tudo antes de tocar no banco: ou o batch inteiro roda, ou nada
+        statements = []
+        for i, op in enumerate(ops):
+            try:
+                if not isinstance(op, dict):
+                    raise ValueError("operação inválida")
+                statements.append(self._batch_op_sql(user, op))
+            except ValueError as e:
+                self._write_json(400, {"ok": False, "error": f"ops[{i}]: {e}"})
+                return
+        try:
+            with self._connect() as conn:
+                with conn.cursor() as cur:
+                    self._ensure_schema(cur)
+                with conn.transaction(), conn.cursor() as cur:
+                    progress = lock_progress(cur, user["uid"])
+                    # Pipeline: todas as operações vão ao servidor numa única ida e volta. Um cursor
+                    # por operação, fechados juntos pelo ExitStack: ler cada um dentro do próprio
+                    # `with` forçaria um sync do pipeline (uma ida e volta) por operação
+                    with contextlib.ExitStack() as stack:
+                        cursors = []
+                        with conn.pipeline():
+                            for sql, params in statements:
+                                op_cur = stack.enter_context(conn.cursor())
+                                op_cur.execute(sql, params)
+                                cursors.append(op_cur)
+                        rows = [c.fetchone() for c in cursors]
+                    # Operações sobre rotinas arquivadas não acharam a linha: ela volta para a
+                    # tabela ativa e elas rodam de novo, na ordem do batch
+                    restored = set()
+                    for i, (op, (sql, params)) in enumerate(zip(ops, statements)):
+                        if rows[i] is not None or op["op"] == "create":
+                            continue
+                        rid = int(op["id"])
+                        if rid in restored or unarchive_routine(cur, user["uid"], rid):
+                            restored.add(rid)
+                            cur.execute(sql, params)
+                            rows[i] = cur.fetchone()
+                    deltas = ProgressDeltas()
+                    for op, row in zip(ops, rows):
+                        if not row:
+                            continue
+                        if op["op"] == "create":
+                            deltas.created(row[3], row[2])
+                        elif op["op"] == "status":
+                            deltas.status_changed(row[3], row[4], row[2], row[5])
+                        elif op["op"] == "delete":
+                            deltas.deleted(row[2], row[1], row[3])
+                    _, unlocked = apply_progress(cur, user["uid"], progress, deltas)
+            results = []
+            for op, row in zip(ops, rows):
+                if not row:
+                    results.append({"ok": False, "error": "rotina não encontrada"})
+                elif op["op"] == "delete":
+                    results.append({"ok": True, "deleted_id": row[0]})
+                else:
+                    results.append({"ok": True, "item": self._routine_item(row)})
+            self._write_json(200, {"ok": True, "results": results, "unlocked": unlocked})
+        except Exception as e:
+            self._write_json(500, {"ok": False, "error": str(e)})
+
+    def _routine_changes(self, user):
+        """Delta sync: o que mudou desde o token `since` (sem token = sync completo).
+
+        O token é (change_rev, id) da última linha entregue; `full` marca um sync
+        completo em andamento, que ignora tombstones e não pode sofrer reset.
+        """
+        query = self._parse_query()
+        since_rev, since_id, full = -1, 0, True
+        if query.get("since"):
+            try:
+                since_rev, since_id, full = self._decode_sync_token(query["since"])
+            except Exception:
+                self._write_json(400, {"ok": False, "error": "since inválido"})
+                return
+        try:
+            limit = min(max(int(query.get("limit") or SYNC_PAGE_MAX), 1), SYNC_PAGE_MAX)
+        except ValueError:
+            self._write_json(400, {"ok": False, "error": "limit inválido"})
+            return
+        try:
+            with self._connect(read=True) as conn:
+                with conn.cursor() as cur:
+                    self._ensure_schema(cur)
+                    cur.execute("SELECT revision, compacted_rev FROM users WHERE id = %s", (user["uid"],))
+                    revision, compacted_rev = cur.fetchone() or (0, 0)
+                    reset = False
+                    if not full and since_rev < compacted_rev:
+                        # Tombstones posteriores ao token já foram compactados: recomeça do zero
+                        since_rev, since_id, full, reset = -1, 0, True, True
+                    sql = """
+                        SELECT id, title, status, created_at, updated_at, deleted_at, change_rev FROM routines
+                        WHERE user_id = %s AND (change_rev, id) > (%s, %s)
+                    """
+                    if full:
+                        sql += " AND deleted_at IS NULL"
+                    # Arquivadas mantêm a change_rev que tinham: quem ainda não as recebeu recebe daqui
+                    sql += """
+                        UNION ALL
+                        SELECT id, title, 'feita', created_at, COALESCE(updated_at, archived_at), NULL, change_rev
+                        FROM routines_archive
+                        WHERE user_id = %s AND (change_rev, id) > (%s, %s)
+                        ORDER BY change_rev, id LIMIT %s
+                    """
+                    cur.execute(sql, (user["uid"], since_rev, since_id, user["uid"], since_rev, since_id, limit + 1))
+                    rows = cur.fetchall()
+            has_more = len(rows) > limit
+            if has_more:
+                rows = rows[:limit]
+                next_token = self._encode_sync_token(rows[-1][6], rows[-1][0], full)
+            else:
+                # Revisão lida no mesmo snapshot: tudo até ela já foi entregue
+                next_token = self._encode_sync_token(max(revision, since_rev), MAX_ROUTINE_ID, False)
+            items = []
+            deleted = []
+            for r in rows:
+                if r[5] is not None:
+                    deleted.append(r[0])
+                    continue
+                item = self._routine_item(r)
+                item["updated_at"] = r[4].isoformat()
+                items.append(item)
+            self._write_json(200, {
+                "ok": True,
+                "items": items,
+                "deleted": deleted,
+                "next": next_token,
+                "has_more": has_more,
+                "reset": reset,
+            }, headers={"Cache-Control": "private, no-store"})
+        except Exception as e:
+            self._write_json(500, {"ok": False, "error": str(e)})
+
+    # -------- Stream SSE --------
+    def _sse_frame(self, event: dict) -> bytes:
+        data = dumps({"type": event["type"], "routine_id": event["routine_id"], "item": event["item"]})
+        return b"id: %d\nevent: %s\ndata: %s\n\n" % (event["id"], event["type"].encode(), data)
+
+    def _write_sse(self, event: dict):
+        self.wfile.write(self._sse_frame(event))
+        self.wfile.flush()
+
+    def _start_sse(self, retry_ms: int):
+        self.send_response(200)
+        self._add_cors_headers()
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("X-Accel-Buffering", "no")
+        # Sem Content-Length: o corpo termina quando a conexão fecha
+        self.send_header("Connection", "close")
+        self.close_connection = True
+        self.end_headers()
+        self.wfile.write(b"retry: %d\n\n" % retry_ms)
+        self.wfile.flush()
+
+    def _sse_limit(self) -> int:
+        if getattr(self.server, "detach_supported", False):
+            # No event loop um stream custa um socket e uma fila, não um worker
+            return SSE_MAX_CLIENTS or SSE_ASYNC_CLIENTS
+        # Streams prendem workers do executor: o limite fica abaixo do total para o resto da API
+        workers = getattr(self.server, "max_workers", 1)
+        return min(SSE_MAX_CLIENTS, workers - 1) if SSE_MAX_CLIENTS else workers // 2
+
+    def _replay_events(self, uid: int, last_id: int) -> int:
+        """Envia os eventos depois de `last_id` em páginas de SSE_REPLAY_LIMIT até alcançar
+        o presente e devolve o último id enviado"""
+        while True:
+            with self._connect() as conn:
+                with conn.cursor() as cur:
+                    self._ensure_schema(cur)
+                    page = load_events(cur, uid, last_id)
+            for event in page:
+                self._write_sse(event)
+                last_id = event["id"]
+            if len(page) < SSE_REPLAY_LIMIT:
+                return last_id
+
+    def _resume_events(self, uid: int, last_id: int) -> int:
+        """Retoma a partir do Last-Event-ID. Se a retenção já apagou parte do que veio
+        depois dele, manda um evento `reset` (o cliente refaz o delta sync) em vez de
+        um replay com buraco"""
+        with self._connect() as conn:
+            with conn.cursor() as cur:
+                self._ensure_schema(cur)
+                head = pruned_after(cur, last_id)
+        if head is None:
+            return self._replay_events(uid, last_id)
+        self._write_sse({"id": head, "type": "reset", "routine_id": None, "item": None})
+        return head
+
+    def _stream_routines(self, user):
+        limit = self._sse_limit()
+        if limit <= 0:
+            self._write_json(503, {"ok": False, "error": "stream indisponível neste modo"})
+            return
+        if changes.hub.client_count() >= limit:
+            # Cheio: o EventSource reconecta sozinho depois do `retry`
+            self._start_sse(SSE_BUSY_RETRY_MS)
+            return
+        try:
+            last_id = int(self.headers.get("Last-Event-ID") or self._parse_query().get("last_event_id") or 0)
+        except ValueError:
+            last_id = 0
+        # Inscreve antes do replay para não perder eventos entre os dois
+        q = changes.hub.subscribe(user["uid"])
+        try:
+            self._start_sse(3000)
+            if last_id:
+                last_id = self._resume_events(user["uid"], last_id)
+            if getattr(self.server, "detach_supported", False):
+                # A espera segue no event loop; a inscrição passa a ser dele
+                self.detached = functools.partial(self._pump_sse_async, user["uid"], q, last_id)
+                q = None
+                return
+            self._pump_sse(user["uid"], q, last_id)
+        except (BrokenPipeError, ConnectionError, TimeoutError):
+            pass
+        except Exception as e:
+            log(logging.WARNING, "stream_error", uid=user["uid"], error=str(e))
+        finally:
+            if q is not None:
+                changes.hub.unsubscribe(user["uid"], q)
+
+    def _pump_sse(self, uid: int, q, last_id: int):
+        deadline = time.monotonic() + SSE_MAX_SECONDS
+        # Ao drenar o stream fecha e o cliente reconecta (em outro worker) com Last-Event-ID
+        while time.monotonic() < deadline and not draining.is_set():
+            if q.overflowed and q.empty():
+                # A fila transbordou e descartou os eventos mais novos: depois de esvaziá-la,
+                # busca no banco o que falta a partir do último enviado
+                q.overflowed = False
+                last_id = self._replay_events(uid, last_id)
+            try:
+                event = q.get(timeout=SSE_HEARTBEAT_SECONDS)
+            except queue.Empty:
+                # Heartbeat: mantém proxies acordados e detecta cliente desconectado
+                self.wfile.write(b": ping\n\n")
+                self.wfile.flush()
+                continue
+            if event["id"] <= last_id:
+                continue
+            self._write_sse(event)
+            last_id = event["id"]
+
+    async def _pump_sse_async(self, uid: int, q, last_id: int, writer):
+        """O laço de _pump_sse no event loop (modo async): a thread do hub acorda o stream"""
+        loop = asyncio.get_running_loop()
+        wake = asyncio.Event()
+        q.notify = lambda: loop.call_soon_threadsafe(wake.set)
+        try:
+            deadline = time.monotonic() + SSE_MAX_SECONDS
+            while time.monotonic() < deadline and not draining.is_set():
+                if q.overflowed and q.empty():
+                    q.overflowed = False
+                    # O replay consulta o banco: roda fora do event loop
+                    last_id = await loop.run_in_executor(None, self._replay_events, uid, last_id)
+                wake.clear()
+                try:
+                    event = q.get_nowait()
+                except queue.Empty:
+                    try:
+                        await asyncio.wait_for(wake.wait(), SSE_HEARTBEAT_SECONDS)
+                    except asyncio.TimeoutError:
+                        writer.write(b": ping\n\n")
+                        await writer.drain()
+                    continue
+                if event["id"] <= last_id:
+                    continue
+                writer.write(self._sse_frame(event))
+                await writer.drain()
+                last_id = event["id"]
+        except ConnectionError:
+            pass
+        except Exception as e:
+            log(logging.WARNING, "stream_error", uid=uid, error=str(e))
+        finally:
+            changes.hub.unsubscribe(uid, q)
+
+    # -------- Import/export --------
+    def _start_stream(self, content_type: str, headers: dict | None = None) -> ChunkedWriter:
+        """200 com corpo de tamanho desconhecido: chunked em HTTP/1.1, senão até fechar a conexão"""
+        chunked = self.request_version == "HTTP/1.1" and self.protocol_version == "HTTP/1.1"
+        self.send_response(200)
+        self._add_cors_headers()
+        self.send_header("Content-Type", content_type)
+        self.send_header("Cache-Control", "no-store")
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        return ChunkedWriter(self.wfile, chunked)
+
+    def _export_routines(self, user):
+        fmt = self._parse_query().get("format") or "ndjson"
+        if fmt not in EXPORT_FORMATS:
+            self._write_json(400, {"ok": False, "error": "format deve ser ndjson ou csv"})
+            return
+        out = None
+        try:
+            with self._connect(read=True) as conn:
+                with conn.cursor() as cur:
+                    self._ensure_schema(cur)
+                with contextlib.closing(export_routines(conn, user["uid"], fmt)) as blocks:
+                    # Primeiro bloco antes dos headers: erro de SQL ainda vira 500
+                    first = next(blocks, b"")
+                    out = self._start_stream(
+                        EXPORT_FORMATS[fmt], {"Content-Disposition": f'attachment; filename="routines.{fmt}"'}
+                    )
+                    out.write(first)
+                    for block in blocks:
+                        out.write(block)
+                    out.close()
+        except (BrokenPipeError, ConnectionError, TimeoutError):
+            self.close_connection = True
+        except Exception as e:
+            if out is None:
+                self._write_json(500, {"ok": False, "error": str(e)})
+                return
+            # Headers já enviados: só resta cortar a conexão (o cliente vê o corpo incompleto)
+            log(logging.WARNING, "export_error", uid=user["uid"], error=str(e))
+            self.close_connection = True
+
+    def _import_routines(self, user):
+        query = self._parse_query()
+        content_type = self.headers.get("Content-Type") or ""
+        fmt = query.get("format") or ("csv" if "csv" in content_type else "ndjson")
+        if fmt not in EXPORT_FORMATS:
+            self._write_json(400, {"ok": False, "error": "format deve ser ndjson ou csv"})
+            return
+        # Qualquer erro pode deixar corpo não lido para trás: a conexão não é reaproveitada
+        close = {"Connection": "close"}
+        try:
+            blocks = self._iter_body(IMPORT_MAX_BYTES)
+            # Lê e valida o corpo inteiro antes de pegar uma conexão do pool
+            with stage_import(parse_import(blocks, fmt), skip_invalid=query.get("on_error") == "skip") as staged:
+                with self._connect() as conn:
+                    with conn.cursor() as cur:
+                        self._ensure_schema(cur)
+                    result = import_routines(conn, user["uid"], staged)
+        except ImportRejected as e:
+            self._write_json(
+                422, {"ok": False, "error": "registros inválidos; nada foi importado", "errors": e.errors}, headers=close
+            )
+            return
+        except BodyTooLarge:
+            self._reject_body(IMPORT_MAX_BYTES)
+            return
+        except BodyError as e:
+            self._write_json(400, {"ok": False, "error": str(e)}, headers=close)
+            return
+        except UnicodeDecodeError:
+            self._write_json(400, {"ok": False, "error": "corpo deve ser UTF-8"}, headers=close)
+            return
+        except csv.Error as e:
+            self._write_json(400, {"ok": False, "error": f"CSV inválido: {e}"}, headers=close)
+            return
+        except Exception as e:
+            self._write_json(500, {"ok": False, "error": str(e)}, headers=close)
+            return
+        self._write_json(200, {"ok": True, **result})
+
+    # -------- Recorrências --------
+    def _recurrence_item(self, rule: dict) -> dict:
+        return {
+            "id": rule["id"],
+            "title": rule["title"],
+            "kind": rule["kind"],
+            "interval_days": rule["interval_days"],
+            "weekdays": list(rule["weekdays"]),
+            "start_date": rule["start_date"].isoformat(),
+            "end_date": rule["end_date"].isoformat() if rule["end_date"] else None,
+            "tz": rule["tz"],
+        }
+
+    def _materialize_day(self, cur, user, day: date):
+        pending = pending_occurrences(cur, user["uid"], day, day)
+        if not pending:
+            return
+        progress = lock_progress(cur, user["uid"])
+        deltas = ProgressDeltas()
+        for rule, occ_day in pending:
+            row = materialize_occurrence(cur, user["uid"], rule, occ_day)
+            if row:
+                deltas.created(row[3], row[2])
+        apply_progress(cur, user["uid"], progress, deltas)
+
+    def _materialize_occurrence_id(self, cur, user, deltas: ProgressDeltas, rec_id: int, day: date) -> int:
+        """Id da instância da ocorrência (criando-a se preciso); 0 se a regra não gera esse dia"""
+        cur.execute(
+            f"SELECT {', '.join(RECURRENCE_FIELDS)} FROM recurrences WHERE id = %s AND user_id = %s",
+            (rec_id, user["uid"]),
+        )
+        found = cur.fetchone()
+        if not found:
+            return 0
+        rule = dict(zip(RECURRENCE_FIELDS, found))
+        if not recurrence_occurs(rule, day):
+            return 0
+        row = materialize_occurrence(cur, user["uid"], rule, day)
+        if row:
+            deltas.created(row[3], row[2])
+            return row[0]
+        cur.execute(
+            "SELECT id FROM routines WHERE recurrence_id = %s AND occurrence_date = %s AND user_id = %s",
+            (rec_id, day, user["uid"]),
+        )
+        existing = cur.fetchone()
+        return existing[0] if existing else 0
+
+    def _create_recurrence(self, user, payload):
+        title = (payload.get("title") or "").strip()
+        kind = payload.get("kind")
+        try:
+            interval_days = int(payload.get("interval_days") or 1)
+            weekdays = sorted({int(d) for d in payload.get("weekdays") or []})
+            start_date = date.fromisoformat(payload["start_date"]) if payload.get("start_date") else None
+            end_date = date.fromisoformat(payload["end_date"]) if payload.get("end_date") else None
+            tz = self._parse_tz(payload)
+        except Exception:
+            self._write_json(400, {"ok": False, "error": "recorrência inválida"})
+            return
+        if not title or kind not in RECURRENCE_KINDS:
+            self._write_json(400, {"ok": False, "error": "title e kind válido são obrigatórios"})
+            return
+        if interval_days < 1 or any(d < 0 or d > 6 for d in weekdays) or (kind == "weekly" and not weekdays):
+            self._write_json(400, {"ok": False, "error": "interval_days >= 1 e weekdays entre 0 e 6"})
+            return
+        start_date = start_date or datetime.now(ZoneInfo(tz)).date()
+        if end_date and end_date < start_date:
+            self._write_json(400, {"ok": False, "error": "end_date antes de start_date"})
+            return
         try:
             with self._connect() as conn:
                 with conn.cursor() as cur:
                     self._ensure_schema(cur)
                     cur.execute(
-                        "SELECT id, title, status, created_at FROM routines WHERE user_id = %s ORDER BY created_at DESC",
+                        f"""
+                        INSERT INTO recurrences(user_id, title, kind, interval_days, weekdays, start_date, end_date, tz)
+                        VALUES(%s, %s, %s, %s, %s, %s, %s, %s)
+                        RETURNING {', '.join(RECURRENCE_FIELDS)}
+                        """,
+                        (user["uid"], title, kind, interval_days, weekdays, start_date, end_date, tz),
+                    )
+                    rule = dict(zip(RECURRENCE_FIELDS, cur.fetchone()))
+                    conn.commit()
+            self._write_json(201, {"ok": True, "item": self._recurrence_item(rule)})
+        except Exception as e:
+            self._write_json(500, {"ok": False, "error": str(e)})
+
+    def _list_recurrences(self, user):
+        try:
+            with self._connect(read=True) as conn:
+                with conn.cursor() as cur:
+                    self._ensure_schema(cur)
+                    cur.execute(
+                        f"SELECT {', '.join(RECURRENCE_FIELDS)} FROM recurrences WHERE user_id = %s ORDER BY id",
                         (user["uid"],),
                     )
+                    rules = [dict(zip(RECURRENCE_FIELDS, r)) for r in cur.fetchall()]
+            self._write_json(200, {"ok": True, "items": [self._recurrence_item(r) for r in rules]})
+        except Exception as e:
+            self._write_json(500, {"ok": False, "error": str(e)})
+
+    def _delete_recurrence(self, user, payload):
+        try:
+            rec_id = int(payload.get("id"))
+        except Exception:
+            rec_id = 0
+        if rec_id <= 0:
+            self._write_json(400, {"ok": False, "error": "id é obrigatório"})
+            return
+        try:
+            with self._connect() as conn:
+                with conn.cursor() as cur:
+                    self._ensure_schema(cur)
+                    # Instâncias já materializadas continuam como rotinas avulsas (ON DELETE SET NULL)
+                    cur.execute("DELETE FROM recurrences WHERE id = %s AND user_id = %s RETURNING id", (rec_id, user["uid"]))
+                    row = cur.fetchone()
+                    conn.commit()
+            if not row:
+                self._write_json(404, {"ok": False, "error": "recorrência não encontrada"})
+                return
+            self._write_json(200, {"ok": True, "deleted_id": row[0]})
+        except Exception as e:
+            self._write_json(500, {"ok": False, "error": str(e)})
+
+    def _routines_range(self, user):
+        """Rotinas de um intervalo com as recorrências expandidas, sem gravar nada"""
+        query = self._parse_query()
+        try:
+            start = date.fromisoformat(query.get("from", ""))
+            end = date.fromisoformat(query.get("to", ""))
+            tz = self._parse_tz(query)
+        except Exception:
+            self._write_json(400, {"ok": False, "error": "from, to (YYYY-MM-DD) e tz válidos são obrigatórios"})
+            return
+        if end < start or (end - start).days >= STATS_MAX_DAYS:
+            self._write_json(400, {"ok": False, "error": "intervalo inválido"})
+            return
+        try:
+            with self._connect(read=True) as conn:
+                with conn.cursor() as cur:
+                    self._ensure_schema(cur)
+                    cur.execute(
+                        f"""
+                        SELECT id, title, status, created_at, recurrence_id, occurrence_date FROM routines
+                        WHERE user_id = %s AND deleted_at IS NULL AND {DAY_RANGE_SQL}
+                        ORDER BY created_at, id
+                        """,
+                        (user["uid"], start, tz, end, tz),
+                    )
                     rows = cur.fetchall()
-            items = [{"id": r[0], "title": r[1], "status": r[2], "created_at": r[3].isoformat()} for r in rows]
+                    archived = self._archived_rows(cur, user, start, end, tz)
+                    virtual = pending_occurrences(cur, user["uid"], start, end)
+            items = []
+            for r in rows + archived:
+                item = self._routine_item(r)
+                item.update({
+                    "recurrence_id": r[4],
+                    "occurrence_date": r[5].isoformat() if r[5] else None,
+                    "virtual": False,
+                })
+                items.append(item)
+            for rule, day in virtual:
+                start_of_day = datetime.combine(day, datetime.min.time(), ZoneInfo(rule["tz"]))
+                items.append({
+                    "id": None,
+                    "title": rule["title"],
+                    "status": "pendente",
+                    "created_at": start_of_day.isoformat(),
+                    "recurrence_id": rule["id"],
+                    "occurrence_date": day.isoformat(),
+                    "virtual": True,
+                })
             self._write_json(200, {"ok": True, "items": items})
         except Exception as e:
             self._write_json(500, {"ok": False, "error": str(e)})
 
+    # -------- Progresso --------
+    def _get_progress(self, user):
+        try:
+            with self._connect() as conn:
+                with conn.cursor() as cur:
+                    self._ensure_schema(cur)
+                    cur.execute(f"SELECT {', '.join(PROGRESS_FIELDS)} FROM user_progress WHERE user_id = %s", (user["uid"],))
+                    row = cur.fetchone()
+                    if row:
+                        progress = dict(zip(PROGRESS_FIELDS, row))
+                    else:
+                        progress = lock_progress(cur, user["uid"])
+                        conn.commit()
+                    today = progress_today()
+                    cur.execute(
+                        "SELECT created, done FROM user_daily_progress WHERE user_id = %s AND day = %s",
+                        (user["uid"], today),
+                    )
+                    today_row = cur.fetchone() or (0, 0)
+            last = progress["last_done_day"]
+            # Streak só continua valendo se o último dia feito foi hoje ou ontem
+            alive = last is not None and last >= today - timedelta(days=1)
+            self._write_json(200, {
+                "ok": True,
+                "progress": {
+                    "xp": progress["xp"],
+                    "level": progress["level"],
+                    "next_level_xp": LEVEL_XP * progress["level"] ** 2,
+                    "total_created": progress["total_created"],
+                    "total_done": progress["total_done"],
+                    "current_streak": progress["current_streak"] if alive else 0,
+                    "best_streak": progress["best_streak"],
+                    "last_done_day": last.isoformat() if last else None,
+                    "today": {"created": today_row[0], "done": today_row[1]},
+                },
+            })
+        except Exception as e:
+            self._write_json(500, {"ok": False, "error": str(e)})
+
+    def _get_achievements(self, user):
+        try:
+            with self._connect() as conn:
+                with conn.cursor() as cur:
+                    self._ensure_schema(cur)
+                    cur.execute(
+                        f"SELECT {', '.join(PROGRESS_FIELDS)} FROM user_progress WHERE user_id = %s", (user["uid"],)
+                    )
+                    row = cur.fetchone()
+                    progress = dict(zip(PROGRESS_FIELDS, row)) if row else None
+                    if progress is None or progress["achievements_version"] < ACHIEVEMENTS_VERSION:
+                        # Usuário novo ou catálogo mudou: avaliação completa, uma única vez
+                        progress = lock_progress(cur, user["uid"])
+                        evaluate_achievements(cur, user["uid"], progress, progress, [])
+                        conn.commit()
+                    cur.execute(
+                        "SELECT achievement_id, unlocked_at FROM user_achievements WHERE user_id = %s",
+                        (user["uid"],),
+                    )
+                    unlocked = {r[0]: r[1] for r in cur.fetchall()}
+            items = []
+            for rule in ACHIEVEMENTS:
+                when = unlocked.get(rule["id"])
+                value = 1 if rule["counter"] == "perfect_day" and when else progress.get(rule["counter"], 0)
+                items.append({
+                    "id": rule["id"],
+                    "title": rule["title"],
+                    "description": rule["description"],
+                    "threshold": rule["threshold"],
+                    "value": min(value, rule["threshold"]),
+                    "unlocked": when is not None,
+                    "unlocked_at": when.isoformat() if when else None,
+                })
+            self._write_json(200, {"ok": True, "items": items})
+        except Exception as e:
+            self._write_json(500, {"ok": False, "error": str(e)})
+
+    def _daily_stats(self, user):
+        query = self._parse_query()
+        try:
+            start = date.fromisoformat(query.get("from", ""))
+            end = date.fromisoformat(query.get("to", ""))
+            tz = self._parse_tz(query)
+        except Exception:
+            self._write_json(400, {"ok": False, "error": "from, to (YYYY-MM-DD) e tz válidos são obrigatórios"})
+            return
+        if end < start or (end - start).days >= STATS_MAX_DAYS:
+            self._write_json(400, {"ok": False, "error": "intervalo inválido"})
+            return
+        try:
+            with self._connect(read=True) as conn:
+                with conn.cursor() as cur:
+                    self._ensure_schema(cur)
+                    cur.execute(
+                        f"""
+                        SELECT (created_at AT TIME ZONE %s)::date AS day,
+                               COUNT(*) FILTER (WHERE status = 'pendente'),
+                               COUNT(*) FILTER (WHERE status = 'feita')
+                        FROM routines
+                        WHERE user_id = %s AND deleted_at IS NULL AND {DAY_RANGE_SQL}
+                        GROUP BY day
+                        ORDER BY day
+                        """,
+                        (tz, user["uid"], start, tz, end, tz),
+                    )
+                    rows = cur.fetchall()
+                    cur.execute(
+                        f"""
+                        SELECT (created_at AT TIME ZONE %s)::date AS day, COUNT(*) FROM routines_archive
+                        WHERE user_id = %s AND {DAY_RANGE_SQL}
+                        GROUP BY day
+                        """,
+                        (tz, user["uid"], start, tz, end, tz),
+                    )
+                    archived = cur.fetchall()
+                    virtual = pending_occurrences(cur, user["uid"], start, end)
+            days = {r[0].isoformat(): {"pendente": r[1], "feita": r[2]} for r in rows}
+            for day, done in archived:
+                days.setdefault(day.isoformat(), {"pendente": 0, "feita": 0})["feita"] += done
+            # Ocorrências ainda não materializadas contam como pendentes
+            for _, day in virtual:
+                days.setdefault(day.isoformat(), {"pendente": 0, "feita": 0})["pendente"] += 1
+            self._write_json(200, {"ok": True, "from": start.isoformat(), "to": end.isoformat(), "tz": tz, "days": days})
+        except Exception as e:
+            self._write_json(500, {"ok": False, "error": str(e)})
+
     def _create_routine(self, user, payload):
         title = (payload.get("title") or "").strip()
         if not title:
@@ -367,15 +1612,20 @@ class handler(BaseHTTPRequestHandler):
             with self._connect() as conn:
                 with conn.cursor() as cur:
                     self._ensure_schema(cur)
+                    progress = lock_progress(cur, user["uid"])
                     cur.execute(
                         "INSERT INTO routines(user_id, title) VALUES(%s, %s) RETURNING id, status, created_at",
                         (user["uid"], title),
                     )
                     inserted = cur.fetchone()
+                    deltas = ProgressDeltas()
+                    deltas.created(inserted[2], inserted[1])
+                    _, unlocked = apply_progress(cur, user["uid"], progress, deltas)
                     conn.commit()
             self._write_json(201, {
                 "ok": True,
                 "item": {"id": inserted[0], "title": title, "status": inserted[1], "created_at": inserted[2].isoformat()},
+                "unlocked": unlocked,
             })
         except Exception as e:
             self._write_json(500, {"ok": False, "error": str(e)})
@@ -393,16 +1643,12 @@ class handler(BaseHTTPRequestHandler):
             with self._connect() as conn:
                 with conn.cursor() as cur:
                     self._ensure_schema(cur)
-                    cur.execute(
-                        "UPDATE routines SET title = %s WHERE id = %s AND user_id = %s RETURNING id, title, status, created_at",
-                        (title, rid, user["uid"]),
-                    )
-                    row = cur.fetchone()
+                    row = self._write_routine(cur, user["uid"], rid, ROUTINE_UPDATE_SQL, (title, rid, user["uid"]))
                     conn.commit()
             if not row:
                 self._write_json(404, {"ok": False, "error": "rotina não encontrada"})
                 return
-            self._write_json(200, {"ok": True, "item": {"id": row[0], "title": row[1], "status": row[2], "created_at": row[3].isoformat()}})
+            self._write_json(200, {"ok": True, "item": self._routine_item(row)})
         except Exception as e:
             self._write_json(500, {"ok": False, "error": str(e)})
 
@@ -411,24 +1657,35 @@ class handler(BaseHTTPRequestHandler):
             rid = int(payload.get("id"))
         except Exception:
             rid = 0
+        # Concluir uma ocorrência recorrente ainda virtual: {recurrence_id, date, status}
+        occurrence = None
+        if rid <= 0 and payload.get("recurrence_id") and payload.get("date"):
+            try:
+                occurrence = (int(payload["recurrence_id"]), date.fromisoformat(payload["date"]))
+            except Exception:
+                occurrence = None
         status = payload.get("status")
-        if rid <= 0 or status not in ("pendente", "feita"):
+        if (rid <= 0 and not occurrence) or status not in ("pendente", "feita"):
             self._write_json(400, {"ok": False, "error": "id e status válido são obrigatórios"})
             return
         try:
             with self._connect() as conn:
                 with conn.cursor() as cur:
                     self._ensure_schema(cur)
-                    cur.execute(
-                        "UPDATE routines SET status = %s WHERE id = %s AND user_id = %s RETURNING id, title, status, created_at",
-                        (status, rid, user["uid"]),
-                    )
-                    row = cur.fetchone()
+                    progress = lock_progress(cur, user["uid"])
+                    deltas = ProgressDeltas()
+                    if occurrence:
+                        rid = self._materialize_occurrence_id(cur, user, deltas, *occurrence)
+                    row = self._write_routine(cur, user["uid"], rid, ROUTINE_STATUS_SQL, (status, rid, user["uid"]))
+                    unlocked = []
+                    if row:
+                        deltas.status_changed(row[3], row[4], row[2], row[5])
+                        _, unlocked = apply_progress(cur, user["uid"], progress, deltas)
                     conn.commit()
             if not row:
                 self._write_json(404, {"ok": False, "error": "rotina não encontrada"})
                 return
-            self._write_json(200, {"ok": True, "item": {"id": row[0], "title": row[1], "status": row[2], "created_at": row[3].isoformat()}})
+            self._write_json(200, {"ok": True, "item": self._routine_item(row), "unlocked": unlocked})
         except Exception as e:
             self._write_json(500, {"ok": False, "error": str(e)})
 
@@ -444,98 +1701,168 @@ class handler(BaseHTTPRequestHandler):
             with self._connect() as conn:
                 with conn.cursor() as cur:
                     self._ensure_schema(cur)
-                    cur.execute("DELETE FROM routines WHERE id = %s AND user_id = %s RETURNING id", (rid, user["uid"]))
-                    row = cur.fetchone()
+                    progress = lock_progress(cur, user["uid"])
+                    row = self._write_routine(cur, user["uid"], rid, ROUTINE_DELETE_SQL, (rid, user["uid"]))
+                    unlocked = []
+                    if row:
+                        deltas = ProgressDeltas()
+                        deltas.deleted(row[2], row[1], row[3])
+                        _, unlocked = apply_progress(cur, user["uid"], progress, deltas)
                     conn.commit()
             if not row:
                 self._write_json(404, {"ok": False, "error": "rotina não encontrada"})
                 return
-            self._write_json(200, {"ok": True, "deleted_id": row[0]})
+            self._write_json(200, {"ok": True, "deleted_id": row[0], "unlocked": unlocked})
         except Exception as e:
             self._write_json(500, {"ok": False, "error": str(e)})
 
     # -------- Dispatch HTTP --------
-    def do_GET(self):
-        path = self._parse_path()
-        if path == "/" or path == "/health":
-            return self._write_json(200, {"ok": True})
-        if path == "/api/auth/google/start":
-            return self._auth_start()
-        if path == "/api/auth/google/callback":
-            return self._auth_callback()
-        if path == "/api/me":
-            return self._me()
-        if path == "/api/routines":
-            user = self._require_user()
-            if not user:
-                return
-            return self._list_routines(user)
-        self._write_json(404, {"ok": False, "error": "not found"})
+    def _health(self):
+        self._write_json(
+            200,
+            {
+                "ok": True,
+                "pid": os.getpid(),
+                "pool": pool_stats(),
+                "replicas": db.replicas.stats(),
+                "jwt_cache": _token_cache.stats(),
+            },
+        )
 
-    def do_POST(self):
-        path = self._parse_path()
-        length = int(self.headers.get("Content-Length", "0"))
-        raw = self.rfile.read(length) if length > 0 else b"{}"
+    def _has_body(self) -> bool:
+        length = self.headers.get("Content-Length", "").strip()
+        return bool(self.headers.get("Transfer-Encoding")) or length not in ("", "0")
+
+    def _iter_body(self, limit: int):
+        """Corpo em blocos de até STREAM_CHUNK_BYTES, sem juntar tudo na memória.
+
+        Content-Length acima do limite levanta BodyTooLarge já aqui, sem ler nada;
+        com Transfer-Encoding chunked a leitura para assim que o total passa do limite.
+        """
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            blocks = self._iter_chunked(limit)
+        else:
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+            except ValueError:
+                raise BodyError("Content-Length inválido") from None
+            if length > limit:
+                raise BodyTooLarge()
+            blocks = self._iter_exact(length)
+        if self._body_state is not None:
+            self._body_state = "partial"
+        return self._track_body(blocks)
+
+    def _track_body(self, blocks):
+        yield from blocks
+        self._body_state = "done"
+
+    def _finish_body(self):
+        """Depois da resposta: o corpo que a rota não leu (404/405, 401, rota sem corpo)
+        é descartado para o próximo request do keep-alive não começar no meio dele.
+        Corpo lido pela metade, malformado ou maior que MAX_BODY_BYTES fecha a conexão."""
+        if self._body_state not in ("unread", "partial") or self.close_connection:
+            return
+        if self._body_state == "partial":
+            self.close_connection = True
+            return
         try:
-            payload = json.loads(raw.decode("utf-8"))
-        except Exception:
-            payload = {}
+            for _ in self._iter_body(MAX_BODY_BYTES):
+                pass
+        except BodyError:
+            self.close_connection = True
 
-        if path == "/api/auth/google/start":
-            return self._auth_start()
-        if path == "/api/logout":
-            return self._logout()
-        if path == "/api/routines":
-            user = self._require_user()
-            if not user:
+    def _iter_exact(self, length: int):
+        while length > 0:
+            block = self.rfile.read(min(length, STREAM_CHUNK_BYTES))
+            if not block:
+                raise BodyError("corpo incompleto")
+            length -= len(block)
+            yield block
+
+    def _iter_chunked(self, limit: int):
+        total = 0
+        while True:
+            size_line = self.rfile.readline(MAX_HEADER_BYTES)
+            try:
+                size = int(size_line.split(b";", 1)[0].strip(), 16)
+            except ValueError:
+                raise BodyError("chunk inválido") from None
+            if size == 0:
+                # Trailers (se houver) até a linha vazia
+                while self.rfile.readline(MAX_HEADER_BYTES) not in (b"\r\n", b"\n", b""):
+                    pass
                 return
-            return self._create_routine(user, payload)
-        self._write_json(404, {"ok": False, "error": "not found"})
+            total += size
+            if total > limit:
+                raise BodyTooLarge()
+            yield from self._iter_exact(size)
+            self.rfile.readline(MAX_HEADER_BYTES)  # CRLF após o chunk
 
-    def do_PUT(self):
-        path = self._parse_path()
-        length = int(self.headers.get("Content-Length", "0"))
-        raw = self.rfile.read(length) if length > 0 else b"{}"
+    def _read_body(self, limit: int) -> bytes | None:
+        """Corpo inteiro limitado a `limit` bytes; None quando já respondeu 413/400"""
         try:
-            payload = json.loads(raw.decode("utf-8"))
-        except Exception:
-            payload = {}
-        if path == "/api/routines":
-            user = self._require_user()
-            if not user:
-                return
-            return self._update_routine(user, payload)
-        self._write_json(404, {"ok": False, "error": "not found"})
+            return b"".join(self._iter_body(limit))
+        except BodyTooLarge:
+            self._reject_body(limit)
+        except BodyError as e:
+            self._write_json(400, {"ok": False, "error": str(e)}, headers={"Connection": "close"})
+        return None
 
-    def do_DELETE(self):
+    def _reject_body(self, limit: int):
+        # O resto do corpo não é lido: a conexão fecha em vez de ser reaproveitada
+        self._write_json(
+            413, {"ok": False, "error": f"corpo maior que {limit} bytes"}, headers={"Connection": "close"}
+        )
+
+    def _dispatch(self):
         path = self._parse_path()
-        length = int(self.headers.get("Content-Length", "0"))
-        raw = self.rfile.read(length) if length > 0 else b"{}"
-        try:
-            payload = json.loads(raw.decode("utf-8"))
-        except Exception:
-            payload = {}
-        if path == "/api/routines":
+        route, params = self.router.resolve(self.command, path)
+        if route is None:
+            allowed = self.router.allowed_methods(path)
+            if allowed:
+                return self._write_json(
+                    405, {"ok": False, "error": "método não permitido"}, headers={"Allow": ", ".join(allowed)}
+                )
+            return self._write_json(404, {"ok": False, "error": "not found"})
+        self._route = route.pattern
+        args = []
+        if route.auth:
             user = self._require_user()
             if not user:
                 return
-            return self._delete_routine(user, payload)
-        self._write_json(404, {"ok": False, "error": "not found"})
+            args.append(user)
+            if route.method not in ("GET", "HEAD"):
+                self._note_write(user["uid"])
+        if route.body:
+            raw = self._read_body(route.max_body)
+            if raw is None:
+                return
+            try:
+                payload = json.loads(raw.decode("utf-8")) if raw else {}
+            except Exception:
+                payload = {}
+            if not isinstance(payload, dict):
+                payload = {}
+            # Parâmetros do path (/api/routines/{id}) têm precedência sobre o corpo
+            payload.update(params)
+            args.append(payload)
+        return route.func(self, *args)
+
+    def do_GET(self):
+        self._dispatch()
+
+    def do_POST(self):
+        self._dispatch()
+
+    def do_PUT(self):
+        self._dispatch()
+
+    def do_DELETE(self):
+        self._dispatch()
 
     def do_PATCH(self):
-        path = self._parse_path()
-        length = int(self.headers.get("Content-Length", "0"))
-        raw = self.rfile.read(length) if length > 0 else b"{}"
-        try:
-            payload = json.loads(raw.decode("utf-8"))
-        except Exception:
-            payload = {}
-        if path == "/api/routines/status":
-            user = self._require_user()
-            if not user:
-                return
-            return self._update_routine_status(user, payload)
-        self._write_json(404, {"ok": False, "error": "not found"})
+        self._dispatch()
 
     def do_OPTIONS(self):
         """Handle CORS preflight requests"""
@@ -545,12 +1872,98 @@ class handler(BaseHTTPRequestHandler):
         self.end_headers()
 
 
+ROUTES = [
+    Route("GET", "/", handler._health),
+    Route("GET", "/health", handler._health),
+    Route("GET", "/metrics", handler._write_metrics),
+    Route("GET", "/api/auth/google/start", handler._auth_start),
+    Route("POST", "/api/auth/google/start", handler._auth_start),
+    Route("GET", "/api/auth/google/callback", handler._auth_callback),
+    Route("GET", "/api/me", handler._me),
+    Route("POST", "/api/logout", handler._logout),
+    Route("GET", "/api/routines", handler._list_routines, auth=True),
+    Route("POST", "/api/routines", handler._create_routine, auth=True, body=True),
+    Route("PUT", "/api/routines", handler._update_routine, auth=True, body=True),
+    Route("DELETE", "/api/routines", handler._delete_routine, auth=True, body=True),
+    Route("PUT", "/api/routines/{id}", handler._update_routine, auth=True),
+    Route("DELETE", "/api/routines/{id}", handler._delete_routine, auth=True),
+    Route("PATCH", "/api/routines/status", handler._update_routine_status, auth=True, body=True),
+    Route("PATCH", "/api/routines/{id}/status", handler._update_routine_status, auth=True),
+    Route("POST", "/api/routines/batch", handler._batch_routines, auth=True, body=True),
+    Route("GET", "/api/routines/stats/daily", handler._daily_stats, auth=True),
+    Route("GET", "/api/routines/range", handler._routines_range, auth=True),
+    Route("GET", "/api/routines/stream", handler._stream_routines, auth=True),
+    Route("GET", "/api/routines/changes", handler._routine_changes, auth=True),
+    Route("GET", "/api/routines/export", handler._export_routines, auth=True),
+    Route(
+        "POST", "/api/routines/import", handler._import_routines, auth=True, stream=True, max_body=IMPORT_MAX_BYTES
+    ),
+    Route("GET", "/api/progress", handler._get_progress, auth=True),
+    Route("GET", "/api/achievements", handler._get_achievements, auth=True),
+    Route("GET", "/api/recurrences", handler._list_recurrences, auth=True),
+    Route("POST", "/api/recurrences", handler._create_recurrence, auth=True, body=True),
+    Route("DELETE", "/api/recurrences", handler._delete_recurrence, auth=True, body=True),
+    Route("DELETE", "/api/recurrences/{id}", handler._delete_recurrence, auth=True),
+]
+handler.router = Router(ROUTES)
+
+
+def _reset_after_fork():
+    """Estado que não pode atravessar o fork: cada worker abre suas conexões e threads"""
+    db.reset_after_fork()
+    ratelimit.limiter = make_rate_limiter()
+    oidc.http_client = HTTPClient(OAUTH_TIMEOUT, OAUTH_RETRIES)
+    oidc.provider = OIDCProvider(OAUTH_ISSUER, oidc.http_client)
+    changes.hub = ChangeHub()
+    profiles.cache = ProfileCache(PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL)
+
+
+def _run_worker(slot: int, make, notify_fd: int):
+    """Worker do pre-fork: recria o estado do processo e serve até ser drenado"""
+    _reset_after_fork()
+    if slot == 0 and get_db_url():
+        # Manutenção roda num único worker (o do slot 0, mesmo após restart)
+        start_maintenance()
+    try:
+        serve_worker(slot, make, notify_fd)
+    finally:
+        close_pool()
+
+
 if __name__ == "__main__":
-    from http.server import HTTPServer
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["single", "threaded", "async"], default=SERVER_MODE)
+    parser.add_argument("--workers", type=int, default=SERVER_MAX_WORKERS)
+    parser.add_argument("--backlog", type=int, default=SERVER_BACKLOG)
+    parser.add_argument("--max-inflight", type=int, default=MAX_INFLIGHT)
+    parser.add_argument("--processes", type=int, default=SERVER_PROCESSES, help="0 = um por CPU")
+    args = parser.parse_args()
+    processes = args.processes or os.cpu_count() or 1
     # Render detecta automaticamente a porta — sempre tenta PORT env var primeiro
     # Se não estiver setado, usa 3000 (local) ou 8000 (fallback seguro)
     port = int(os.getenv("PORT", os.getenv("PORT", "10000" if os.getenv("RENDER") else "3000")))
     host = "0.0.0.0"  # sempre 0.0.0.0 em produção
-    print(f"Starting server on {host}:{port}")
-    HTTPServer((host, port), handler).serve_forever()
+    if get_db_url():
+        # Aplica migrações pendentes antes de aceitar tráfego
+        with get_pool().connection() as conn:
+            ensure_schema_once(conn)
+            ensure_partitions(conn)
+        if processes == 1:
+            start_maintenance()
+    if processes > 1:
+        # Conexões não atravessam o fork: cada worker abre o seu pool
+        close_pool()
+        print(
+            f"Starting server on {host}:{port} "
+            f"(mode={args.mode}, processes={processes}, workers={args.workers} per process)"
+        )
+
+        def make():
+            return make_server(
+                args.mode, host, port, handler, args.workers, args.backlog, args.max_inflight, reuse_port=True
+            )
 
+        PreforkSupervisor(processes, lambda slot, fd: _run_worker(slot, make, fd)).run()
+    else:
+        print(f"Starting server on {host}:{port} (mode={args.mode}, workers={args.workers})")
+        make_server(args.mode, host, port, handler, args.workers, args.backlog, args.max_inflight).serve_forever()
@@ -0,0 +1,56 @@
+"""Arquivamento de rotinas antigas.
+
+Move as rotinas feitas criadas antes de N meses (padrão ARCHIVE_AFTER_MONTHS)
+para routines_archive, garante as partições futuras e, com --drop-empty,
+remove as partições mensais antigas que ficaram vazias (rotinas pendentes e
+tombstones ainda não compactados mantêm a partição viva):
+
+    python scripts/archive_routines.py --months 12
+    python scripts/archive_routines.py --months 6 --drop-empty
+"""
+from dotenv import load_dotenv
+import argparse
+import os
+import sys
+from datetime import date
+import psycopg
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+from _lib import db, maintenance  # noqa: E402
+from _lib.migrations import run_migrations  # noqa: E402
+from _lib.settings import ARCHIVE_AFTER_MONTHS, ARCHIVE_BATCH  # noqa: E402
+
+load_dotenv(override=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=db.get_db_url())
+    parser.add_argument("--months", type=int, default=ARCHIVE_AFTER_MONTHS,
+                        help="arquiva rotinas feitas criadas antes do início do mês de N meses atrás")
+    parser.add_argument("--batch", type=int, default=ARCHIVE_BATCH)
+    parser.add_argument("--drop-empty", action="store_true", help="remove partições antigas vazias")
+    args = parser.parse_args()
+    if not args.database_url:
+        print("DATABASE_URL/NEON_DATABASE_URL not configured")
+        sys.exit(2)
+    if args.months < 1:
+        print("--months must be >= 1")
+        sys.exit(2)
+
+    # Corte no início de um mês: o arquivamento só toca partições antigas inteiras
+    before = maintenance.add_months(date.today().replace(day=1), -args.months)
+    with psycopg.connect(db.normalize_db_url(args.database_url)) as conn:
+        run_migrations(conn)
+        created = maintenance.ensure_partitions(conn)
+        if created:
+            print("Created partitions:", ", ".join(created))
+        moved = maintenance.archive_routines(conn, before, args.batch)
+        print(f"Archived {moved} routines created before {before}")
+        if args.drop_empty:
+            dropped = maintenance.drop_empty_partitions(conn, before)
+            print("Dropped partitions:", ", ".join(dropped) if dropped else "none")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+"""Benchmark da API de rotinas.
+
+Sobe o `handler` de api/routines.py em processo contra um Postgres local (ou um
+cluster temporário criado com initdb quando --ephemeral), popula N usuários x M
+rotinas e dispara uma carga mista (list, create, status, delete) com
+concorrência configurável. O resultado vai para um JSON para comparar commits:
+
+    python scripts/bench_routines.py --ephemeral --users 50 --routines 500 -c 16 -d 30
+    python scripts/bench_routines.py --database-url postgresql://localhost/bench --compare bench-abc123.json
+"""
+from dotenv import load_dotenv
+import argparse
+import functools
+import http.client
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import psycopg
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+from _lib import ratelimit  # noqa: E402
+import routines  # noqa: E402
+from _lib.migrations import run_migrations  # noqa: E402
+from _lib.observability import logger  # noqa: E402
+from _lib.server import make_server  # noqa: E402
+from _lib.settings import SERVER_BACKLOG, SERVER_MAX_WORKERS  # noqa: E402
+
+load_dotenv(override=True)
+
+DEFAULT_MIX = "list=60,create=20,status=15,delete=5"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))
+    return ordered[idx]
+
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+# -------- Postgres temporário --------
+class EphemeralPostgres:
+    """Cluster descartável (initdb + pg_ctl) num diretório temporário"""
+
+    def __init__(self):
+        self.dir = tempfile.mkdtemp(prefix="bench-pg-")
+        self.port = free_port()
+
+    def start(self) -> str:
+        if not shutil.which("initdb") or not shutil.which("pg_ctl"):
+            raise RuntimeError("initdb/pg_ctl não encontrados no PATH")
+        data = os.path.join(self.dir, "data")
+        subprocess.run(["initdb", "-D", data, "-U", "bench", "--auth=trust"], check=True, capture_output=True)
+        subprocess.run(
+            ["pg_ctl", "-D", data, "-l", os.path.join(self.dir, "pg.log"), "-w", "start",
+             "-o", f"-p {self.port} -k {self.dir} -c listen_addresses=127.0.0.1"],
+            check=True,
+            capture_output=True,
+        )
+        url = f"postgresql://bench@127.0.0.1:{self.port}/postgres?sslmode=disable"
+        return url
+
+    def stop(self):
+        subprocess.run(["pg_ctl", "-D", os.path.join(self.dir, "data"), "-m", "fast", "stop"], capture_output=True)
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+# -------- Dados --------
+def seed(url: str, users: int, per_user: int) -> dict[int, list[int]]:
+    """Cria usuários/rotinas de benchmark e devolve {uid: [ids de rotinas]}"""
+    ids: dict[int, list[int]] = {}
+    with psycopg.connect(url) as conn:
+        run_migrations(conn)
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM users WHERE provider = 'bench'")
+            for i in range(users):
+                cur.execute(
+                    "INSERT INTO users(provider, provider_id, email, name) VALUES('bench', %s, %s, %s) RETURNING id",
+                    (f"bench-{i}", f"bench-{i}@example.com", f"Bench {i}"),
+                )
+                uid = cur.fetchone()[0]
+                cur.execute(
+                    """
+                    INSERT INTO routines(user_id, title, status, created_at)
+                    SELECT %s, 'rotina ' || g,
+                           CASE WHEN random() < 0.5 THEN 'feita' ELSE 'pendente' END,
+                           NOW() - g * INTERVAL '1 hour'
+                    FROM generate_series(1, %s) g
+                    RETURNING id
+                    """,
+                    (uid, per_user),
+                )
+                ids[uid] = [r[0] for r in cur.fetchall()]
+        conn.commit()
+    return ids
+
+
+class StatementCounter:
+    """Statements que o servidor em processo manda ao banco, contados no cliente
+    (Cursor.execute/copy do psycopg). Vale quando pg_stat_statements não existe;
+    só conta fora da thread principal, onde rodam seed e as leituras de contadores."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def install(self):
+        for name in ("execute", "copy"):
+            setattr(psycopg.Cursor, name, self._wrap(getattr(psycopg.Cursor, name)))
+
+    def _wrap(self, original):
+        @functools.wraps(original)
+        def counted(*args, **kwargs):
+            if threading.current_thread() is not threading.main_thread():
+                with self._lock:
+                    self.count += 1
+            return original(*args, **kwargs)
+
+        return counted
+
+
+def db_counters(url: str, client: StatementCounter) -> dict:
+    """Transações e statements já executados no banco: statements pelo
+    pg_stat_statements quando existe, senão pela contagem no cliente"""
+    counters = {"client_statements": client.count}
+    with psycopg.connect(url, autocommit=True) as conn:
+        with conn.cursor() as cur:
+            try:
+                cur.execute("SELECT pg_stat_force_next_flush()")
+            except Exception:
+                pass
+            cur.execute("SELECT pg_stat_clear_snapshot()")
+            cur.execute(
+                "SELECT xact_commit + xact_rollback FROM pg_stat_database WHERE datname = current_database()"
+            )
+            counters["xacts"] = cur.fetchone()[0]
+            try:
+                cur.execute("SELECT COALESCE(SUM(calls), 0) FROM pg_stat_statements")
+                counters["statements"] = int(cur.fetchone()[0])
+            except Exception:
+                pass
+    return counters
+
+
+# -------- Carga --------
+class Worker(threading.Thread):
+    ids_lock = threading.Lock()  # as listas de ids de cada usuário são compartilhadas entre os workers
+
+    def __init__(self, port: int, sessions: dict[int, str], ids: dict[int, list[int]], mix, deadline: float, results):
+        super().__init__(daemon=True)
+        self.port = port
+        self.sessions = sessions
+        self.ids = ids
+        self.ops, self.weights = zip(*mix)
+        self.deadline = deadline
+        self.results = results
+        self.rng = random.Random()
+
+    def _call(self, conn, method: str, path: str, cookie: str, body: dict | None = None):
+        headers = {"Cookie": f"session={cookie}", "Content-Type": "application/json"}
+        data = json.dumps(body).encode() if body is not None else None
+        conn.request(method, path, body=data, headers=headers)
+        resp = conn.getresponse()
+        payload = resp.read()
+        return resp.status, payload
+
+    def _pick(self, mine: list[int], remove: bool) -> int | None:
+        with self.ids_lock:
+            if not mine:
+                return None
+            i = self.rng.randrange(len(mine))
+            return mine.pop(i) if remove else mine[i]
+
+    def run(self):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+        uids = list(self.sessions)
+        while time.perf_counter() < self.deadline:
+            uid = self.rng.choice(uids)
+            cookie = self.sessions[uid]
+            op = self.rng.choices(self.ops, self.weights)[0]
+            mine = self.ids[uid]
+            rid = None
+            if op in ("status", "delete"):
+                rid = self._pick(mine, remove=op == "delete")
+                if rid is None:
+                    continue
+            start = time.perf_counter()
+            try:
+                if op == "list":
+                    status, _ = self._call(conn, "GET", "/api/routines", cookie)
+                elif op == "create":
+                    status, payload = self._call(conn, "POST", "/api/routines", cookie, {"title": "bench"})
+                    if status == 201:
+                        with self.ids_lock:
+                            mine.append(json.loads(payload)["item"]["id"])
+                elif op == "status":
+                    new = self.rng.choice(["pendente", "feita"])
+                    status, _ = self._call(conn, "PATCH", "/api/routines/status", cookie, {"id": rid, "status": new})
+                else:
+                    status, _ = self._call(conn, "DELETE", "/api/routines", cookie, {"id": rid})
+                ok = status < 400
+            except Exception:
+                ok = False
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+            self.results.append((op, time.perf_counter() - start, ok))
+        conn.close()
+
+
+def summarize(samples: list[tuple[str, float, bool]], elapsed: float) -> dict:
+    def stats(latencies: list[float], errors: int) -> dict:
+        return {
+            "count": len(latencies),
+            "errors": errors,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        }
+
+    by_op: dict[str, list[float]] = {}
+    errors_by_op: dict[str, int] = {}
+    for op, seconds, ok in samples:
+        by_op.setdefault(op, []).append(seconds)
+        if not ok:
+            errors_by_op[op] = errors_by_op.get(op, 0) + 1
+    overall = stats([s for _, s, _ in samples], sum(errors_by_op.values()))
+    overall["throughput_rps"] = round(len(samples) / elapsed, 2) if elapsed else 0.0
+    return {
+        "overall": overall,
+        "ops": {op: stats(lat, errors_by_op.get(op, 0)) for op, lat in sorted(by_op.items())},
+    }
+
+
+def compare(current: dict, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nComparação com {baseline.get('commit')} ({baseline_path}):")
+    for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+        old = baseline["overall"].get(key) or 0
+        new = current["overall"].get(key) or 0
+        delta = ((new - old) / old * 100) if old else 0.0
+        print(f"  {key:15} {old:>10} -> {new:>10} ({delta:+.1f}%)")
+
+
+def parse_mix(raw: str) -> list[tuple[str, int]]:
+    mix = []
+    for part in raw.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("list", "create", "status", "delete"):
+            raise ValueError(f"operação desconhecida: {name}")
+        mix.append((name, int(weight or 1)))
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"))
+    parser.add_argument("--ephemeral", action="store_true", help="cria um Postgres temporário com initdb")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--routines", type=int, default=200, help="rotinas por usuário")
+    parser.add_argument("-c", "--concurrency", type=int, default=8)
+    parser.add_argument("-d", "--duration", type=float, default=20.0, help="segundos de carga medida")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--mode", choices=["single", "threaded", "async"], default="threaded")
+    parser.add_argument("--workers", type=int, default=SERVER_MAX_WORKERS)
+    parser.add_argument("--output", help="arquivo JSON de saída (padrão: bench-<commit>.json)")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--rate-limit", action="store_true", help="mantém o rate limiting ligado durante a carga")
+    args = parser.parse_args()
+
+    pg = None
+    url = args.database_url
+    if args.ephemeral:
+        pg = EphemeralPostgres()
+        url = pg.start()
+    if not url:
+        print("Informe --database-url, BENCH_DATABASE_URL ou --ephemeral")
+        sys.exit(2)
+
+    try:
+        # O servidor em processo usa o mesmo banco do benchmark
+        os.environ["DATABASE_URL"] = url
+        if not os.getenv("JWT_SECRET") and not os.getenv("JWT_KEYS"):
+            os.environ["JWT_SECRET"] = os.urandom(16).hex()
+        logger.setLevel("WARNING")  # sem access log durante a carga
+        if not args.rate_limit:
+            # Toda a carga sai de 127.0.0.1: o limite por IP viraria o gargalo medido
+            ratelimit.limiter = None
+
+        client_statements = StatementCounter()
+        client_statements.install()
+        print(f"Seeding {args.users} users x {args.routines} routines...")
+        ids = seed(url, args.users, args.routines)
+        signer = routines.handler.__new__(routines.handler)
+        sessions = {uid: signer._jwt_sign({"uid": uid, "email": f"{uid}@bench", "name": "bench"}) for uid in ids}
+
+        port = free_port()
+        server = make_server(args.mode, "127.0.0.1", port, routines.handler, args.workers, SERVER_BACKLOG)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        time.sleep(0.3)
+
+        mix = parse_mix(args.mix)
+        if args.warmup > 0:
+            warm: list = []
+            workers = [Worker(port, sessions, ids, mix, time.perf_counter() + args.warmup, warm)
+                       for _ in range(args.concurrency)]
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+
+        before = db_counters(url, client_statements)
+        samples: list = []
+        start = time.perf_counter()
+        workers = [Worker(port, sessions, ids, mix, start + args.duration, samples) for _ in range(args.concurrency)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - start
+        after = db_counters(url, client_statements)
+
+        result = {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "config": {
+                "users": args.users,
+                "routines_per_user": args.routines,
+                "concurrency": args.concurrency,
+                "duration_s": args.duration,
+                "mix": args.mix,
+                "mode": args.mode,
+                "workers": args.workers,
+            },
+            **summarize(samples, elapsed),
+        }
+        total = max(len(samples), 1)
+        source = "pg_stat_statements" if "statements" in after and "statements" in before else "client"
+        key = "statements" if source == "pg_stat_statements" else "client_statements"
+        result["db"] = {
+            "statements_per_request": round((after[key] - before[key]) / total, 3),
+            "statements_source": source,
+            "xacts_per_request": round((after["xacts"] - before["xacts"]) / total, 3),
+        }
+
+        output = args.output or f"bench-{result['commit']}.json"
+        with open(output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(json.dumps({"overall": result["overall"], "db": result["db"]}, indent=2))
+        print(f"Resultados salvos em {output}")
+        if args.compare:
+            compare(result, args.compare)
+    finally:
+        if pg:
+            pg.stop()
+
+
+if __name__ == '__main__':
+    main()
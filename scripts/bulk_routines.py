@@ -0,0 +1,88 @@
+"""Import/export em massa das rotinas de um usuário via COPY.
+
+Mesmo formato dos endpoints GET /api/routines/export e POST /api/routines/import
+(NDJSON ou CSV com cabeçalho title,status,created_at), sem limite de tamanho de
+corpo. O formato sai da extensão do arquivo quando --format não é passado:
+
+    python scripts/bulk_routines.py export --user dev@example.com backup.ndjson
+    python scripts/bulk_routines.py export --user 42 --format csv > backup.csv
+    python scripts/bulk_routines.py import --user 42 backup.ndjson
+    cat habitos.csv | python scripts/bulk_routines.py import --user 42 --format csv --skip-invalid
+"""
+from dotenv import load_dotenv
+import argparse
+import json
+import os
+import sys
+import time
+import psycopg
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+from _lib import bulk, db  # noqa: E402
+from _lib.migrations import run_migrations  # noqa: E402
+from _lib.settings import EXPORT_FORMATS, STREAM_CHUNK_BYTES  # noqa: E402
+
+load_dotenv(override=True)
+
+
+def resolve_user(conn, user: str) -> int | None:
+    with conn.cursor() as cur:
+        if user.isdigit():
+            cur.execute("SELECT id FROM users WHERE id = %s", (int(user),))
+        else:
+            cur.execute("SELECT id FROM users WHERE email = %s", (user.strip().lower(),))
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", nargs="?", default="-", help="arquivo (padrão: stdout/stdin)")
+    parser.add_argument("--user", required=True, help="id ou e-mail do usuário")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS))
+    parser.add_argument("--skip-invalid", action="store_true", help="pula registros inválidos em vez de abortar")
+    parser.add_argument("--database-url", default=db.get_db_url())
+    args = parser.parse_args()
+    if not args.database_url:
+        print("DATABASE_URL/NEON_DATABASE_URL not configured", file=sys.stderr)
+        sys.exit(2)
+    fmt = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+
+    with psycopg.connect(db.normalize_db_url(args.database_url)) as conn:
+        run_migrations(conn)
+        uid = resolve_user(conn, args.user)
+        if uid is None:
+            print(f"User not found: {args.user}", file=sys.stderr)
+            sys.exit(1)
+        start = time.perf_counter()
+        if args.command == "export":
+            out = sys.stdout.buffer if args.path == "-" else open(args.path, "wb")
+            size = 0
+            with out:
+                for block in bulk.export_routines(conn, uid, fmt):
+                    out.write(block)
+                    size += len(block)
+            conn.commit()
+            print(f"Exported {size} bytes ({fmt}) in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+            return
+
+        src = sys.stdin.buffer if args.path == "-" else open(args.path, "rb")
+        with src:
+            blocks = iter(lambda: src.read(STREAM_CHUNK_BYTES), b"")
+            try:
+                with bulk.stage_import(bulk.parse_import(blocks, fmt), skip_invalid=args.skip_invalid) as staged:
+                    result = bulk.import_routines(conn, uid, staged)
+            except bulk.ImportRejected as e:
+                conn.rollback()
+                print("Invalid records, nothing imported:", file=sys.stderr)
+                for err in e.errors:
+                    print(f"  line {err['line']}: {err['error']}", file=sys.stderr)
+                sys.exit(1)
+        elapsed = time.perf_counter() - start
+        print(json.dumps(result, ensure_ascii=False))
+        print(f"Imported {result['imported']} routines in {elapsed:.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,74 @@
 from dotenv import load_dotenv
 import os
+import sys
 import psycopg
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+from _lib.maintenance import compact_tombstones, ensure_partitions, prune_events  # noqa: E402
+from _lib.migrations import MIGRATIONS, run_migrations  # noqa: E402
+
 load_dotenv(override=True)
 
 def get_db_url():
     return os.getenv("DATABASE_URL") or os.getenv("NEON_DATABASE_URL")
 
-USERS_TABLE_SQL = """
-CREATE TABLE IF NOT EXISTS users (
-  id SERIAL PRIMARY KEY,
-  provider TEXT NOT NULL,
-  provider_id TEXT NOT NULL UNIQUE,
-  email TEXT NOT NULL UNIQUE,
-  name TEXT,
-  picture TEXT,
-  created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
-);
-"""
-
-ROUTINES_TABLE_SQL = """
-CREATE TABLE IF NOT EXISTS routines (
-  id SERIAL PRIMARY KEY,
-  user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-  title TEXT NOT NULL,
-  status TEXT NOT NULL DEFAULT 'pendente' CHECK (status IN ('pendente', 'feita')),
-  created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
-);
-"""
+
+def migrate(conn):
+    applied = run_migrations(conn)
+    if applied:
+        print("Applied migrations:", ", ".join(str(v) for v in applied))
+    else:
+        print("Schema already up to date (version %d)" % MIGRATIONS[-1][0])
+    created = ensure_partitions(conn)
+    if created:
+        print("Created partitions:", ", ".join(created))
+
+
+# Tudo o que MIGRATIONS cria: sobrar uma tabela com user_id faria o novo usuário 1
+# (o SERIAL recomeça) herdar arquivo, progresso e conquistas do antigo
+RESET_TABLES = [
+    "routine_events",
+    "routines_archive",
+    "routines",
+    "recurrences",
+    "user_achievements",
+    "user_daily_progress",
+    "user_progress",
+    "rate_limits",
+    "users",
+    "schema_migrations",
+]
+RESET_FUNCTIONS = ["bump_user_revision", "notify_profile_change", "record_routine_event", "stamp_bulk_revision"]
+
+
+def reset(conn):
+    with conn.cursor() as cur:
+        print("Dropping existing tables...")
+        # Partições e sequências caem junto com as tabelas donas
+        cur.execute("DROP TABLE IF EXISTS %s CASCADE" % ", ".join(RESET_TABLES))
+        for name in RESET_FUNCTIONS:
+            cur.execute("DROP FUNCTION IF EXISTS %s() CASCADE" % name)
+        conn.commit()
+    migrate(conn)
+
+
+def compact(conn):
+    # Para deploys sem processo de longa duração (cron chamando este script)
+    removed = compact_tombstones(conn)
+    print("Removed %d tombstones" % removed)
+    removed = prune_events(conn)
+    print("Removed %d routine events" % removed)
+
+
+COMMANDS = {"migrate": migrate, "reset": reset, "compact": compact}
 
 
 def main():
+    # Padrão é "migrate" (não destrutivo); "reset" apaga tudo e recria
+    command = sys.argv[1] if len(sys.argv) > 1 else "migrate"
+    if command not in COMMANDS:
+        print("Usage: python scripts/init_db.py [migrate|reset|compact]")
+        sys.exit(2)
     url = get_db_url()
     if not url:
         print("DATABASE_URL/NEON_DATABASE_URL not configured")
@@ -38,15 +76,7 @@ def main():
     print("Connecting to:", url.split("@")[-1][:200])
     try:
         with psycopg.connect(url) as conn:
-            with conn.cursor() as cur:
-                print("Dropping existing tables...")
-                cur.execute("DROP TABLE IF EXISTS routines CASCADE;")
-                cur.execute("DROP TABLE IF EXISTS users CASCADE;")
-                
-                print("Creating new schema...")
-                cur.execute(USERS_TABLE_SQL)
-                cur.execute(ROUTINES_TABLE_SQL)
-                conn.commit()
+            COMMANDS[command](conn)
         print("Schema applied successfully")
     except Exception as e:
         print("Error applying schema:", e)
@@ -0,0 +1,246 @@
+"""Provedor OAuth/OIDC falso para desenvolvimento local.
+
+Implementa discovery, /authorize (formulário de e-mail, sem senha), /token
+(com id_token RS256), /userinfo e /jwks — o suficiente para o fluxo de login
+de api/routines.py rodar sem credenciais do Google:
+
+    python scripts/mock_oauth.py --port 9000
+    OAUTH_ISSUER=http://localhost:9000 GOOGLE_CLIENT_ID=dev GOOGLE_CLIENT_SECRET=dev python api/routines.py
+
+Com ?email=... no /authorize o login é automático (útil em scripts e testes).
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import base64
+import hashlib
+import html
+import json
+import secrets
+import threading
+import time
+import urllib.parse
+
+CODE_TTL = 300
+TOKEN_TTL = 3600
+SHA256_DIGEST_INFO = bytes.fromhex("3031300d060960864801650304020105000420")
+
+
+# -------- RSA (só para assinar tokens de teste) --------
+def is_probable_prime(n: int, rounds: int = 40) -> bool:
+    if n < 2:
+        return False
+    for p in (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37):
+        if n % p == 0:
+            return n == p
+    d, r = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        r += 1
+    for _ in range(rounds):
+        x = pow(secrets.randbelow(n - 3) + 2, d, n)
+        if x in (1, n - 1):
+            continue
+        for _ in range(r - 1):
+            x = pow(x, 2, n)
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def random_prime(bits: int) -> int:
+    while True:
+        candidate = secrets.randbits(bits) | (1 << (bits - 1)) | 1
+        if is_probable_prime(candidate):
+            return candidate
+
+
+def generate_rsa_key(bits: int = 2048) -> tuple[int, int, int]:
+    """(n, e, d)"""
+    e = 65537
+    while True:
+        p, q = random_prime(bits // 2), random_prime(bits // 2)
+        phi = (p - 1) * (q - 1)
+        if p != q and phi % e:
+            return p * q, e, pow(e, -1, phi)
+
+
+def b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def int_b64url(value: int) -> str:
+    return b64url(value.to_bytes((value.bit_length() + 7) // 8, "big"))
+
+
+class MockProvider:
+    def __init__(self, issuer: str):
+        self.issuer = issuer
+        self.kid = secrets.token_hex(8)
+        self.n, self.e, self.d = generate_rsa_key()
+        self.lock = threading.Lock()
+        self.codes: dict[str, dict] = {}  # code -> {profile, client_id, redirect_uri, exp}
+        self.tokens: dict[str, dict] = {}  # access_token -> {profile, exp}
+
+    def profile(self, email: str) -> dict:
+        name = email.split("@", 1)[0]
+        return {
+            "sub": "mock-" + hashlib.sha256(email.encode()).hexdigest()[:16],
+            "email": email,
+            "email_verified": True,
+            "name": name.replace(".", " ").title(),
+            "picture": None,
+        }
+
+    def sign(self, claims: dict) -> str:
+        header = {"alg": "RS256", "typ": "JWT", "kid": self.kid}
+        signing_input = f"{b64url(json.dumps(header).encode())}.{b64url(json.dumps(claims).encode())}"
+        k = (self.n.bit_length() + 7) // 8
+        t = SHA256_DIGEST_INFO + hashlib.sha256(signing_input.encode()).digest()
+        em = b"\x00\x01" + b"\xff" * (k - len(t) - 3) + b"\x00" + t
+        sig = pow(int.from_bytes(em, "big"), self.d, self.n).to_bytes(k, "big")
+        return f"{signing_input}.{b64url(sig)}"
+
+    def discovery(self) -> dict:
+        return {
+            "issuer": self.issuer,
+            "authorization_endpoint": f"{self.issuer}/authorize",
+            "token_endpoint": f"{self.issuer}/token",
+            "userinfo_endpoint": f"{self.issuer}/userinfo",
+            "jwks_uri": f"{self.issuer}/jwks",
+            "id_token_signing_alg_values_supported": ["RS256"],
+        }
+
+    def jwks(self) -> dict:
+        return {"keys": [{
+            "kty": "RSA", "use": "sig", "alg": "RS256", "kid": self.kid,
+            "n": int_b64url(self.n), "e": int_b64url(self.e),
+        }]}
+
+
+LOGIN_FORM = """<!doctype html>
+<meta charset="utf-8"><title>Mock OAuth</title>
+<form method="get" action="/authorize">
+  {hidden}
+  <label>E-mail <input name="email" type="email" value="dev@example.com" autofocus></label>
+  <button>Entrar</button>
+</form>
+"""
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, como o provedor real
+    provider: MockProvider
+
+    def _json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = {k: v[0] for k, v in urllib.parse.parse_qs(url.query).items()}
+        if url.path == "/.well-known/openid-configuration":
+            return self._json(200, self.provider.discovery())
+        if url.path == "/jwks":
+            return self._json(200, self.provider.jwks())
+        if url.path == "/authorize":
+            return self._authorize(query)
+        if url.path == "/userinfo":
+            token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+            with self.provider.lock:
+                entry = self.provider.tokens.get(token)
+            if not entry or entry["exp"] < time.time():
+                return self._json(401, {"error": "invalid_token"})
+            return self._json(200, entry["profile"])
+        self._json(404, {"error": "not_found"})
+
+    def _authorize(self, query: dict):
+        if not query.get("redirect_uri") or not query.get("client_id"):
+            return self._json(400, {"error": "invalid_request"})
+        if not query.get("email"):
+            hidden = "".join(
+                f'<input type="hidden" name="{html.escape(k)}" value="{html.escape(v)}">' for k, v in query.items()
+            )
+            body = LOGIN_FORM.format(hidden=hidden).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        code = secrets.token_urlsafe(24)
+        with self.provider.lock:
+            self.provider.codes[code] = {
+                "profile": self.provider.profile(query["email"].strip().lower()),
+                "client_id": query["client_id"],
+                "redirect_uri": query["redirect_uri"],
+                "exp": time.time() + CODE_TTL,
+            }
+        params = {"code": code}
+        if query.get("state"):
+            params["state"] = query["state"]
+        sep = "&" if "?" in query["redirect_uri"] else "?"
+        self.send_response(302)
+        self.send_header("Location", f"{query['redirect_uri']}{sep}{urllib.parse.urlencode(params)}")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        if urllib.parse.urlsplit(self.path).path != "/token":
+            return self._json(404, {"error": "not_found"})
+        length = int(self.headers.get("Content-Length", "0"))
+        form = {k: v[0] for k, v in urllib.parse.parse_qs(self.rfile.read(length).decode()).items()}
+        if form.get("grant_type") != "authorization_code":
+            return self._json(400, {"error": "unsupported_grant_type"})
+        with self.provider.lock:
+            entry = self.provider.codes.pop(form.get("code", ""), None)  # uso único, como no Google
+        if (
+            not entry
+            or entry["exp"] < time.time()
+            or entry["client_id"] != form.get("client_id")
+            or entry["redirect_uri"] != form.get("redirect_uri")
+        ):
+            return self._json(400, {"error": "invalid_grant"})
+        now = int(time.time())
+        access_token = secrets.token_urlsafe(32)
+        with self.provider.lock:
+            self.provider.tokens[access_token] = {"profile": entry["profile"], "exp": now + TOKEN_TTL}
+        id_token = self.provider.sign({
+            "iss": self.provider.issuer,
+            "aud": entry["client_id"],
+            "iat": now,
+            "exp": now + TOKEN_TTL,
+            **entry["profile"],
+        })
+        self._json(200, {
+            "access_token": access_token,
+            "token_type": "Bearer",
+            "expires_in": TOKEN_TTL,
+            "scope": "openid email profile",
+            "id_token": id_token,
+        })
+
+    def log_message(self, format, *args):
+        print(f"mock-oauth {format % args}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--issuer", help="padrão: http://localhost:<port>")
+    args = parser.parse_args()
+    issuer = (args.issuer or f"http://localhost:{args.port}").rstrip("/")
+    print("Generating RSA key...")
+    MockHandler.provider = MockProvider(issuer)
+    print(f"Mock OAuth provider on {args.host}:{args.port} (issuer={issuer})")
+    ThreadingHTTPServer((args.host, args.port), MockHandler).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
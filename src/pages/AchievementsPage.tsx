@@ -1,9 +1,76 @@
+import { useEffect, useState } from 'react'
+import { getAchievements, getProgress, type Achievement, type Progress } from '../progress/api'
+
 export default function AchievementsPage() {
+  const [progress, setProgress] = useState<Progress | null>(null)
+  const [achievements, setAchievements] = useState<Achievement[]>([])
+  const [error, setError] = useState<string | null>(null)
+
+  useEffect(() => {
+    let active = true
+    Promise.all([getProgress(), getAchievements()])
+      .then(([data, items]) => {
+        if (!active) return
+        setProgress(data)
+        setAchievements(items)
+      })
+      .catch(err => {
+        if (!active) return
+        setError(err.message || 'Erro ao carregar progresso')
+      })
+
+    return () => {
+      active = false
+    }
+  }, [])
+
+  if (error) {
+    return (
+      <div style={styles.card}>
+        <p style={styles.text}>{error}</p>
+      </div>
+    )
+  }
+
+  if (!progress) {
+    return (
+      <div style={styles.card}>
+        <p style={styles.text}>Carregando progresso...</p>
+      </div>
+    )
+  }
+
   return (
     <div style={styles.card}>
-      <p style={styles.text}>
-        (Área das conquistas: medalhas, metas batidas, streaks)
-      </p>
+      <div style={styles.grid}>
+        <div style={styles.stat}>
+          <span style={styles.value}>Nível {progress.level}</span>
+          <span style={styles.label}>{progress.xp} / {progress.next_level_xp} XP</span>
+        </div>
+        <div style={styles.stat}>
+          <span style={styles.value}>{progress.current_streak}</span>
+          <span style={styles.label}>dias seguidos (melhor: {progress.best_streak})</span>
+        </div>
+        <div style={styles.stat}>
+          <span style={styles.value}>{progress.total_done}</span>
+          <span style={styles.label}>rotinas feitas</span>
+        </div>
+        <div style={styles.stat}>
+          <span style={styles.value}>{progress.today.done}/{progress.today.created}</span>
+          <span style={styles.label}>feitas hoje</span>
+        </div>
+      </div>
+      <ul style={styles.medals}>
+        {achievements.map(item => (
+          <li key={item.id} style={{ ...styles.medal, ...(item.unlocked ? styles.medalUnlocked : {}) }}>
+            <span style={styles.medalTitle}>{item.title}</span>
+            <span style={styles.label}>{item.description}</span>
+            <span style={styles.label}>
+              {item.unlocked ? 'Desbloqueada' : `${item.value}/${item.threshold}`}
+            </span>
+          </li>
+        ))}
+      </ul>
     </div>
   )
 }
@@ -16,6 +83,7 @@ const styles: Record<string, React.CSSProperties> = {
     minHeight: 260,
     display: 'grid',
     placeItems: 'center',
+    padding: 24,
   },
   text: {
     color: '#94a3b8',
@@ -23,5 +91,56 @@ const styles: Record<string, React.CSSProperties> = {
     maxWidth: 260,
     lineHeight: 1.4,
   },
+  grid: {
+    display: 'grid',
+    gridTemplateColumns: 'repeat(2, minmax(0, 1fr))',
+    gap: 16,
+    width: '100%',
+  },
+  stat: {
+    display: 'flex',
+    flexDirection: 'column',
+    alignItems: 'center',
+    gap: 4,
+    padding: 16,
+    borderRadius: 12,
+    border: '1px solid #1f2937',
+    background: '#0b1220',
+  },
+  medals: {
+    listStyle: 'none',
+    padding: 0,
+    margin: '16px 0 0',
+    display: 'grid',
+    gridTemplateColumns: 'repeat(auto-fill, minmax(160px, 1fr))',
+    gap: 12,
+    width: '100%',
+  },
+  medal: {
+    display: 'flex',
+    flexDirection: 'column',
+    gap: 4,
+    padding: 12,
+    borderRadius: 12,
+    border: '1px dashed #1e293b',
+    opacity: 0.6,
+  },
+  medalUnlocked: {
+    border: '1px solid #22c55e',
+    opacity: 1,
+  },
+  medalTitle: {
+    color: '#e2e8f0',
+    fontWeight: 600,
+  },
+  value: {
+    color: '#e2e8f0',
+    fontSize: 24,
+    fontWeight: 700,
+  },
+  label: {
+    color: '#94a3b8',
+    fontSize: 13,
+    textAlign: 'center',
+  },
 }
-
@@ -1,5 +1,12 @@
-import { useEffect, useMemo, useState } from 'react'
-import { listTasks, type Task } from '../tasks/api'
+import { useEffect, useState } from 'react'
+import { getDailyStats, listTasksByDate, type DayCounts, type Task } from '../tasks/api'
+
+const formatDateKey = (date: Date) => {
+  const y = date.getFullYear()
+  const m = String(date.getMonth() + 1).padStart(2, '0')
+  const d = String(date.getDate()).padStart(2, '0')
+  return `${y}-${m}-${d}`
+}
 
 export default function SchedulePage() {
   const today = new Date()
@@ -7,17 +14,41 @@ export default function SchedulePage() {
   const [currentYear, setCurrentYear] = useState(today.getFullYear())
   const [hoveredDay, setHoveredDay] = useState<number | null>(null)
   const [selectedDate, setSelectedDate] = useState<Date>(today)
-  const [tasks, setTasks] = useState<Task[]>([])
+  const [tasksByDay, setTasksByDay] = useState<DayCounts>({})
+  const [tasksForSelectedDay, setTasksForSelectedDay] = useState<Task[]>([])
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState<string | null>(null)
 
+  const selectedDateKey = formatDateKey(selectedDate)
+
+  // Contagens por dia do mês visível, agregadas no servidor
+  useEffect(() => {
+    let active = true
+    const from = formatDateKey(new Date(currentYear, currentMonth, 1))
+    const to = formatDateKey(new Date(currentYear, currentMonth + 1, 0))
+    getDailyStats(from, to)
+      .then(days => {
+        if (!active) return
+        setTasksByDay(days)
+      })
+      .catch(err => {
+        if (!active) return
+        setError(err.message || 'Erro ao buscar tarefas')
+      })
+
+    return () => {
+      active = false
+    }
+  }, [currentMonth, currentYear])
+
+  // Só as tarefas do dia selecionado
   useEffect(() => {
     let active = true
     setLoading(true)
-    listTasks()
+    listTasksByDate(selectedDateKey)
       .then(items => {
         if (!active) return
-        setTasks(items)
+        setTasksForSelectedDay(items)
         setError(null)
       })
       .catch(err => {
@@ -32,40 +63,7 @@ export default function SchedulePage() {
     return () => {
       active = false
     }
-  }, [])
-
-  const formatDateKey = (date: Date) => {
-    const y = date.getFullYear()
-    const m = String(date.getMonth() + 1).padStart(2, '0')
-    const d = String(date.getDate()).padStart(2, '0')
-    return `${y}-${m}-${d}`
-  }
-
-  const dateKeyFromString = (iso: string) => {
-    const parsed = new Date(iso)
-    return formatDateKey(parsed)
-  }
-
-  const selectedDateKey = formatDateKey(selectedDate)
-
-  const tasksByDay = useMemo(() => {
-    return tasks.reduce<Record<string, { pendente: number; feita: number }>>((acc, task) => {
-      const key = dateKeyFromString(task.created_at)
-      if (!acc[key]) {
-        acc[key] = { pendente: 0, feita: 0 }
-      }
-      if (task.status === 'pendente') {
-        acc[key].pendente += 1
-      } else if (task.status === 'feita') {
-        acc[key].feita += 1
-      }
-      return acc
-    }, {})
-  }, [tasks])
-
-  const tasksForSelectedDay = useMemo(() => {
-    return tasks.filter(task => dateKeyFromString(task.created_at) === selectedDateKey)
-  }, [selectedDateKey, tasks])
+  }, [selectedDateKey])
 
   const handleDayClick = (date: Date) => {
     setSelectedDate(date)
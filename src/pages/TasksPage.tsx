@@ -1,5 +1,13 @@
-import { useEffect, useState } from 'react'
-import { deleteTask, listTasks, updateTask, updateTaskStatus, type Task } from '../tasks/api'
+import { useEffect, useRef, useState } from 'react'
+import {
+  deleteTask,
+  subscribeTaskChanges,
+  syncTasks,
+  updateTask,
+  updateTaskStatus,
+  type Task,
+  type TaskChangeEvent,
+} from '../tasks/api'
 import TaskListCard from '../components/TaskListCard'
 
 export default function TasksPage() {
@@ -7,15 +15,41 @@ export default function TasksPage() {
   const [loading, setLoading] = useState(false)
   const [message, setMessage] = useState<{ type: 'ok' | 'error'; text: string } | null>(null)
   const [actionId, setActionId] = useState<number | null>(null)
+  // Token do delta sync: recarregar só baixa o que mudou desde a última vez
+  const syncToken = useRef<string | null>(null)
+  const tasksRef = useRef<Task[]>([])
+  tasksRef.current = tasks
 
   useEffect(() => {
     void refresh()
+    // Ao voltar a ficar online só o delta desde o último token é baixado
+    const onOnline = () => void refresh()
+    window.addEventListener('online', onOnline)
+    return () => window.removeEventListener('online', onOnline)
+  }, [])
+
+  // Mudanças feitas em outras abas/dispositivos chegam pelo stream, sem refetch
+  useEffect(() => {
+    return subscribeTaskChanges((event: TaskChangeEvent) => {
+      if (event.type === 'imported') {
+        void refresh()
+        return
+      }
+      setTasks((prev) => {
+        if (event.type === 'deleted') return prev.filter((t) => t.id !== event.routine_id)
+        const item = event.item
+        if (!item) return prev
+        if (prev.some((t) => t.id === item.id)) return prev.map((t) => (t.id === item.id ? item : t))
+        return [item, ...prev]
+      })
+    })
   }, [])
 
   const refresh = async () => {
     setLoading(true)
     try {
-      const data = await listTasks()
+      const { tasks: data, token } = await syncTasks(tasksRef.current, syncToken.current)
+      syncToken.current = token
       setTasks(data)
     } catch (e) {
       setMessage({ type: 'error', text: (e as Error).message || 'Erro ao carregar tarefas.' })
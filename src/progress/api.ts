@@ -0,0 +1,47 @@
+export type Progress = {
+  xp: number
+  level: number
+  next_level_xp: number
+  total_created: number
+  total_done: number
+  current_streak: number
+  best_streak: number
+  last_done_day: string | null
+  today: { created: number; done: number }
+}
+
+export type Achievement = {
+  id: string
+  title: string
+  description: string
+  threshold: number
+  value: number
+  unlocked: boolean
+  unlocked_at: string | null
+}
+
+const API_BASE = import.meta.env.VITE_API_BASE_URL || ''
+
+async function request<T>(path: string, init?: RequestInit): Promise<T> {
+  const res = await fetch(`${API_BASE}${path}`, {
+    credentials: 'include',
+    headers: { 'Content-Type': 'application/json', ...(init?.headers || {}) },
+    ...init,
+  })
+  const body = await res.json()
+  if (!res.ok || body?.ok === false) {
+    const err = body?.error || `HTTP ${res.status}`
+    throw new Error(err)
+  }
+  return body as T
+}
+
+export async function getProgress(): Promise<Progress> {
+  const data = await request<{ ok: boolean; progress: Progress }>('/api/progress')
+  return data.progress
+}
+
+export async function getAchievements(): Promise<Achievement[]> {
+  const data = await request<{ ok: boolean; items: Achievement[] }>('/api/achievements')
+  return data.items ?? []
+}
@@ -39,6 +39,71 @@ export async function listTasks(): Promise<Task[]> {
   return data.items ?? []
 }
 
+export type TaskPage = { items: Task[]; nextCursor: string | null }
+
+export async function listTasksPage(cursor?: string | null, limit = 50): Promise<TaskPage> {
+  const params = new URLSearchParams({ limit: String(limit) })
+  if (cursor) params.set('cursor', cursor)
+  const data = await request<{ ok: boolean; items: Task[]; next_cursor: string | null }>(
+    `/api/routines?${params.toString()}`,
+  )
+  return { items: data.items ?? [], nextCursor: data.next_cursor ?? null }
+}
+
+export type TaskChanges = { items: Task[]; deleted: number[]; next: string; hasMore: boolean; reset: boolean }
+
+export async function getTaskChanges(since?: string | null): Promise<TaskChanges> {
+  const params = new URLSearchParams()
+  if (since) params.set('since', since)
+  const data = await request<{
+    ok: boolean
+    items: Task[]
+    deleted: number[]
+    next: string
+    has_more: boolean
+    reset: boolean
+  }>(`/api/routines/changes?${params.toString()}`)
+  return {
+    items: data.items ?? [],
+    deleted: data.deleted ?? [],
+    next: data.next,
+    hasMore: data.has_more,
+    reset: data.reset,
+  }
+}
+
+// Aplica sobre a lista local só o que mudou desde o token (todas as páginas)
+export async function syncTasks(local: Task[], since?: string | null): Promise<{ tasks: Task[]; token: string }> {
+  const byId = new Map(local.map((t) => [t.id, t]))
+  let token = since ?? null
+  for (;;) {
+    const page = await getTaskChanges(token)
+    if (page.reset) byId.clear()
+    for (const item of page.items) byId.set(item.id, item)
+    for (const id of page.deleted) byId.delete(id)
+    token = page.next
+    if (!page.hasMore) break
+  }
+  const tasks = [...byId.values()].sort((a, b) => b.created_at.localeCompare(a.created_at) || b.id - a.id)
+  return { tasks, token }
+}
+
+export type DayCounts = Record<string, { pendente: number; feita: number }>
+
+const browserTimeZone = () => Intl.DateTimeFormat().resolvedOptions().timeZone || 'UTC'
+
+export async function getDailyStats(from: string, to: string): Promise<DayCounts> {
+  const params = new URLSearchParams({ from, to, tz: browserTimeZone() })
+  const data = await request<{ ok: boolean; days: DayCounts }>(`/api/routines/stats/daily?${params.toString()}`)
+  return data.days ?? {}
+}
+
+export async function listTasksByDate(date: string): Promise<Task[]> {
+  const params = new URLSearchParams({ date, tz: browserTimeZone() })
+  const data = await request<{ ok: boolean; items: Task[] }>(`/api/routines?${params.toString()}`)
+  return data.items ?? []
+}
+
 export async function updateTask(input: TaskUpdateInput): Promise<Task> {
   const payload = { id: input.id, title: input.title.trim() }
   if (!payload.id || !payload.title) throw new Error('Id e título são obrigatórios')
@@ -70,3 +135,107 @@ export async function updateTaskStatus(id: number, status: 'pendente' | 'feita')
   return data.item
 }
 
+
+export type TaskBatchOp =
+  | { op: 'create'; title: string }
+  | { op: 'update'; id: number; title: string }
+  | { op: 'status'; id: number; status: 'pendente' | 'feita' }
+  | { op: 'delete'; id: number }
+export type TaskBatchResult = { ok: boolean; item?: Task; deleted_id?: number; error?: string }
+
+export async function batchTasks(ops: TaskBatchOp[]): Promise<TaskBatchResult[]> {
+  if (ops.length === 0) return []
+
+  const data = await request<{ ok: boolean; results: TaskBatchResult[] }>('/api/routines/batch', {
+    method: 'POST',
+    body: JSON.stringify({ ops }),
+  })
+  return data.results
+}
+
+export type RecurrenceKind = 'daily' | 'weekdays' | 'every_n' | 'weekly'
+export type Recurrence = {
+  id: number
+  title: string
+  kind: RecurrenceKind
+  interval_days: number
+  weekdays: number[]
+  start_date: string
+  end_date: string | null
+  tz: string
+}
+export type RecurrenceInput = {
+  title: string
+  kind: RecurrenceKind
+  interval_days?: number
+  weekdays?: number[]
+  start_date?: string
+  end_date?: string | null
+}
+export type RangeTask = Omit<Task, 'id'> & {
+  id: number | null
+  recurrence_id: number | null
+  occurrence_date: string | null
+  virtual: boolean
+}
+
+export async function createRecurrence(input: RecurrenceInput): Promise<Recurrence> {
+  const payload = { ...input, title: input.title.trim(), tz: browserTimeZone() }
+  if (!payload.title) throw new Error('Título é obrigatório')
+
+  const data = await request<{ ok: boolean; item: Recurrence }>('/api/recurrences', {
+    method: 'POST',
+    body: JSON.stringify(payload),
+  })
+  return data.item
+}
+
+export async function listRecurrences(): Promise<Recurrence[]> {
+  const data = await request<{ ok: boolean; items: Recurrence[] }>('/api/recurrences')
+  return data.items ?? []
+}
+
+export async function deleteRecurrence(id: number): Promise<number> {
+  const data = await request<{ ok: boolean; deleted_id: number }>('/api/recurrences', {
+    method: 'DELETE',
+    body: JSON.stringify({ id }),
+  })
+  return data.deleted_id
+}
+
+export async function listTasksRange(from: string, to: string): Promise<RangeTask[]> {
+  const params = new URLSearchParams({ from, to, tz: browserTimeZone() })
+  const data = await request<{ ok: boolean; items: RangeTask[] }>(`/api/routines/range?${params.toString()}`)
+  return data.items ?? []
+}
+
+export async function updateOccurrenceStatus(
+  recurrenceId: number,
+  date: string,
+  status: 'pendente' | 'feita',
+): Promise<Task> {
+  const data = await request<{ ok: boolean; item: Task }>('/api/routines/status', {
+    method: 'PATCH',
+    body: JSON.stringify({ recurrence_id: recurrenceId, date, status }),
+  })
+  return data.item
+}
+
+export type TaskChangeEvent =
+  | {
+      type: 'created' | 'updated' | 'status' | 'deleted'
+      routine_id: number
+      item: Task | null
+    }
+  // Import em massa: um evento só para o lote, o cliente re-sincroniza
+  | { type: 'imported'; routine_id: 0; item: { count: number } }
+
+// Abre o stream SSE; o EventSource reconecta sozinho enviando Last-Event-ID
+export function subscribeTaskChanges(onChange: (event: TaskChangeEvent) => void): () => void {
+  const source = new EventSource(`${API_BASE}/api/routines/stream`, { withCredentials: true })
+  const handler = (e: MessageEvent) => onChange(JSON.parse(e.data) as TaskChangeEvent)
+  for (const type of ['created', 'updated', 'status', 'deleted', 'imported']) {
+    source.addEventListener(type, handler)
+  }
+  return () => source.close()
+}
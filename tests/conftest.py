@@ -0,0 +1,136 @@
+import http.client
+import json
+import os
+import sys
+import threading
+import uuid
+
+import psycopg
+import pytest
+from psycopg.conninfo import make_conninfo
+
+# Os módulos da API se importam pelo nome (como em `python api/routines.py`)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api"))
+
+
+@pytest.fixture
+def handler():
+    """Handler sem socket, para testar os helpers que só leem self.headers"""
+    import routines
+
+    inst = routines.handler.__new__(routines.handler)
+    inst.headers = {}
+    return inst
+
+
+# -------- Postgres --------
+@pytest.fixture(scope="session")
+def pg_url():
+    """Schema descartável no Postgres de DATABASE_URL, já migrado; sem a variável os
+    testes de banco são pulados. O search_path vai na conninfo, então o pool da API
+    e os scripts enxergam só esse schema."""
+    from _lib.db import get_db_url, normalize_db_url
+    from _lib.migrations import run_migrations
+
+    url = get_db_url()
+    if not url:
+        pytest.skip("DATABASE_URL não configurado")
+    base = normalize_db_url(url)
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    with psycopg.connect(base, autocommit=True) as conn:
+        conn.execute(f"CREATE SCHEMA {schema}")
+    url = make_conninfo(base, options=f"-c search_path={schema}")
+    try:
+        with psycopg.connect(url) as conn:
+            run_migrations(conn)
+        yield url
+    finally:
+        with psycopg.connect(base, autocommit=True) as conn:
+            conn.execute(f"DROP SCHEMA {schema} CASCADE")
+
+
+@pytest.fixture
+def pg(pg_url):
+    with psycopg.connect(pg_url) as conn:
+        yield conn
+
+
+@pytest.fixture
+def user(pg):
+    """Usuário novo por teste: os testes de banco isolam os dados pelo uid"""
+    tag = uuid.uuid4().hex[:12]
+    uid = pg.execute(
+        "INSERT INTO users(provider, provider_id, email, name, picture) VALUES('google', %s, %s, 'Teste', '')"
+        " RETURNING id",
+        (tag, f"{tag}@teste"),
+    ).fetchone()[0]
+    pg.commit()
+    return uid
+
+
+class App:
+    """Cliente HTTP de um servidor threaded real, com sessão assinada por uid"""
+
+    def __init__(self, port: int):
+        self.port = port
+
+    def cookie(self, uid: int) -> str:
+        import routines
+
+        inst = routines.handler.__new__(routines.handler)
+        return "session=" + inst._jwt_sign({"uid": uid, "email": f"{uid}@teste", "name": "Teste"})
+
+    def request(self, method: str, path: str, body=None, uid: int | None = None, headers: dict | None = None):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=10)
+        hd = dict(headers or {})
+        if uid is not None:
+            hd["Cookie"] = self.cookie(uid)
+        if body is not None:
+            body = json.dumps(body).encode()
+            hd["Content-Type"] = "application/json"
+        try:
+            conn.request(method, path, body=body, headers=hd)
+            resp = conn.getresponse()
+            data = resp.read()
+        finally:
+            conn.close()
+        return resp.status, json.loads(data) if data else None
+
+
+@pytest.fixture
+def serve(pg_url, monkeypatch):
+    """Sobe servidores reais (modo e workers à escolha) contra o schema de teste"""
+    import routines
+    from _lib import changes, db, ratelimit
+    from _lib.changes import ChangeHub
+    from _lib.server import make_server
+
+    monkeypatch.setenv("DATABASE_URL", pg_url)
+    monkeypatch.setenv("JWT_SECRET", "segredo-de-teste")
+    monkeypatch.delenv("JWT_KEYS", raising=False)
+    monkeypatch.setattr(routines, "_jwt_keys", None)
+    monkeypatch.setattr(ratelimit, "limiter", None)
+    monkeypatch.setattr(db, "replicas", db.ReplicaSet([]))
+    monkeypatch.setattr(changes, "hub", ChangeHub())
+    db.close_pool()
+    servers = []
+
+    def start(mode: str = "threaded", workers: int = 4) -> App:
+        srv = make_server(mode, "127.0.0.1", 0, routines.handler, workers, 16)
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        servers.append(srv)
+        return App(srv.server_port)
+
+    try:
+        yield start
+    finally:
+        for srv in servers:
+            srv.shutdown()
+            if hasattr(srv, "server_close"):
+                srv.server_close()
+        db.close_pool()
+
+
+@pytest.fixture
+def app(serve):
+    return serve()
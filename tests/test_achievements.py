@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from _lib import progress
+from _lib.progress import ProgressDeltas, apply_progress, evaluate_achievements, lock_progress
+from _lib.settings import ACHIEVEMENTS_VERSION, PROGRESS_TZ
+
+DAY = datetime(2026, 3, 10, 12, tzinfo=ZoneInfo(PROGRESS_TZ))
+
+
+def _apply(pg, uid, deltas):
+    with pg.transaction(), pg.cursor() as cur:
+        return apply_progress(cur, uid, lock_progress(cur, uid), deltas)[1]
+
+
+def _done_on(*offsets, status="feita"):
+    deltas = ProgressDeltas()
+    for i in offsets:
+        deltas.created(DAY + timedelta(days=i), status)
+    return deltas
+
+
+def test_unlocks_when_a_counter_crosses_its_threshold(pg, user):
+    # Primeira escrita: avaliação completa contra o catálogo atual
+    assert sorted(_apply(pg, user, _done_on(0))) == ["first_done", "perfect_day"]
+    assert pg.execute(
+        "SELECT achievements_version FROM user_progress WHERE user_id = %s", (user,)
+    ).fetchone()[0] == ACHIEVEMENTS_VERSION
+    # Dia com rotina pendente não é dia completo; nada se repete
+    assert _apply(pg, user, _done_on(1, status="pendente")) == []
+    assert _apply(pg, user, _done_on(1)) == []
+    assert _apply(pg, user, _done_on(2)) == ["streak_3"]
+    unlocked = {r[0] for r in pg.execute("SELECT achievement_id FROM user_achievements WHERE user_id = %s", (user,))}
+    assert unlocked == {"first_done", "perfect_day", "streak_3"}
+
+
+def test_new_catalog_version_reevaluates_once(pg, user, monkeypatch):
+    _apply(pg, user, _done_on(0, 1, 2))
+    pg.execute("DELETE FROM user_achievements WHERE user_id = %s AND achievement_id = 'streak_3'", (user,))
+    pg.commit()
+    # Contador já passou do limite antes da regra existir: só a avaliação completa a pega
+    monkeypatch.setattr(progress, "ACHIEVEMENTS_VERSION", ACHIEVEMENTS_VERSION + 1)
+    with pg.transaction(), pg.cursor() as cur:
+        p = lock_progress(cur, user)
+        assert evaluate_achievements(cur, user, p, p, []) == ["streak_3"]
+        assert evaluate_achievements(cur, user, p, p, []) == []
+
+
+def test_achievements_endpoint(app, user):
+    rid = app.request("POST", "/api/routines", {"title": "r"}, uid=user)[1]["item"]["id"]
+    status, body = app.request("PATCH", f"/api/routines/{rid}/status", {"status": "feita"}, uid=user)
+    assert sorted(body["unlocked"]) == ["first_done", "perfect_day"]
+    status, body = app.request("GET", "/api/achievements", uid=user)
+    assert status == 200
+    items = {i["id"]: i for i in body["items"]}
+    assert items["first_done"]["unlocked"] and items["first_done"]["value"] == 1
+    assert not items["done_10"]["unlocked"] and items["done_10"]["value"] == 1
@@ -0,0 +1,109 @@
+from datetime import date, datetime, timedelta, timezone
+
+from _lib.maintenance import archive_routines
+from _lib.progress import lock_progress
+from _lib.settings import XP_PER_DONE
+
+OLD = datetime(2020, 3, 10, 12, tzinfo=timezone.utc)
+
+
+def _insert(pg, uid, title, status, created_at, imported=False):
+    return pg.execute(
+        "INSERT INTO routines(user_id, title, status, created_at, imported) VALUES(%s, %s, %s, %s, %s) RETURNING id",
+        (uid, title, status, created_at, imported),
+    ).fetchone()[0]
+
+
+def test_backfill_counts_routines_archived_before_it(pg, user):
+    # Três dias seguidos feitos (arquivados), um importado nunca tocado e um pendente ativo
+    for i in range(3):
+        _insert(pg, user, f"old{i}", "feita", OLD + timedelta(days=i))
+    _insert(pg, user, "importada", "feita", OLD, imported=True)
+    _insert(pg, user, "hoje", "pendente", datetime.now(timezone.utc))
+    pg.commit()
+    assert archive_routines(pg, date(2021, 1, 1)) >= 4
+    assert pg.execute("SELECT count(*) FROM routines WHERE user_id = %s", (user,)).fetchone()[0] == 1
+    assert pg.execute("SELECT count(*) FROM user_progress WHERE user_id = %s", (user,)).fetchone()[0] == 0
+
+    with pg.cursor() as cur:
+        progress = lock_progress(cur, user)
+    assert progress["total_created"] == 4
+    assert progress["total_done"] == 3
+    assert progress["xp"] == 3 * XP_PER_DONE
+    assert progress["best_streak"] == 3
+    assert progress["last_done_day"] == date(2020, 3, 12)
+
+
+def _archived(pg, user, n):
+    ids = [_insert(pg, user, f"arq{i}", "feita", OLD + timedelta(days=i)) for i in range(n)]
+    pg.commit()
+    archive_routines(pg, date(2021, 1, 1))
+    return ids
+
+
+def _progress(pg, user):
+    return pg.execute("SELECT total_created, total_done FROM user_progress WHERE user_id = %s", (user,)).fetchone()
+
+
+def test_archived_routines_stay_editable(app, pg, user):
+    rid, other, gone = _archived(pg, user, 3)
+    assert app.request("GET", "/api/progress", uid=user)[0] == 200
+    assert _progress(pg, user) == (3, 3)
+    _, body = app.request("GET", "/api/routines/changes", uid=user)
+    token = body["next"]
+
+    status, body = app.request("PATCH", f"/api/routines/{rid}/status", {"status": "pendente"}, uid=user)
+    assert status == 200 and body["item"]["status"] == "pendente"
+    status, body = app.request("PUT", f"/api/routines/{other}", {"title": "renomeada"}, uid=user)
+    assert status == 200 and body["item"]["title"] == "renomeada"
+    status, body = app.request("DELETE", f"/api/routines/{gone}", uid=user)
+    assert status == 200 and body["deleted_id"] == gone
+    pg.commit()
+    assert _progress(pg, user) == (2, 1)
+    assert pg.execute("SELECT count(*) FROM routines_archive WHERE user_id = %s", (user,)).fetchone()[0] == 0
+
+    _, body = app.request("GET", "/api/routines", uid=user)
+    assert {(i["id"], i["title"], i["status"]) for i in body["items"]} == {
+        (rid, "arq0", "pendente"), (other, "renomeada", "feita"),
+    }
+    # Quem já tinha sincronizado recebe as três mudanças
+    _, body = app.request("GET", f"/api/routines/changes?since={token}", uid=user)
+    assert {i["id"] for i in body["items"]} == {rid, other}
+    assert body["deleted"] == [gone]
+
+
+def test_batch_on_archived_routines(app, pg, user):
+    rid, gone = _archived(pg, user, 2)
+    ops = [
+        {"op": "update", "id": rid, "title": "nova"},
+        {"op": "status", "id": rid, "status": "pendente"},
+        {"op": "delete", "id": gone},
+        {"op": "delete", "id": gone},
+    ]
+    status, body = app.request("POST", "/api/routines/batch", {"ops": ops}, uid=user)
+    assert status == 200
+    assert [r["ok"] for r in body["results"]] == [True, True, True, False]
+    assert body["results"][1]["item"] == {**body["results"][1]["item"], "title": "nova", "status": "pendente"}
+
+
+def test_partition_takes_over_rows_from_default(pg, user):
+    from _lib.maintenance import add_months, ensure_partitions, partition_name
+
+    # Mês fora do horizonte: a linha cai na DEFAULT (como um dia futuro materializado)
+    ahead = 40
+    month = add_months(datetime.now(timezone.utc).date().replace(day=1), ahead)
+    rid = _insert(pg, user, "futura", "pendente", datetime(month.year, month.month, 5, 12, tzinfo=timezone.utc))
+    pg.commit()
+    where = "SELECT tableoid::regclass::text, change_rev FROM routines WHERE id = %s"
+    table, rev = pg.execute(where, (rid,)).fetchone()
+    assert table == "routines_default"
+    events = pg.execute("SELECT count(*) FROM routine_events WHERE user_id = %s", (user,)).fetchone()[0]
+
+    assert partition_name(month) in ensure_partitions(pg, months_ahead=ahead)
+    assert pg.execute(where, (rid,)).fetchone() == (partition_name(month), rev)
+    assert pg.execute("SELECT count(*) FROM routine_events WHERE user_id = %s", (user,)).fetchone()[0] == events
+    # A partição anexada herdou PK, FKs e triggers da tabela pai
+    pg.execute("UPDATE routines SET status = 'feita' WHERE id = %s", (rid,))
+    pg.commit()
+    assert pg.execute(where, (rid,)).fetchone()[1] > rev
+    assert ensure_partitions(pg, months_ahead=ahead) == []
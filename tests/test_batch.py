@@ -0,0 +1,32 @@
+import psycopg
+from psycopg import pq
+
+
+def test_batch_runs_ops_in_order_and_closes_cursors(app, user, monkeypatch):
+    ids = [app.request("POST", "/api/routines", {"title": t}, uid=user)[1]["item"]["id"] for t in ("a", "b")]
+    opened = []
+    cursor = psycopg.Connection.cursor
+
+    def tracking_cursor(conn, *args, **kwargs):
+        cur = cursor(conn, *args, **kwargs)
+        if conn.pgconn.pipeline_status == pq.PipelineStatus.ON:
+            opened.append(cur)  # cursores das operações do batch
+        return cur
+
+    monkeypatch.setattr(psycopg.Connection, "cursor", tracking_cursor)
+    ops = [
+        {"op": "status", "id": ids[0], "status": "feita"},
+        {"op": "update", "id": ids[1], "title": "b2"},
+        {"op": "delete", "id": ids[0]},
+        {"op": "create", "title": "c"},
+        {"op": "status", "id": ids[0], "status": "pendente"},
+    ]
+    status, body = app.request("POST", "/api/routines/batch", {"ops": ops}, uid=user)
+    assert status == 200
+    assert [r["ok"] for r in body["results"]] == [True, True, True, True, False]
+    assert body["results"][0]["item"]["status"] == "feita"
+    assert body["results"][2] == {"ok": True, "deleted_id": ids[0]}
+    assert opened and all(cur.closed for cur in opened)
+
+    _, listed = app.request("GET", "/api/routines", uid=user)
+    assert sorted(i["title"] for i in listed["items"]) == ["b2", "c"]
@@ -0,0 +1,50 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from _lib.bulk import import_row, parse_import
+
+NOW = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def test_parse_ndjson_across_blocks():
+    blocks = [b'{"title": "a"}\n\n{"ti', b'tle": "b"}\nnao e json\n{"title": "c"}']
+    assert list(parse_import(blocks, "ndjson")) == [
+        (1, {"title": "a"}), (3, {"title": "b"}), (4, None), (5, {"title": "c"}),
+    ]
+
+
+def test_parse_csv_with_bom():
+    blocks = ["\ufefftitle,status\nlavar,feita\n\"com, vírgula\",\n".encode()]
+    records = list(parse_import(blocks, "csv"))
+    assert [r for _, r in records] == [
+        {"title": "lavar", "status": "feita"},
+        {"title": "com, vírgula", "status": ""},
+    ]
+    assert [n for n, _ in records] == [2, 3]
+
+
+def test_import_row_defaults():
+    assert import_row({"title": "  ler  "}, NOW) == ("ler", "pendente", NOW)
+
+
+def test_import_row_created_at():
+    _, status, created_at = import_row({"title": "x", "status": "feita", "created_at": "2024-02-03 04:05:06+00"}, NOW)
+    assert status == "feita"
+    assert created_at == datetime(2024, 2, 3, 4, 5, 6, tzinfo=timezone.utc)
+    _, _, created_at = import_row({"title": "x", "created_at": "2024-02-03T04:05:06Z"}, NOW)
+    assert created_at == datetime(2024, 2, 3, 4, 5, 6, tzinfo=timezone.utc)
+    _, _, created_at = import_row({"title": "x", "created_at": "2024-02-03T04:05:06"}, NOW)
+    assert created_at.tzinfo is not None
+
+
+@pytest.mark.parametrize("record, error", [
+    (None, "registro inválido"),
+    (["x"], "registro inválido"),
+    ({"title": "  "}, "title é obrigatório"),
+    ({"title": "x", "status": "talvez"}, "status deve ser pendente ou feita"),
+    ({"title": "x", "created_at": "ontem"}, "created_at inválido"),
+])
+def test_import_row_errors(record, error):
+    with pytest.raises(ValueError, match=error):
+        import_row(record, NOW)
@@ -0,0 +1,88 @@
+import socket
+
+from _lib.maintenance import prune_events
+
+
+def test_events_are_pruned_without_any_stream(pg, user):
+    # Cada escrita grava um evento, mesmo sem ninguém ouvindo
+    pg.execute("INSERT INTO routines(user_id, title) VALUES(%s, 'a'), (%s, 'b')", (user, user))
+    pg.execute("UPDATE routine_events SET created_at = NOW() - interval '30 days' WHERE user_id = %s "
+               "AND id = (SELECT min(id) FROM routine_events WHERE user_id = %s)", (user, user))
+    pg.commit()
+    assert prune_events(pg) >= 1
+    rows = pg.execute("SELECT type FROM routine_events WHERE user_id = %s", (user,)).fetchall()
+    assert rows == [("created",)]
+
+
+def _open_stream(app, uid, last_id=None):
+    s = socket.create_connection(("127.0.0.1", app.port), timeout=10)
+    headers = f"Cookie: {app.cookie(uid)}\r\n"
+    if last_id is not None:
+        headers += f"Last-Event-ID: {last_id}\r\n"
+    s.sendall(f"GET /api/routines/stream HTTP/1.1\r\nHost: x\r\n{headers}\r\n".encode())
+    return s
+
+
+def _read_until(s, marker: bytes) -> bytes:
+    data = b""
+    while marker not in data:
+        chunk = s.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def test_async_streams_do_not_hold_workers(serve, user):
+    app = serve("async", workers=2)
+    streams = [_open_stream(app, user) for _ in range(4)]
+    try:
+        for s in streams:
+            assert _read_until(s, b"retry: 3000").startswith(b"HTTP/1.1 200")
+        # Quatro streams abertos com dois workers: o resto da API segue respondendo
+        status, body = app.request("POST", "/api/routines", {"title": "nova"}, uid=user)
+        assert status == 201
+        for s in streams:
+            assert b'"routine_id":%d' % body["item"]["id"] in _read_until(s, b"event: created")
+    finally:
+        for s in streams:
+            s.close()
+
+
+def test_full_stream_asks_the_client_to_retry(serve, user, monkeypatch):
+    import routines
+
+    monkeypatch.setattr(routines, "SSE_MAX_CLIENTS", 1)
+    app = serve("async")
+    first = _open_stream(app, user)
+    try:
+        _read_until(first, b"retry: 3000")
+        extra = _open_stream(app, user)
+        data = _read_until(extra, b"\0")  # até o servidor fechar
+        extra.close()
+        # 200 + retry: o EventSource reconecta depois, em vez de desistir como num 503
+        assert data.startswith(b"HTTP/1.1 200") and b"retry: 30000" in data
+    finally:
+        first.close()
+
+
+def test_stream_resets_when_the_replay_gap_was_pruned(app, pg, user):
+    ids = []
+    for title in ("a", "b", "c"):
+        app.request("POST", "/api/routines", {"title": title}, uid=user)
+        ids.append(pg.execute("SELECT max(id) FROM routine_events WHERE user_id = %s", (user,)).fetchone()[0])
+        pg.commit()
+    # Tudo o que é anterior a "c" passa da retenção
+    pg.execute("UPDATE routine_events SET created_at = NOW() - interval '30 days' WHERE id < %s", (ids[2],))
+    pg.commit()
+    prune_events(pg)
+
+    s = _open_stream(app, user, last_id=ids[1])
+    data = _read_until(s, b"event: created")
+    s.close()
+    assert b"id: %d\nevent: created" % ids[2] in data and b"event: reset" not in data
+
+    s = _open_stream(app, user, last_id=ids[0])
+    data = _read_until(s, b"event: reset")
+    s.close()
+    assert b"id: %d\nevent: reset" % ids[2] in data and b"event: created" not in data
@@ -0,0 +1,16 @@
+ETAG = '"abc123"'
+
+
+def test_etag_without_header(handler):
+    assert not handler._etag_matches(ETAG)
+
+
+def test_etag_matches(handler):
+    for inm in (ETAG, '"outra", "abc123-gzip"', '"abc123-br"', "*"):
+        handler.headers = {"If-None-Match": inm}
+        assert handler._etag_matches(ETAG), inm
+
+
+def test_etag_mismatch(handler):
+    handler.headers = {"If-None-Match": '"abc12"'}
+    assert not handler._etag_matches(ETAG)
@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+import routines
+
+
+@pytest.fixture
+def h(handler, monkeypatch):
+    monkeypatch.setenv("JWT_SECRET", "segredo-de-teste")
+    monkeypatch.delenv("JWT_KEYS", raising=False)
+    monkeypatch.delenv("JWT_ACTIVE_KID", raising=False)
+    monkeypatch.setattr(routines, "_jwt_keys", None)
+    monkeypatch.setattr(routines, "_token_cache", routines.TokenCache(16))
+    return handler
+
+
+def test_jwt_roundtrip(h):
+    token = h._jwt_sign({"uid": 5, "email": "a@b"})
+    payload = h._jwt_verify(token)
+    assert payload["uid"] == 5 and payload["exp"] > time.time()
+
+
+def test_jwt_rejects_tampered_signature(h):
+    token = h._jwt_sign({"uid": 5})
+    h64, p64, s64 = token.split(".")
+    forged = h._jwt_sign({"uid": 6}).split(".")[1]
+    with pytest.raises(ValueError):
+        h._jwt_verify(f"{h64}.{forged}.{s64}")
+    with pytest.raises(ValueError):
+        h._jwt_verify(f"{h64}.{p64}")
+
+
+def test_jwt_rejects_expired(h, monkeypatch):
+    monkeypatch.setattr(routines, "JWT_EXP_SECONDS", -10)
+    with pytest.raises(ValueError, match="expirado"):
+        h._jwt_verify(h._jwt_sign({"uid": 5}))
+
+
+def test_jwt_key_rotation(h, monkeypatch):
+    old = h._jwt_sign({"uid": 5})
+    monkeypatch.setenv("JWT_KEYS", "k2:segredo-novo")
+    monkeypatch.setattr(routines, "_jwt_keys", None)
+    new = h._jwt_sign({"uid": 5})
+    assert routines._get_jwt_keys().active_kid == "k2"
+    # Tokens sem kid (JWT_SECRET) continuam válidos durante a rotação
+    assert h._jwt_verify(old)["uid"] == 5
+    assert h._jwt_verify(new)["uid"] == 5
+
+
+def test_session_from_cookie(h):
+    h.headers = {"Cookie": f"theme=dark; session={h._jwt_sign({'uid': 8})}"}
+    assert h._get_session()["uid"] == 8
+    h.headers = {"Cookie": "session=lixo"}
+    assert h._get_session() is None
+
+
+def test_token_cache_lru():
+    cache = routines.TokenCache(2)
+    exp = int(time.time()) + 60
+    for tok in ("a", "b"):
+        cache.put(tok, {"exp": exp})
+    assert cache.get("a") is not None
+    cache.put("c", {"exp": exp})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    cache.put("old", {"exp": 0})
+    assert cache.get("old") is None
@@ -0,0 +1,39 @@
+import re
+import socket
+import threading
+
+import pytest
+
+from _lib import ratelimit
+import routines
+from _lib.server import make_server
+
+SMUGGLED = b"GET /metrics HTTP/1.1\r\nHost: x\r\n\r\n"
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(ratelimit, "limiter", None)
+    srv = make_server("threaded", "127.0.0.1", 0, routines.handler, 4, 16)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.mark.parametrize("framing, body", [
+    (b"Content-Length: %d\r\n" % len(SMUGGLED), SMUGGLED),
+    (b"Transfer-Encoding: chunked\r\n", b"%x\r\n%s\r\n0\r\n\r\n" % (len(SMUGGLED), SMUGGLED)),
+], ids=["content-length", "chunked"])
+def test_unread_body_is_not_parsed_as_request(server, framing, body):
+    # Corpo de uma rota inexistente não pode virar o próximo pedido do keep-alive
+    request = b"POST /nope HTTP/1.1\r\nHost: x\r\n" + framing + b"\r\n" + body
+    follow = b"GET /health HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n"
+    with socket.create_connection(("127.0.0.1", server.server_port), timeout=5) as s:
+        s.sendall(request + follow)
+        data = b""
+        while chunk := s.recv(65536):
+            data += chunk
+    assert re.findall(rb"HTTP/1\.[01] (\d{3})", data) == [b"404", b"200"]
+    assert b"http_requests_total" not in data
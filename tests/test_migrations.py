@@ -0,0 +1,54 @@
+import threading
+import uuid
+
+import psycopg
+import pytest
+from psycopg.conninfo import make_conninfo
+
+from _lib import migrations
+from _lib.migrations import MIGRATIONS, MIGRATIONS_LOCK_ID, run_migrations
+
+
+def test_versions_are_sequential():
+    assert [m[0] for m in MIGRATIONS] == list(range(1, len(MIGRATIONS) + 1))
+
+
+def test_migrations_run_once(pg):
+    assert run_migrations(pg) == []
+    versions = [r[0] for r in pg.execute("SELECT version FROM schema_migrations ORDER BY version")]
+    assert versions == [m[0] for m in MIGRATIONS]
+
+
+def test_failed_migration_rolls_back_and_releases_the_lock(pg, pg_url, monkeypatch):
+    bad = (len(MIGRATIONS) + 1, "quebrada", ["CREATE TABLE migration_probe (x INT)", "SELECT 1/0"])
+    monkeypatch.setattr(migrations, "MIGRATIONS", MIGRATIONS + [bad])
+    with pytest.raises(psycopg.errors.DivisionByZero):
+        run_migrations(pg)
+    assert pg.execute("SELECT to_regclass('migration_probe')").fetchone()[0] is None
+    assert pg.execute("SELECT 1 FROM schema_migrations WHERE version = %s", (bad[0],)).fetchone() is None
+    with psycopg.connect(pg_url, autocommit=True) as other:
+        assert other.execute("SELECT pg_try_advisory_lock(%s)", (MIGRATIONS_LOCK_ID,)).fetchone()[0]
+
+
+def test_concurrent_runs_apply_each_version_once(pg_url):
+    # Schema vazio à parte: as duas instâncias sobem juntas e disputam as migrações
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    with psycopg.connect(pg_url, autocommit=True) as conn:
+        conn.execute(f"CREATE SCHEMA {schema}")
+    url = make_conninfo(pg_url, options=f"-c search_path={schema}")
+    results = []
+
+    def migrate():
+        with psycopg.connect(url) as conn:
+            results.append(run_migrations(conn))
+
+    try:
+        threads = [threading.Thread(target=migrate) for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert sorted(results[0] + results[1]) == [m[0] for m in MIGRATIONS]
+    finally:
+        with psycopg.connect(pg_url, autocommit=True) as conn:
+            conn.execute(f"DROP SCHEMA {schema} CASCADE")
@@ -0,0 +1,132 @@
+import hashlib
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from _lib.oidc import _SHA256_DIGEST_INFO, HTTPClient, rsa_pkcs1_sha256_verify
+
+
+def _is_probable_prime(n: int, rng: random.Random) -> bool:
+    if n < 2:
+        return False
+    for p in (2, 3, 5, 7, 11, 13, 17, 19, 23, 29):
+        if n % p == 0:
+            return n == p
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d, s = d // 2, s + 1
+    for _ in range(24):
+        x = pow(rng.randrange(2, n - 1), d, n)
+        if x in (1, n - 1):
+            continue
+        for _ in range(s - 1):
+            x = pow(x, 2, n)
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def _prime(bits: int, rng: random.Random) -> int:
+    while True:
+        p = rng.getrandbits(bits) | (1 << (bits - 1)) | 1
+        if _is_probable_prime(p, rng):
+            return p
+
+
+def _keypair(e: int = 65537):
+    rng = random.Random(1234)
+    while True:
+        p, q = _prime(512, rng), _prime(512, rng)
+        phi = (p - 1) * (q - 1)
+        if p != q and phi % e:
+            return p * q, e, pow(e, -1, phi)
+
+
+N, E, D = _keypair()
+
+
+def _sign(msg: bytes) -> bytes:
+    k = (N.bit_length() + 7) // 8
+    t = _SHA256_DIGEST_INFO + hashlib.sha256(msg).digest()
+    em = b"\x00\x01" + b"\xff" * (k - len(t) - 3) + b"\x00" + t
+    return pow(int.from_bytes(em, "big"), D, N).to_bytes(k, "big")
+
+
+def test_valid_signature():
+    msg = b"header.payload"
+    assert rsa_pkcs1_sha256_verify(N, E, msg, _sign(msg))
+
+
+def test_tampered_message():
+    assert not rsa_pkcs1_sha256_verify(N, E, b"header.payload2", _sign(b"header.payload"))
+
+
+def test_tampered_signature():
+    sig = bytearray(_sign(b"header.payload"))
+    sig[-1] ^= 1
+    assert not rsa_pkcs1_sha256_verify(N, E, b"header.payload", bytes(sig))
+
+
+def test_wrong_length():
+    sig = _sign(b"header.payload")
+    assert not rsa_pkcs1_sha256_verify(N, E, b"header.payload", sig[1:])
+    assert not rsa_pkcs1_sha256_verify(N, E, b"header.payload", b"\x00" + sig)
+
+
+class _Upstream(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    posts = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._reply(b"ok")
+        # /drop: responde como keep-alive e fecha o socket em seguida (ocioso expirado)
+        self.close_connection = self.path == "/drop"
+
+    def do_POST(self):
+        type(self).posts += 1
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path == "/slow":
+            time.sleep(1)
+        self._reply(b"posted")
+
+    def _reply(self, body: bytes):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def upstream():
+    _Upstream.posts = 0
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Upstream)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_port}"
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_stale_keepalive_is_retried_once(upstream):
+    client = HTTPClient(timeout=2, retries=0)
+    assert client.request("GET", f"{upstream}/drop") == (200, b"ok")
+    time.sleep(0.1)
+    assert client.request("POST", f"{upstream}/token", body=b"code=x", idempotent=False) == (200, b"posted")
+    assert _Upstream.posts == 1
+
+
+def test_timeout_on_reused_socket_is_not_replayed(upstream):
+    client = HTTPClient(timeout=0.3, retries=3)
+    assert client.request("GET", f"{upstream}/ok") == (200, b"ok")
+    with pytest.raises(TimeoutError):
+        client.request("POST", f"{upstream}/slow", body=b"code=x", idempotent=False)
+    time.sleep(0.1)
+    assert _Upstream.posts == 1
@@ -0,0 +1,23 @@
+from datetime import datetime, timezone
+
+
+def test_cursor_roundtrip(handler):
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    cursor = handler._encode_cursor(created_at, 99)
+    assert "=" not in cursor
+    assert handler._decode_cursor(cursor) == (created_at, 99)
+
+
+def test_pages_follow_the_cursor(app, pg, user):
+    for i in range(5):
+        assert app.request("POST", "/api/routines", {"title": f"r{i}"}, uid=user)[0] == 201
+    seen = []
+    path = "/api/routines?limit=2"
+    while True:
+        status, body = app.request("GET", path, uid=user)
+        assert status == 200
+        seen += [item["title"] for item in body["items"]]
+        if not body["next_cursor"]:
+            break
+        path = f"/api/routines?limit=2&cursor={body['next_cursor']}"
+    assert seen == [f"r{i}" for i in reversed(range(5))]
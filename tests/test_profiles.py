@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+from _lib import profiles
+from _lib.profiles import ProfileCache
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    c = ProfileCache(2, 60)
+    monkeypatch.setattr(c, "_ensure_listener", lambda: None)
+    c._set_listening(True)
+    return c
+
+
+def test_stale_generation_is_not_cached(cache):
+    generation = cache.generation()
+    # Uma escrita invalidou o perfil enquanto a leitura corria: o valor lido é velho
+    cache.invalidate(1)
+    cache.put(1, ("velho",), generation)
+    assert cache.get(1) is None
+    cache.put(1, ("novo",), cache.generation())
+    assert cache.get(1) == ("novo",)
+
+
+def test_nothing_is_cached_without_the_listener(cache):
+    cache._set_listening(False)
+    cache.put(1, ("p",), cache.generation())
+    assert cache.get(1) is None
+
+
+def test_lru_and_ttl(cache, monkeypatch):
+    for uid in (1, 2, 3):
+        cache.put(uid, (uid,), cache.generation())
+    assert cache.get(1) is None and cache.get(3) == (3,)
+    now = time.monotonic()
+    monkeypatch.setattr(profiles.time, "monotonic", lambda: now + 61)
+    assert cache.get(3) is None
+
+
+def _wait(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+
+
+def test_profile_write_invalidates_me(app, pg, user, monkeypatch):
+    cache = ProfileCache(100, 300)
+    monkeypatch.setattr(profiles, "cache", cache)
+    app.request("GET", "/api/me", uid=user)
+    _wait(lambda: cache.stats()["listening"])
+    assert app.request("GET", "/api/me", uid=user)[1]["user"]["name"] == "Teste"
+    assert cache.get(user) is not None
+
+    pg.execute("UPDATE users SET name = 'Outro' WHERE id = %s", (user,))
+    pg.commit()
+    # O trigger de users notifica e o listener tira o perfil do cache
+    _wait(lambda: cache.get(user) is None)
+    assert app.request("GET", "/api/me", uid=user)[1]["user"]["name"] == "Outro"
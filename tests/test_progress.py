@@ -0,0 +1,75 @@
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from _lib.progress import ProgressDeltas, _streaks_from_days, apply_progress, level_for_xp, lock_progress
+from _lib.settings import PROGRESS_TZ, XP_PER_DONE
+
+DAY = datetime(2026, 3, 10, 12, tzinfo=ZoneInfo(PROGRESS_TZ))
+
+
+def _apply(pg, uid, deltas):
+    with pg.transaction(), pg.cursor() as cur:
+        return apply_progress(cur, uid, lock_progress(cur, uid), deltas)[0]
+
+
+def test_level_for_xp():
+    assert [level_for_xp(xp) for xp in (0, 99, 100, 399, 400, 900)] == [1, 1, 2, 2, 3, 4]
+
+
+def test_streaks_from_days():
+    d = date(2026, 3, 1)
+    days = [d, d + timedelta(days=1), d + timedelta(days=2), d + timedelta(days=5)]
+    assert _streaks_from_days(days) == (1, 3, days[-1])
+    assert _streaks_from_days([]) == (0, 0, None)
+
+
+def test_streak_follows_done_days(pg, user):
+    deltas = ProgressDeltas()
+    for i in range(3):
+        deltas.created(DAY + timedelta(days=i), "feita")
+    p = _apply(pg, user, deltas)
+    assert (p["current_streak"], p["best_streak"], p["last_done_day"]) == (3, 3, (DAY + timedelta(days=2)).date())
+    assert (p["total_done"], p["xp"]) == (3, 3 * XP_PER_DONE)
+
+    # Desfazer o dia do meio parte a sequência: recalcula a partir dos dias ativos
+    deltas = ProgressDeltas()
+    deltas.status_changed(DAY + timedelta(days=1), "feita", "pendente")
+    p = _apply(pg, user, deltas)
+    assert (p["current_streak"], p["best_streak"], p["total_done"]) == (1, 1, 2)
+
+    # Dia seguinte ao último: caminho O(1)
+    deltas = ProgressDeltas()
+    deltas.created(DAY + timedelta(days=3), "feita")
+    p = _apply(pg, user, deltas)
+    assert (p["current_streak"], p["best_streak"], p["xp"]) == (2, 2, 3 * XP_PER_DONE)
+
+    row = pg.execute(
+        "SELECT xp, current_streak, best_streak FROM user_progress WHERE user_id = %s", (user,)
+    ).fetchone()
+    assert row == (3 * XP_PER_DONE, 2, 2)
+
+
+def test_first_access_backfills_from_history(pg, user):
+    rows = [(DAY, "feita", False), (DAY + timedelta(days=1), "feita", False), (DAY, "pendente", False),
+            (DAY + timedelta(days=2), "feita", True)]
+    for created_at, status, imported in rows:
+        pg.execute(
+            "INSERT INTO routines(user_id, title, status, created_at, imported) VALUES(%s, 'r', %s, %s, %s)",
+            (user, status, created_at, imported),
+        )
+    pg.commit()
+    with pg.transaction(), pg.cursor() as cur:
+        p = lock_progress(cur, user)
+    # Importadas ficam de fora até mudarem de status
+    assert (p["total_created"], p["total_done"], p["xp"]) == (3, 2, 2 * XP_PER_DONE)
+    assert (p["current_streak"], p["best_streak"]) == (2, 2)
+
+
+def test_progress_endpoint_counts_writes(app, user):
+    rid = app.request("POST", "/api/routines", {"title": "r"}, uid=user)[1]["item"]["id"]
+    app.request("PATCH", f"/api/routines/{rid}/status", {"status": "feita"}, uid=user)
+    status, body = app.request("GET", "/api/progress", uid=user)
+    assert status == 200
+    progress = body["progress"]
+    assert (progress["xp"], progress["total_done"], progress["current_streak"]) == (XP_PER_DONE, 1, 1)
+    assert progress["today"] == {"created": 1, "done": 1}
@@ -0,0 +1,78 @@
+import pytest
+
+from _lib import ratelimit
+from _lib.ratelimit import RateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_burst_then_wait(clock):
+    rl = RateLimiter()
+    assert [rl.take("ip:a", 60, 3) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert rl.take("ip:a", 60, 3) == pytest.approx(1.0)
+    # Outra chave tem o próprio balde
+    assert rl.take("ip:b", 60, 3) == 0.0
+
+
+def test_refill_capped_at_burst(clock):
+    rl = RateLimiter()
+    for _ in range(2):
+        rl.take("k", 60, 2)
+    clock[0] += 1
+    assert rl.take("k", 60, 2) == 0.0
+    assert rl.take("k", 60, 2) > 0
+    clock[0] += 3600
+    assert [rl.take("k", 60, 2) for _ in range(2)] == [0.0, 0.0]
+    assert rl.take("k", 60, 2) > 0
+
+
+def test_cost(clock):
+    rl = RateLimiter()
+    assert rl.take("k", 60, 5, cost=4) == 0.0
+    assert rl.take("k", 60, 5, cost=4) == pytest.approx(3.0)
+    # Pedido negado não consome fichas
+    assert rl.take("k", 60, 5, cost=1) == 0.0
+
+
+def test_lru_bounded(clock):
+    rl = RateLimiter(max_keys=2)
+    for key in ("a", "b", "c"):
+        rl.take(key, 60, 1)
+    assert rl.stats() == {"keys": 2}
+    # "a" foi descartada: volta com o balde cheio
+    assert rl.take("a", 60, 1) == 0.0
+
+
+def test_client_ip_counts_proxies_from_the_end(handler, monkeypatch):
+    import routines
+
+    handler.client_address = ("10.0.0.1", 4000)
+    # O primeiro item veio do cliente (forjável); o último foi anexado pelo proxy
+    handler.headers = {"X-Forwarded-For": "6.6.6.6, 203.0.113.7"}
+    assert handler._client_ip() == "203.0.113.7"
+    monkeypatch.setattr(routines, "RATE_LIMIT_TRUST_PROXY", 2)
+    assert handler._client_ip() == "6.6.6.6"
+    monkeypatch.setattr(routines, "RATE_LIMIT_TRUST_PROXY", 0)
+    assert handler._client_ip() == "10.0.0.1"
+
+
+def test_user_bucket_is_checked_before_the_ip_bucket(handler, clock, monkeypatch):
+    import routines
+
+    rl = RateLimiter()
+    monkeypatch.setattr(ratelimit, "limiter", rl)
+    monkeypatch.setattr(routines, "RATE_USER_BURST", 2)
+    handler.command, handler.path, handler.client_address = "GET", "/api/routines", ("10.0.0.1", 4000)
+    handler._get_session = lambda: {"uid": 7}
+    rejected = []
+    handler._write_json = lambda status, payload, headers=None: rejected.append(status)
+
+    assert [handler._admit() for _ in range(3)] == [True, True, False]
+    assert rejected == [429]
+    # O pedido barrado pelo balde do usuário não gastou fichas do IP
+    assert rl._buckets["ip:10.0.0.1"][0] == routines.RATE_IP_BURST - 2
@@ -0,0 +1,78 @@
+from datetime import date
+
+from _lib.recurrences import expand_recurrence, recurrence_occurs
+
+MONDAY = date(2026, 3, 2)
+
+
+def _rule(kind, **fields):
+    return {"kind": kind, "interval_days": 1, "weekdays": [], "start_date": MONDAY, "end_date": None, **fields}
+
+
+def test_recurrence_kinds():
+    week = [date(2026, 3, d) for d in range(2, 9)]
+    assert [recurrence_occurs(_rule("daily"), d) for d in week] == [True] * 7
+    assert [recurrence_occurs(_rule("weekdays"), d) for d in week] == [True] * 5 + [False] * 2
+    assert [recurrence_occurs(_rule("every_n", interval_days=3), d) for d in week] == [
+        True, False, False, True, False, False, True,
+    ]
+    assert [recurrence_occurs(_rule("weekly", weekdays=[1, 6]), d) for d in week] == [
+        False, True, False, False, False, False, True,
+    ]
+    assert not recurrence_occurs(_rule("daily"), date(2026, 3, 1))
+
+
+def test_expand_respects_end_date():
+    rule = _rule("daily", end_date=date(2026, 3, 4))
+    assert expand_recurrence(rule, date(2026, 2, 1), date(2026, 3, 31)) == [
+        date(2026, 3, 2), date(2026, 3, 3), date(2026, 3, 4),
+    ]
+
+
+def _range(app, user):
+    _, body = app.request("GET", "/api/routines/range?from=2026-03-02&to=2026-03-06&tz=UTC", uid=user)
+    return {i["occurrence_date"]: i for i in body["items"]}
+
+
+def test_occurrences_materialize_lazily_once(app, pg, user):
+    status, body = app.request(
+        "POST", "/api/recurrences",
+        {"title": "regar", "kind": "every_n", "interval_days": 2, "start_date": "2026-03-02", "tz": "UTC"},
+        uid=user,
+    )
+    assert status == 201
+    rec_id = body["item"]["id"]
+
+    # O intervalo mostra instâncias virtuais sem gravar nada
+    items = _range(app, user)
+    assert sorted(items) == ["2026-03-02", "2026-03-04", "2026-03-06"]
+    assert all(i["virtual"] and i["id"] is None for i in items.values())
+    assert pg.execute("SELECT count(*) FROM routines WHERE user_id = %s", (user,)).fetchone()[0] == 0
+
+    # Abrir o dia cria a instância; abrir de novo não duplica
+    for _ in range(2):
+        _, body = app.request("GET", "/api/routines?date=2026-03-04&tz=UTC", uid=user)
+    assert [i["title"] for i in body["items"]] == ["regar"]
+    # Concluir uma ocorrência ainda virtual a materializa já feita
+    status, body = app.request(
+        "PATCH", "/api/routines/status", {"recurrence_id": rec_id, "date": "2026-03-06", "status": "feita"}, uid=user
+    )
+    assert status == 200 and body["item"]["status"] == "feita"
+    # Dia que a regra não gera não vira rotina
+    status, _ = app.request(
+        "PATCH", "/api/routines/status", {"recurrence_id": rec_id, "date": "2026-03-05", "status": "feita"}, uid=user
+    )
+    assert status == 404
+
+    items = _range(app, user)
+    assert {d: i["virtual"] for d, i in items.items()} == {"2026-03-02": True, "2026-03-04": False, "2026-03-06": False}
+    rows = pg.execute(
+        "SELECT occurrence_date, status FROM routines WHERE user_id = %s ORDER BY occurrence_date", (user,)
+    ).fetchall()
+    assert rows == [(date(2026, 3, 4), "pendente"), (date(2026, 3, 6), "feita")]
+
+    # Apagar a regra mantém as instâncias como rotinas avulsas
+    assert app.request("DELETE", f"/api/recurrences/{rec_id}", uid=user)[0] == 200
+    assert pg.execute(
+        "SELECT count(*) FROM routines WHERE user_id = %s AND recurrence_id IS NULL", (user,)
+    ).fetchone()[0] == 2
@@ -0,0 +1,76 @@
+import time
+import uuid
+
+import psycopg
+import pytest
+from psycopg.conninfo import make_conninfo
+
+from _lib import db
+from _lib.migrations import run_migrations
+
+
+def _close(replicas):
+    # A thread de checagem continua viva: sem réplicas na lista ela não toca nos pools fechados
+    pools = [r["pool"] for r in replicas.replicas if r["pool"] is not None]
+    replicas.replicas = []
+    for pool in pools:
+        pool.close()
+
+
+@pytest.fixture
+def stale_replica(pg_url):
+    """Réplica "atrasada": outro schema migrado, sem nenhuma das escritas do primário"""
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    with psycopg.connect(pg_url, autocommit=True) as conn:
+        conn.execute(f"CREATE SCHEMA {schema}")
+    url = make_conninfo(pg_url, options=f"-c search_path={schema}")
+    with psycopg.connect(url) as conn:
+        run_migrations(conn)
+    replicas = db.ReplicaSet([url])
+    try:
+        yield replicas
+    finally:
+        _close(replicas)
+        with psycopg.connect(pg_url, autocommit=True) as conn:
+            conn.execute(f"DROP SCHEMA {schema} CASCADE")
+
+
+def _titles(app, user, **kwargs):
+    status, body = app.request("GET", "/api/routines", **kwargs)
+    assert status == 200
+    return [i["title"] for i in body["items"]]
+
+
+def test_reads_follow_the_users_own_writes(app, user, stale_replica, monkeypatch):
+    monkeypatch.setattr(db, "replicas", stale_replica)
+    stale_replica.check()
+    assert stale_replica.stats()["healthy"] == 1
+    # O pool da réplica soma o read-only às options da URL (aqui, o search_path)
+    with stale_replica.connection(stale_replica.replicas[0]) as conn:
+        assert conn.execute("SHOW default_transaction_read_only").fetchone()[0] == "on"
+        assert conn.execute("SELECT count(*) FROM users WHERE id = %s", (user,)).fetchone()[0] == 0
+
+    status, _ = app.request("POST", "/api/routines", {"title": "nova"}, uid=user)
+    assert status == 201
+    # Logo depois da escrita o usuário lê do primário
+    assert _titles(app, user, uid=user) == ["nova"]
+
+    monkeypatch.setattr(db, "READ_AFTER_WRITE_SECONDS", 0)
+    # Passada a janela a leitura vai para a réplica (que ainda não tem a rotina)...
+    assert _titles(app, user, uid=user) == []
+    # ...salvo se o cookie mostra uma escrita recente feita em outro processo
+    cookie = f"{app.cookie(user)}; read_primary={time.time():.3f}"
+    assert _titles(app, user, headers={"Cookie": cookie}) == ["nova"]
+
+
+def test_unreachable_replica_falls_back_to_the_primary(app, user, monkeypatch):
+    replicas = db.ReplicaSet(["postgresql://postgres@127.0.0.1:1/nada?connect_timeout=1"])
+    monkeypatch.setattr(db, "replicas", replicas)
+    app.request("POST", "/api/routines", {"title": "nova"}, uid=user)
+    monkeypatch.setattr(db, "READ_AFTER_WRITE_SECONDS", 0)
+    replicas.replicas[0]["healthy"] = True
+    try:
+        assert _titles(app, user, uid=user) == ["nova"]
+        assert replicas.stats()["healthy"] == 0
+    finally:
+        _close(replicas)
@@ -0,0 +1,43 @@
+from _lib.server import Route, Router
+
+
+def _view():
+    pass
+
+
+ROUTER = Router([
+    Route("GET", "/api/routines", _view),
+    Route("POST", "/api/routines", _view, body=True),
+    Route("PUT", "/api/routines/{id}", _view),
+    Route("PATCH", "/api/routines/{id}/status", _view),
+])
+
+
+def test_resolve_static():
+    route, params = ROUTER.resolve("GET", "/api/routines")
+    assert route.method == "GET" and route.pattern == "/api/routines"
+    assert params == {}
+
+
+def test_resolve_dynamic():
+    route, params = ROUTER.resolve("PATCH", "/api/routines/42/status")
+    assert route.pattern == "/api/routines/{id}/status"
+    assert params == {"id": "42"}
+    # Parâmetro de path implica corpo lido
+    assert route.body
+
+
+def test_resolve_param_is_single_segment():
+    assert ROUTER.resolve("PUT", "/api/routines/1/2") == (None, {})
+
+
+def test_resolve_method_mismatch():
+    assert ROUTER.resolve("DELETE", "/api/routines") == (None, {})
+    assert ROUTER.resolve("GET", "/api/routines/1") == (None, {})
+
+
+def test_allowed_methods_and_label():
+    assert ROUTER.allowed_methods("/api/routines") == ["GET", "POST"]
+    assert ROUTER.allowed_methods("/nope") == []
+    assert ROUTER.label("/api/routines/7") == "/api/routines/{id}"
+    assert ROUTER.label("/nope") == "other"
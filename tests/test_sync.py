@@ -0,0 +1,48 @@
+from _lib.maintenance import compact_tombstones
+from _lib.settings import TOMBSTONE_RETENTION_DAYS
+
+
+def test_sync_token_roundtrip(handler):
+    assert handler._decode_sync_token(handler._encode_sync_token(1234, 56, True)) == (1234, 56, True)
+    assert handler._decode_sync_token(handler._encode_sync_token(7, 0, False)) == (7, 0, False)
+
+
+def _sync(app, user, since=None, limit=None):
+    query = "&".join(f"{k}={v}" for k, v in (("since", since), ("limit", limit)) if v is not None)
+    status, body = app.request("GET", f"/api/routines/changes?{query}", uid=user)
+    assert status == 200
+    return body
+
+
+def test_delta_sync_pages_then_returns_only_changes(app, user):
+    ids = [app.request("POST", "/api/routines", {"title": t}, uid=user)[1]["item"]["id"] for t in ("a", "b", "c")]
+    first = _sync(app, user, limit=2)
+    assert [i["id"] for i in first["items"]] == ids[:2] and first["has_more"]
+    second = _sync(app, user, since=first["next"], limit=2)
+    assert [i["id"] for i in second["items"]] == ids[2:] and not second["has_more"]
+    token = second["next"]
+    assert _sync(app, user, since=token)["items"] == []
+
+    app.request("PUT", f"/api/routines/{ids[0]}", {"title": "a2"}, uid=user)
+    app.request("DELETE", f"/api/routines/{ids[1]}", uid=user)
+    delta = _sync(app, user, since=token)
+    assert [(i["id"], i["title"]) for i in delta["items"]] == [(ids[0], "a2")]
+    assert delta["deleted"] == [ids[1]] and not delta["reset"]
+    assert _sync(app, user, since=delta["next"])["deleted"] == []
+
+
+def test_compacted_tombstones_force_a_full_resync(app, pg, user):
+    ids = [app.request("POST", "/api/routines", {"title": t}, uid=user)[1]["item"]["id"] for t in ("a", "b")]
+    token = _sync(app, user)["next"]
+    app.request("DELETE", f"/api/routines/{ids[0]}", uid=user)
+    pg.execute(
+        "UPDATE routines SET deleted_at = NOW() - make_interval(days => %s) WHERE id = %s",
+        (TOMBSTONE_RETENTION_DAYS + 1, ids[0]),
+    )
+    pg.commit()
+    assert compact_tombstones(pg) >= 1
+
+    # O tombstone sumiu: o cliente não saberia do delete, então recebe tudo de novo
+    body = _sync(app, user, since=token)
+    assert body["reset"] and body["deleted"] == []
+    assert [i["id"] for i in body["items"]] == [ids[1]]